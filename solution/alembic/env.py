@@ -12,7 +12,7 @@ config = context.config
 fileConfig(config.config_file_name)
 
 from src.backend.database import Base
-from src.models import advertiser, ml_score, user, campaign
+from src.models import advertiser, ml_score, user, campaign, client_ordinal
 target_metadata = Base.metadata
 
 
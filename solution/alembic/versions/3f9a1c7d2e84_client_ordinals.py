@@ -0,0 +1,36 @@
+"""Client ordinals
+
+Revision ID: 3f9a1c7d2e84
+Revises: e02d16145c13
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c7d2e84'
+down_revision: Union[str, None] = 'e02d16145c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'client_ordinals',
+        sa.Column('ordinal', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('client_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.ForeignKeyConstraint(['client_id'], ['users.client_id']),
+        sa.PrimaryKeyConstraint('ordinal'),
+        sa.UniqueConstraint('client_id')
+    )
+    # Уже существующим клиентам номера выдаются сразу, плотно и в стабильном порядке.
+    op.execute("INSERT INTO client_ordinals (client_id) SELECT client_id FROM users ORDER BY client_id")
+
+
+def downgrade() -> None:
+    op.drop_table('client_ordinals')
@@ -0,0 +1,52 @@
+"""Campaign indexes and day range
+
+Revision ID: 7c2e5b9d41a3
+Revises: 3f9a1c7d2e84
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e5b9d41a3'
+down_revision: Union[str, None] = '3f9a1c7d2e84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Окно активности кампании как диапазон дней [start_date, end_date]. Столбец вычисляемый,
+    # приложение его не пишет; запросы используют его при CAMPAIGN_DAY_RANGE=1.
+    op.execute(
+        "ALTER TABLE campaigns ADD COLUMN active_days int4range "
+        "GENERATED ALWAYS AS (int4range(start_date, end_date, '[]')) STORED"
+    )
+    # Индексы строятся без блокировки записи в таблицу, поэтому вне транзакции миграции.
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_campaigns_advertiser_id_start_date "
+            "ON campaigns (advertiser_id, start_date)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_campaigns_end_date_start_date "
+            "ON campaigns (end_date, start_date)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_campaigns_campaign_id_record ON campaigns (campaign_id) "
+            "INCLUDE (advertiser_id, cost_per_impression, cost_per_click, start_date, end_date)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_campaigns_active_days "
+            "ON campaigns USING gist (active_days)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index in ("ix_campaigns_active_days", "ix_campaigns_campaign_id_record",
+                      "ix_campaigns_end_date_start_date", "ix_campaigns_advertiser_id_start_date"):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+    op.drop_column('campaigns', 'active_days')
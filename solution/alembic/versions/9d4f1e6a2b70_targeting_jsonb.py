@@ -0,0 +1,54 @@
+"""Targeting jsonb and generated columns
+
+Revision ID: 9d4f1e6a2b70
+Revises: 7c2e5b9d41a3
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4f1e6a2b70'
+down_revision: Union[str, None] = '7c2e5b9d41a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TARGETING_COLUMNS = {
+    "targeting_gender": "text GENERATED ALWAYS AS (upper(targeting ->> 'gender')) STORED",
+    "targeting_age_from": "integer GENERATED ALWAYS AS ((targeting ->> 'age_from')::integer) STORED",
+    "targeting_age_to": "integer GENERATED ALWAYS AS ((targeting ->> 'age_to')::integer) STORED",
+    "targeting_location": "text GENERATED ALWAYS AS (targeting ->> 'location') STORED",
+}
+
+
+def upgrade() -> None:
+    op.alter_column('campaigns', 'targeting', type_=postgresql.JSONB(),
+                    existing_type=sa.JSON(), postgresql_using='targeting::jsonb')
+    # Поля таргетинга как обычные столбцы: фильтр campaign_matches_client выполняется в SQL
+    # (CampaignRepository.list_active_campaigns с профилем клиента).
+    for name, definition in TARGETING_COLUMNS.items():
+        op.execute(f"ALTER TABLE campaigns ADD COLUMN {name} {definition}")
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_campaigns_targeting_location_gender "
+            "ON campaigns (targeting_location, targeting_gender, end_date)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_campaigns_targeting_age "
+            "ON campaigns (targeting_age_from, targeting_age_to)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_campaigns_targeting_age")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_campaigns_targeting_location_gender")
+    for name in reversed(list(TARGETING_COLUMNS)):
+        op.drop_column('campaigns', name)
+    op.alter_column('campaigns', 'targeting', type_=sa.JSON(),
+                    existing_type=postgresql.JSONB(), postgresql_using='targeting::json')
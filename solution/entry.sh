@@ -6,6 +6,11 @@ until pg_isready -h postgres -p 5432 -U roblrash; do
 done
 
 alembic upgrade head
+python -m src.services.redis_key_migration
+# Однократное заполнение агрегатов рекламодателей: выполняется под блокировкой Redis,
+# поэтому одновременно стартующие реплики не пересчитывают агрегаты параллельно, а после
+# отметки о заполнении команда ничего не делает (см. src/services/advertiser_stats_backfill.py).
+python -m src.services.advertiser_stats_backfill
 
 exec gunicorn src.main:app \
   --worker-class uvicorn.workers.UvicornWorker \
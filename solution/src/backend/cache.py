@@ -1,4 +1,93 @@
+"""
+Общий на воркер клиент Redis.
+
+Параметры задаются переменными окружения: REDIS_URL, REDIS_MAX_CONNECTIONS (0 - без ограничения;
+при исчерпании пула команда сразу завершается ошибкой "Too many connections"),
+REDIS_SOCKET_TIMEOUT_S, REDIS_SOCKET_CONNECT_TIMEOUT_S, REDIS_HEALTH_CHECK_INTERVAL_S
+(проверка простаивавшего соединения PING перед использованием) и повторы при обрыве соединения
+или тайм-ауте: REDIS_RETRY_ATTEMPTS попыток с экспоненциальной задержкой от
+REDIS_RETRY_BACKOFF_BASE_MS до REDIS_RETRY_BACKOFF_CAP_MS.
+
+REDIS_CLUSTER=1 - REDIS_URL указывает на один из узлов Redis Cluster, и клиент строится как
+RedisCluster: команды направляются на узел, владеющий слотом ключа, а пул (и REDIS_MAX_CONNECTIONS)
+держится отдельно на каждый узел. Ключи кампаний и рекламодателей несут хеш-теги
+(src/repositories/redis_keys.py), поэтому скрипты учёта кампании выполняются на одном узле.
+
+Заполненность пула видна в /metrics (redis_pool_*), готовность - в /health/ready. Публичного API
+для числа занятых и свободных соединений у redis-py нет, поэтому они читаются из внутренних полей
+пулов redis-py 5.2 (версия закреплена в requirements.txt); если поля пропадут после обновления,
+метрики показывают 0, а не ломают /metrics.
+"""
+import os
 import redis.asyncio as redis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from src.backend.metrics import redis_pool_in_use, redis_pool_idle, redis_pool_max_connections
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+REDIS_CLUSTER = os.getenv("REDIS_CLUSTER", "0") == "1"
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "0"))
+REDIS_SOCKET_TIMEOUT_S = float(os.getenv("REDIS_SOCKET_TIMEOUT_S", "5"))
+REDIS_SOCKET_CONNECT_TIMEOUT_S = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT_S", "2"))
+REDIS_HEALTH_CHECK_INTERVAL_S = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL_S", "30"))
+REDIS_RETRY_ATTEMPTS = int(os.getenv("REDIS_RETRY_ATTEMPTS", "3"))
+REDIS_RETRY_BACKOFF_BASE_MS = int(os.getenv("REDIS_RETRY_BACKOFF_BASE_MS", "10"))
+REDIS_RETRY_BACKOFF_CAP_MS = int(os.getenv("REDIS_RETRY_BACKOFF_CAP_MS", "500"))
+
+
+def redis_options(cluster: bool = REDIS_CLUSTER) -> dict:
+    options = {
+        "decode_responses": True,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT_S,
+        "socket_connect_timeout": REDIS_SOCKET_CONNECT_TIMEOUT_S,
+        "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL_S,
+        "retry": Retry(ExponentialBackoff(cap=REDIS_RETRY_BACKOFF_CAP_MS / 1000,
+                                          base=REDIS_RETRY_BACKOFF_BASE_MS / 1000),
+                       REDIS_RETRY_ATTEMPTS),
+        "retry_on_error": [RedisConnectionError, RedisTimeoutError],
+    }
+    # RedisCluster не принимает None: без ограничения используется его значение по умолчанию.
+    if REDIS_MAX_CONNECTIONS or not cluster:
+        options["max_connections"] = REDIS_MAX_CONNECTIONS or None
+    return options
+
+
+def _count(pool, attribute: str) -> int:
+    return len(getattr(pool, attribute, None) or ())
+
+
+def instrument_pool(redis_client_instance) -> None:
+    """
+    Привязывает метрики пула к клиенту: значения считываются при каждом запросе /metrics.
+    Для RedisCluster значения суммируются по пулам всех узлов.
+    """
+    if isinstance(redis_client_instance, redis.RedisCluster):
+        def pools() -> list:
+            return redis_client_instance.get_nodes()
+
+        def in_use(pool) -> int:
+            return _count(pool, "_connections") - _count(pool, "_free")
+
+        def idle(pool) -> int:
+            return _count(pool, "_free")
+    else:
+        def pools() -> list:
+            return [redis_client_instance.connection_pool]
+
+        def in_use(pool) -> int:
+            return _count(pool, "_in_use_connections")
+
+        def idle(pool) -> int:
+            return _count(pool, "_available_connections")
+    redis_pool_in_use.set_function(lambda: sum(in_use(pool) for pool in pools()))
+    redis_pool_idle.set_function(lambda: sum(idle(pool) for pool in pools()))
+    redis_pool_max_connections.set_function(
+        lambda: sum(getattr(pool, "max_connections", 0) or 0 for pool in pools())
+    )
 
-REDIS_URL = "redis://redis:6379/0"
-redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+if REDIS_CLUSTER:
+    redis_client = redis.RedisCluster.from_url(REDIS_URL, **redis_options())
+else:
+    redis_client = redis.from_url(REDIS_URL, **redis_options())
+instrument_pool(redis_client)
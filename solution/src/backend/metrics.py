@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Gauge
+from prometheus_client import Counter, Gauge, Histogram
 
 ad_clicks_total = Counter(
     'ad_clicks_total',
@@ -24,6 +24,79 @@ ad_click_revenue = Gauge(
     ['campaign_id']
 )
 
+event_buffer_pending = Gauge(
+    'event_buffer_pending',
+    'Количество событий в буфере отложенной записи'
+)
+
+event_buffer_flush_errors_total = Counter(
+    'event_buffer_flush_errors_total',
+    'Количество неудачных сбросов буфера отложенной записи'
+)
+
+event_dropped_early_clicks_total = Counter(
+    'event_dropped_early_clicks_total',
+    'Количество кликов, показ для которых так и не появился за время повторов',
+    ['source']
+)
+
+client_profile_cache_hits_total = Counter(
+    'client_profile_cache_hits_total',
+    'Количество попаданий в кеш профилей клиентов',
+    ['layer']
+)
+
+client_profile_cache_misses_total = Counter(
+    'client_profile_cache_misses_total',
+    'Количество промахов кеша профилей клиентов (чтений профиля из БД)'
+)
+
+db_pool_checked_out = Gauge(
+    'db_pool_checked_out',
+    'Количество соединений с БД, выданных из пула воркера',
+    ['pool']
+)
+
+db_pool_overflow = Gauge(
+    'db_pool_overflow',
+    'Количество соединений с БД сверх pool_size',
+    ['pool']
+)
+
+db_replica_healthy = Gauge(
+    'db_replica_healthy',
+    'Исправна ли реплика БД по последней проверке (1/0)',
+    ['replica']
+)
+
+db_pool_checkouts_total = Counter(
+    'db_pool_checkouts_total',
+    'Количество выдач соединений из пула по маршрутам API',
+    ['pool', 'route']
+)
+
+db_pool_connection_hold_seconds = Histogram(
+    'db_pool_connection_hold_seconds',
+    'Время удержания соединения с БД по маршрутам API',
+    ['pool', 'route'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+redis_pool_in_use = Gauge(
+    'redis_pool_in_use',
+    'Количество соединений с Redis, занятых командами'
+)
+
+redis_pool_idle = Gauge(
+    'redis_pool_idle',
+    'Количество свободных соединений в пуле Redis'
+)
+
+redis_pool_max_connections = Gauge(
+    'redis_pool_max_connections',
+    'Предел соединений пула Redis (для кластера - сумма по узлам)'
+)
+
 api_errors_total = Counter(
     'api_errors_total',
     'Общее количество ошибок API'
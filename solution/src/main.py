@@ -1,22 +1,32 @@
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from starlette.responses import JSONResponse
 from contextlib import asynccontextmanager
 from src.backend import metrics
-from src.routes import user, advertiser, ml_score, campaign, time, ads, stats, moderation, ad_AI_text, metrics_router
+from src.routes import user, advertiser, ml_score, campaign, time, ads, stats, moderation, ad_AI_text, metrics_router, health
 from src.backend.cache import redis_client
+from src.services.event_buffer import EVENT_WRITE_BEHIND, event_buffer
+from src.backend.database import read_router, set_db_route
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await redis_client.set("current_day", 0)
     await redis_client.set("moderation_enabled", "0")
-    yield
+    if EVENT_WRITE_BEHIND:
+        event_buffer.start()
+    read_router.start()
+    try:
+        yield
+    finally:
+        await read_router.stop()
+        await event_buffer.stop()
 
 app = FastAPI(
     title="Ad Engine API",
     description="API для управления рекламными кампаниями",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    dependencies=[Depends(set_db_route)]
 )
 
 @app.exception_handler(RequestValidationError)
@@ -35,4 +45,5 @@ app.include_router(stats.router)
 app.include_router(time.router)
 app.include_router(moderation.router)
 app.include_router(ad_AI_text.router)
-app.include_router(metrics_router.router)
\ No newline at end of file
+app.include_router(metrics_router.router)
+app.include_router(health.router)
\ No newline at end of file
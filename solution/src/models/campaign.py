@@ -1,7 +1,8 @@
 import uuid
-from sqlalchemy import Column, Integer, String, JSON, ForeignKey, Numeric
-from sqlalchemy.dialects.postgresql import UUID
-from src.backend.database import Base
+from sqlalchemy import Column, Integer, String, Text, JSON, ForeignKey, Numeric, Index, Computed
+from sqlalchemy.dialects.postgresql import UUID, JSONB, INT4RANGE
+from sqlalchemy.orm import deferred
+from src.backend.database import Base, POSTGRESQL_ONLY
 
 class Campaign(Base):
     __tablename__ = "campaigns"
@@ -16,5 +17,36 @@ class Campaign(Base):
     ad_text = Column(String, nullable=False)
     start_date = Column(Integer, nullable=False)
     end_date = Column(Integer, nullable=False)
-    targeting = Column(JSON, nullable=True, default={})
+    targeting = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True, default={})
     image_url = Column(String, nullable=True)
+    # Вычисляемые столбцы есть только в Postgres: приложение их не пишет и не загружает
+    # (deferred, без eager_defaults), а использует лишь в условиях запросов.
+    # Окно активности кампании [start_date, end_date] для CAMPAIGN_DAY_RANGE=1.
+    active_days = deferred(Column(INT4RANGE, Computed("int4range(start_date, end_date, '[]')", persisted=True),
+                                  info=POSTGRESQL_ONLY))
+    # Поля таргетинга для фильтра campaign_matches_client в SQL (targeting_conditions).
+    targeting_gender = deferred(Column(Text, Computed("upper(targeting ->> 'gender')", persisted=True),
+                                       info=POSTGRESQL_ONLY))
+    targeting_age_from = deferred(Column(Integer, Computed("(targeting ->> 'age_from')::integer", persisted=True),
+                                         info=POSTGRESQL_ONLY))
+    targeting_age_to = deferred(Column(Integer, Computed("(targeting ->> 'age_to')::integer", persisted=True),
+                                       info=POSTGRESQL_ONLY))
+    targeting_location = deferred(Column(Text, Computed("targeting ->> 'location'", persisted=True),
+                                         info=POSTGRESQL_ONLY))
+
+    __mapper_args__ = {"eager_defaults": False}
+
+    __table_args__ = (
+        # Кампании рекламодателя по порядку start_date: list_all_campaigns и минимальный день статистики.
+        Index("ix_campaigns_advertiser_id_start_date", "advertiser_id", "start_date"),
+        # Активные в день кампании: по мере роста таблицы большинство кампаний уже закончилось,
+        # поэтому ведущий столбец - end_date.
+        Index("ix_campaigns_end_date_start_date", "end_date", "start_date"),
+        # Поля учёта событий (get_campaign_record) читаются из индекса без обращения к таблице.
+        Index("ix_campaigns_campaign_id_record", "campaign_id",
+              postgresql_include=["advertiser_id", "cost_per_impression", "cost_per_click", "start_date", "end_date"]),
+        Index("ix_campaigns_active_days", "active_days", postgresql_using="gist").ddl_if(dialect="postgresql"),
+        Index("ix_campaigns_targeting_location_gender", "targeting_location", "targeting_gender", "end_date")
+        .ddl_if(dialect="postgresql"),
+        Index("ix_campaigns_targeting_age", "targeting_age_from", "targeting_age_to").ddl_if(dialect="postgresql"),
+    )
@@ -0,0 +1,8 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from src.backend.database import Base
+
+class ClientOrdinal(Base):
+    __tablename__ = "client_ordinals"
+    ordinal = Column(Integer, primary_key=True, autoincrement=True)
+    client_id = Column(UUID(as_uuid=True), ForeignKey("users.client_id"), unique=True, nullable=False)
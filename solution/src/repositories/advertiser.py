@@ -3,6 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 from src.models.advertiser import Advertiser
 from src.schemas.advertiser import AdvertiserUpsert
+from src.repositories.bulk import UPSERT_CHUNK_SIZE, dialect_insert, chunked, dedupe_last_wins
 
 class AdvertiserRepository:
     def __init__(self, session: AsyncSession):
@@ -24,9 +25,23 @@ class AdvertiserRepository:
         await self.session.refresh(adv)
         return adv
 
-    async def upsert_many(self, advertisers: list[AdvertiserUpsert]) -> list[Advertiser]:
-        results = []
-        for adv in advertisers:
-            updated = await self.upsert(adv)
-            results.append(updated)
-        return results
+    async def upsert_many(self, advertisers: list[AdvertiserUpsert],
+                          chunk_size: int = UPSERT_CHUNK_SIZE) -> list[Advertiser]:
+        """
+        Массовый upsert рекламодателей пачками INSERT ... ON CONFLICT (advertiser_id) DO UPDATE ... RETURNING
+        в одной транзакции. Повторы advertiser_id схлопываются до последней записи.
+        """
+        if not advertisers:
+            return []
+        rows = dedupe_last_wins([adv.model_dump(by_alias=True) for adv in advertisers], "advertiser_id")
+        upserted = {}
+        for chunk in chunked(rows, chunk_size):
+            stmt = dialect_insert(self.session, Advertiser).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Advertiser.advertiser_id],
+                set_={"name": stmt.excluded.name}
+            ).returning(Advertiser).execution_options(populate_existing=True)
+            result = await self.session.execute(stmt)
+            upserted.update((adv.advertiser_id, adv) for adv in result.scalars().all())
+        await self.session.commit()
+        return [upserted[adv.advertiser_id] for adv in advertisers]
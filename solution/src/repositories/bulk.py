@@ -0,0 +1,27 @@
+import os
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+UPSERT_CHUNK_SIZE = int(os.getenv("UPSERT_CHUNK_SIZE", "1000"))
+
+
+def dialect_insert(session: AsyncSession, model):
+    """
+    Возвращает INSERT диалекта сессии с поддержкой ON CONFLICT: Postgres в проде, SQLite в тестах.
+    """
+    if session.bind.dialect.name == "sqlite":
+        return sqlite.insert(model)
+    return postgresql.insert(model)
+
+
+def chunked(rows: list, size: int):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def dedupe_last_wins(rows: list[dict], *keys: str) -> list[dict]:
+    """
+    Оставляет для каждого ключа последнюю строку: один INSERT ... ON CONFLICT
+    не может обновить одну и ту же запись дважды.
+    """
+    return list({tuple(row[key] for key in keys): row for row in rows}.values())
@@ -1,18 +1,44 @@
+import os
 from uuid import UUID
 from decimal import Decimal
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func, or_
 from sqlalchemy.orm.exc import StaleDataError
 from src.models.campaign import Campaign
 from src.schemas.campaign import CampaignCreate, CampaignUpdate
 from src.backend.cache import redis_client
 from src.repositories.advertiser import AdvertiserRepository
-from src.backend.metrics import (
-    ad_clicks_total,
-    ad_impressions_total,
-    ad_impression_revenue,
-    ad_click_revenue
-)
+from src.services.active_campaigns import bump_campaigns_version, read_campaigns_version, ServingCampaign, CampaignContent
+from src.repositories import campaign_scripts
+from src.repositories.redis_keys import campaign_key, advertiser_key
+from src.repositories.campaign_counters import ExactCounters, IMPRESSION, CLICK, get_counter_backend
+from src.services.event_buffer import EventBuffer, event_buffer, record_event_metrics, apply_advertiser_updates
+from src.services.event_stream import EVENT_STREAM, append_event
+from src.services.campaign_cache import CampaignCache, CampaignRecord, campaign_cache
+from src.services.ad_matching import campaign_matches_client
+
+# Искать активные кампании по GiST-индексу столбца active_days (int4range, только Postgres)
+# вместо пары условий по start_date и end_date.
+CAMPAIGN_DAY_RANGE = os.getenv("CAMPAIGN_DAY_RANGE", "0") == "1"
+
+_forget_campaign_script = redis_client.register_script(campaign_scripts.FORGET_CAMPAIGN)
+_merge_legacy_daily_script = redis_client.register_script(campaign_scripts.MERGE_LEGACY_DAILY)
+
+
+def targeting_conditions(client) -> tuple:
+    """
+    Условия campaign_matches_client для клиента по вычисляемым столбцам targeting_*
+    (миграция 9d4f1e6a2b70, только Postgres). Пол хранится в верхнем регистре.
+    """
+    gender, age_from, age_to, location = (Campaign.targeting_gender, Campaign.targeting_age_from,
+                                          Campaign.targeting_age_to, Campaign.targeting_location)
+    return (
+        or_(gender.is_(None), gender.in_(["ALL", client.gender.upper()])),
+        or_(age_from.is_(None), age_from <= client.age),
+        or_(age_to.is_(None), age_to >= client.age),
+        or_(location.is_(None), location == client.location),
+    )
+
 
 async def validate_campaign_update(data: dict, current_day: int):
     update = CampaignUpdate(**data)
@@ -23,8 +49,18 @@ async def validate_campaign_update(data: dict, current_day: int):
     return update
 
 class CampaignRepository:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, counters: ExactCounters = None, events: EventBuffer = None,
+                 cache: CampaignCache = None, use_cache: bool = True):
+        """
+        use_cache=False - для сессий на репликах: отстающая реплика не должна закрепить в кеше
+        записей воркера устаревшие стоимость и даты кампании, поэтому такой репозиторий
+        не читает и не заполняет кеш.
+        """
         self.session = session
+        self.counters = counters or get_counter_backend()
+        self.events = events if events is not None else event_buffer
+        self.cache = cache if cache is not None else campaign_cache
+        self.use_cache = use_cache
 
     async def create_campaign(self, advertiser_id: UUID, campaign_data: CampaignCreate) -> Campaign:
         stored_day = await redis_client.get("current_day")
@@ -68,17 +104,61 @@ class CampaignRepository:
         self.session.add(new_campaign)
         await self.session.commit()
         await self.session.refresh(new_campaign)
+        await bump_campaigns_version(redis_client)
         new_campaign.cost_per_impression = float(new_campaign.cost_per_impression)
         new_campaign.cost_per_click = float(new_campaign.cost_per_click)
         return new_campaign
 
-    async def list_active_campaigns(self, current_day: int) -> list[Campaign]:
-        stmt = select(Campaign).where(
-            Campaign.start_date <= current_day,
-            Campaign.end_date >= current_day
+    def _active_on(self, current_day: int):
+        if CAMPAIGN_DAY_RANGE and self.session.bind.dialect.name == "postgresql":
+            return (Campaign.active_days.contains(current_day),)
+        return Campaign.start_date <= current_day, Campaign.end_date >= current_day
+
+    def _active_statement(self, stmt, current_day: int, client):
+        """
+        Добавляет к выборке условие активности в current_day. Если передан профиль клиента,
+        на Postgres добавляется и фильтр таргетинга; на других СУБД профиль возвращается
+        для фильтрации в Python (_filter_targeting).
+        """
+        stmt = stmt.where(*self._active_on(current_day))
+        if client is not None and self.session.bind.dialect.name == "postgresql":
+            return stmt.where(*targeting_conditions(client)), None
+        return stmt, client
+
+    @staticmethod
+    def _filter_targeting(campaigns, client) -> list:
+        if client is None:
+            return list(campaigns)
+        return [campaign for campaign in campaigns if campaign_matches_client(campaign.targeting, client)]
+
+    async def list_active_campaigns(self, current_day: int, client=None) -> list[Campaign]:
+        """
+        Возвращает кампании, активные в current_day; с профилем клиента - только подходящие ему.
+        """
+        stmt, client = self._active_statement(select(Campaign), current_day, client)
+        result = await self.session.execute(stmt)
+        return self._filter_targeting(result.scalars().all(), client)
+
+    async def list_serving_campaigns(self, current_day: int, client=None) -> list[ServingCampaign]:
+        """
+        Как list_active_campaigns, но читает только столбцы для подбора и ранжирования
+        и возвращает лёгкие строки ServingCampaign вместо объектов ORM.
+        """
+        stmt, client = self._active_statement(
+            select(Campaign.campaign_id, Campaign.advertiser_id, Campaign.cost_per_impression,
+                   Campaign.cost_per_click, Campaign.impressions_limit, Campaign.clicks_limit,
+                   Campaign.start_date, Campaign.end_date, Campaign.targeting),
+            current_day, client
         )
         result = await self.session.execute(stmt)
-        return result.scalars().all()
+        return self._filter_targeting((ServingCampaign(*row) for row in result), client)
+
+    async def get_campaign_content(self, campaign_id: UUID) -> CampaignContent | None:
+        result = await self.session.execute(
+            select(Campaign.ad_title, Campaign.ad_text, Campaign.image_url).where(Campaign.campaign_id == campaign_id)
+        )
+        row = result.first()
+        return CampaignContent(*row) if row is not None else None
 
     async def list_all_campaigns(self, advertiser_id: UUID, page: int, size: int) -> list[Campaign]:
         offset = (page - 1) * size
@@ -151,6 +231,8 @@ class CampaignRepository:
             await self.session.rollback()
             campaign = await self.get_campaign_by_id(advertiser_id, campaign_id)
         await self.session.refresh(campaign)
+        self.cache.invalidate(campaign_id)
+        await bump_campaigns_version(redis_client)
         campaign.cost_per_impression = float(campaign.cost_per_impression)
         campaign.cost_per_click = float(campaign.cost_per_click)
         return campaign
@@ -168,69 +250,109 @@ class CampaignRepository:
         result = await self.session.execute(stmt)
         return result.scalars().first()
 
+    async def get_campaign_record(self, campaign_id: UUID) -> CampaignRecord | None:
+        """
+        Возвращает стоимость, даты и рекламодателя кампании из кеша воркера,
+        при промахе читая из БД только эти столбцы. Перед чтением кеш сверяет версию
+        набора кампаний, чтобы не отдавать запись, изменённую в другом воркере.
+        Без use_cache запись всегда читается из БД сессии.
+        """
+        if self.use_cache:
+            self.cache.sync_version(await read_campaigns_version(redis_client))
+            record = self.cache.get(campaign_id)
+            if record is not None:
+                return record
+        result = await self.session.execute(
+            select(Campaign.campaign_id, Campaign.advertiser_id, Campaign.cost_per_impression,
+                   Campaign.cost_per_click, Campaign.start_date, Campaign.end_date)
+            .where(Campaign.campaign_id == campaign_id)
+        )
+        row = result.first()
+        if row is None:
+            return None
+        record = CampaignRecord(*row)
+        if self.use_cache:
+            self.cache.put(record.campaign_id, record)
+        return record
+
     async def delete_campaign(self, advertiser_id: UUID, campaign_id: UUID) -> bool:
+        """
+        Удаляет кампанию и вычитает её вклад из агрегатов рекламодателя - только после коммита,
+        чтобы неудачное удаление не оставило агрегаты уменьшенными.
+        """
         campaign = await self.get_campaign_by_id(advertiser_id, campaign_id)
         if not campaign:
             return False
+        start_date, end_date = campaign.start_date, campaign.end_date
         await self.session.delete(campaign)
         await self.session.commit()
+        self.cache.invalidate(campaign_id)
+        await bump_campaigns_version(redis_client)
+        advertiser_keys = ([] if self.counters.cluster else
+                           [advertiser_key(advertiser_id, "stats"), advertiser_key(advertiser_id, "daily_stats")])
+        deferred = await _forget_campaign_script(
+            keys=[campaign_key(campaign_id, "spent_impressions"), campaign_key(campaign_id, "spent_clicks"),
+                  campaign_key(campaign_id, "daily_stats"), *advertiser_keys],
+            args=[str(start_date), str(end_date)],
+            client=redis_client
+        )
+        await apply_advertiser_updates(redis_client, [(advertiser_id, deferred)])
         return True
 
-    async def log_impression(self, campaign_id: UUID, client_id: UUID, redis_client_instance) -> int:
-        global_key = f"campaign:{campaign_id}:impressions"
-        already_seen = await redis_client_instance.sismember(global_key, str(client_id))
-        if not already_seen:
-            await redis_client_instance.sadd(global_key, str(client_id))
-
-            current_day_raw = await redis_client_instance.get("current_day")
-            current_day = (int(current_day_raw.decode() if isinstance(current_day_raw, bytes) else current_day_raw)
-                           if current_day_raw else 0)
-            daily_key = f"campaign:{campaign_id}:daily:impressions:{current_day}"
-            await redis_client_instance.sadd(daily_key, str(client_id))
-
-            campaign = await self.get_campaign_by_id_only(campaign_id)
-            if campaign:
-                spent_global_key = f"campaign:{campaign_id}:spent_impressions"
-                spent_daily_key = f"campaign:{campaign_id}:daily:spent_impressions:{current_day}"
-                await redis_client_instance.incrbyfloat(spent_global_key, float(campaign.cost_per_impression))
-                await redis_client_instance.incrbyfloat(spent_daily_key, float(campaign.cost_per_impression))
-                ad_impressions_total.labels(campaign_id=str(campaign_id)).inc()
-                ad_impression_revenue.labels(campaign_id=str(campaign_id)).inc(float(campaign.cost_per_impression))
-        return await redis_client_instance.scard(global_key)
-
-    async def log_click(self, campaign_id: UUID, client_id: UUID, redis_client_instance) -> int:
-        impressions_key = f"campaign:{campaign_id}:impressions"
-        has_seen = await redis_client_instance.sismember(impressions_key, str(client_id))
-        if not has_seen:
-            return await redis_client_instance.scard(f"campaign:{campaign_id}:clicks")
-
-        global_key = f"campaign:{campaign_id}:clicks"
-        already_clicked = await redis_client_instance.sismember(global_key, str(client_id))
-        if not already_clicked:
-            await redis_client_instance.sadd(global_key, str(client_id))
-
-            current_day_raw = await redis_client_instance.get("current_day")
-            current_day = (int(current_day_raw.decode() if isinstance(current_day_raw, bytes) else current_day_raw)
-                           if current_day_raw else 0)
-            daily_key = f"campaign:{campaign_id}:daily:clicks:{current_day}"
-            await redis_client_instance.sadd(daily_key, str(client_id))
-
-            campaign = await self.get_campaign_by_id_only(campaign_id)
-            if campaign:
-                spent_global_key = f"campaign:{campaign_id}:spent_clicks"
-                spent_daily_key = f"campaign:{campaign_id}:daily:spent_clicks:{current_day}"
-                await redis_client_instance.incrbyfloat(spent_global_key, float(campaign.cost_per_click))
-                await redis_client_instance.incrbyfloat(spent_daily_key, float(campaign.cost_per_click))
-                ad_clicks_total.labels(campaign_id=str(campaign_id)).inc()
-                ad_click_revenue.labels(campaign_id=str(campaign_id)).inc(float(campaign.cost_per_click))
-        return await redis_client_instance.scard(global_key)
+    async def _log_event(self, kind: str, campaign_id: UUID, client_id: UUID, redis_client_instance,
+                         campaign) -> int | None:
+        """
+        Учитывает событие одним из способов: дописывает его в поток событий (EVENT_STREAM=1),
+        кладёт в буфер отложенной записи, если он запущен, либо сразу выполняет скрипт учёта.
+        Стоимость и даты берутся из уже загруженной кампании (снимок активных кампаний);
+        если она не передана, запись кампании берётся из кеша воркера. Для неизвестной кампании агрегаты
+        рекламодателя и списания не обновляются, для удалённой скрипт учёта пропускает событие.
+        Возвращает число уникальных клиентов после события либо None, если учёт отложен.
+        """
+        if campaign is None:
+            campaign = await self.get_campaign_record(campaign_id)
+        cost_field = "cost_per_impression" if kind == IMPRESSION else "cost_per_click"
+        advertiser_id, cost, start_date, end_date = (
+            (campaign.advertiser_id, str(float(getattr(campaign, cost_field))), campaign.start_date, campaign.end_date)
+            if campaign else (None, "", 0, 0)
+        )
+        membership_args = await self.counters.membership_args(client_id, self.session, redis_client_instance)
+        # В Redis Cluster current_day лежит не в слоте кампании, поэтому день читается заранее.
+        day = (await redis_client_instance.get("current_day") or "0") if self.counters.cluster else ""
+        if EVENT_STREAM:
+            await append_event(redis_client_instance, kind, campaign_id, client_id, advertiser_id, cost,
+                               start_date, end_date, membership_args, day=day)
+            return None
+        event = self.counters.build_event(kind, campaign_id, client_id, advertiser_id, cost,
+                                          start_date, end_date, membership_args, day=day)
+        if self.events.running:
+            await self.events.put(event)
+            return None
+        result = await event.script(keys=event.keys, args=event.args, client=redis_client_instance)
+        await apply_advertiser_updates(redis_client_instance, [(advertiser_id, result[2])])
+        record_event_metrics([event], [result])
+        return result[1]
+
+    async def log_impression(self, campaign_id: UUID, client_id: UUID, redis_client_instance,
+                             campaign=None) -> int | None:
+        """
+        Учитывает уникальный показ одним вызовом Lua-скрипта, обновляя заодно агрегаты рекламодателя.
+        """
+        return await self._log_event(IMPRESSION, campaign_id, client_id, redis_client_instance, campaign)
+
+    async def log_click(self, campaign_id: UUID, client_id: UUID, redis_client_instance,
+                        campaign=None) -> int | None:
+        """
+        Учитывает уникальный клик одним вызовом Lua-скрипта; клик без предшествующего показа игнорируется.
+        """
+        return await self._log_event(CLICK, campaign_id, client_id, redis_client_instance, campaign)
 
     async def log_ml_score(self, campaign_id: UUID, score: float) -> None:
-        key = f"campaign:{campaign_id}:ml_scores"
+        key = campaign_key(campaign_id, "ml_scores")
         await redis_client.rpush(key, score)
 
     async def get_average_ml_score(self, campaign_id: UUID) -> float:
-        key = f"campaign:{campaign_id}:ml_scores"
+        key = campaign_key(campaign_id, "ml_scores")
         scores = await redis_client.lrange(key, 0, -1)
         if not scores:
             return 0.0
@@ -239,22 +361,37 @@ class CampaignRepository:
         return float(avg)
 
     async def get_impressions_count(self, campaign_id: UUID, redis_client_instance) -> int:
-        key = f"campaign:{campaign_id}:impressions"
-        return await redis_client_instance.scard(key)
+        _, key = self.counters.impressions_keys(campaign_id)
+        return await self.counters.count(redis_client_instance, key)
 
     async def get_clicks_count(self, campaign_id: UUID, redis_client_instance) -> int:
-        key = f"campaign:{campaign_id}:clicks"
-        return await redis_client_instance.scard(key)
+        _, key = self.counters.clicks_keys(campaign_id)
+        return await self.counters.count(redis_client_instance, key)
+
+    async def get_counters_bulk(self, campaign_ids, redis_client_instance) -> list[tuple[int, int]]:
+        """
+        Возвращает пары (показы, клики) для списка кампаний в том же порядке,
+        читая все счётчики одним пайплайном Redis.
+        """
+        campaign_ids = list(campaign_ids)
+        if not campaign_ids:
+            return []
+        async with redis_client_instance.pipeline(transaction=False) as pipe:
+            for campaign_id in campaign_ids:
+                self.counters.count(pipe, self.counters.impressions_keys(campaign_id)[1])
+                self.counters.count(pipe, self.counters.clicks_keys(campaign_id)[1])
+            results = await pipe.execute()
+        return list(zip(results[0::2], results[1::2]))
 
     async def get_campaign_stats(self, campaign_id: UUID, redis_client_instance) -> dict:
-        campaign = await self.get_campaign_by_id_only(campaign_id)
+        campaign = await self.get_campaign_record(campaign_id)
         if not campaign:
             return None
 
-        impressions = await redis_client_instance.scard(f"campaign:{campaign_id}:impressions")
-        clicks = await redis_client_instance.scard(f"campaign:{campaign_id}:clicks")
-        spent_imp_raw = await redis_client_instance.get(f"campaign:{campaign_id}:spent_impressions")
-        spent_clicks_raw = await redis_client_instance.get(f"campaign:{campaign_id}:spent_clicks")
+        impressions = await self.get_impressions_count(campaign_id, redis_client_instance)
+        clicks = await self.get_clicks_count(campaign_id, redis_client_instance)
+        spent_imp_raw = await redis_client_instance.get(campaign_key(campaign_id, "spent_impressions"))
+        spent_clicks_raw = await redis_client_instance.get(campaign_key(campaign_id, "spent_clicks"))
         spent_imp = (Decimal(spent_imp_raw.decode() if isinstance(spent_imp_raw, bytes) else spent_imp_raw)
                      if spent_imp_raw else Decimal("0.00"))
         spent_clicks = (Decimal(spent_clicks_raw.decode() if isinstance(spent_clicks_raw, bytes) else spent_clicks_raw)
@@ -270,37 +407,54 @@ class CampaignRepository:
             "spent_total": float(spent_total)
         }
 
+    async def _merge_legacy_daily_rollup(self, campaign_id: UUID, days: range, redis_client_instance) -> None:
+        """
+        Однократно переносит в хеш daily_stats дневные счётчики из ключей campaign:{id}:daily:*:{day},
+        которые писались до его появления (см. MERGE_LEGACY_DAILY).
+        """
+        keys = [campaign_key(campaign_id, "daily_legacy_merged"), campaign_key(campaign_id, "daily_stats")]
+        for day in days:
+            keys.extend(campaign_key(campaign_id, f"daily:{field}:{day}")
+                        for field in ("impressions", "clicks", "spent_impressions", "spent_clicks"))
+        await _merge_legacy_daily_script(keys=keys, args=[str(day) for day in days], client=redis_client_instance)
+
     async def get_campaign_daily_stats(self, campaign_id: UUID, redis_client_instance) -> list[dict]:
         """
         Возвращает список статистики по дням от start_date кампании до последнего дня,
         который равен текущему дню (если кампания активна) или до end_date (если она закончилась).
         Если за день кликов > 0, а показов = 0, то все показатели за этот день возвращаются как 0.
+        Вся история читается одним HGETALL дневной сводки кампании; при первом чтении
+        в неё однократно переносятся дни, записанные в старых ключах до её появления.
         """
-        campaign = await self.get_campaign_by_id_only(campaign_id)
+        campaign = await self.get_campaign_record(campaign_id)
         if not campaign:
             return []
 
-        current_day_raw = await redis_client_instance.get("current_day")
+        async with redis_client_instance.pipeline(transaction=False) as pipe:
+            pipe.get("current_day")
+            pipe.hgetall(campaign_key(campaign_id, "daily_stats"))
+            pipe.exists(campaign_key(campaign_id, "daily_legacy_merged"))
+            current_day_raw, rollup, legacy_merged = await pipe.execute()
         current_day = (int(current_day_raw.decode() if isinstance(current_day_raw, bytes) else current_day_raw)
                        if current_day_raw else 0)
         last_day = current_day if current_day <= campaign.end_date else campaign.end_date
+        days = range(campaign.start_date, last_day + 1)
+        if not legacy_merged:
+            await self._merge_legacy_daily_rollup(campaign_id, days, redis_client_instance)
+            rollup = await redis_client_instance.hgetall(campaign_key(campaign_id, "daily_stats"))
+
+        def rollup_value(day: int, field: str):
+            value = rollup.get(f"{day}:{field}")
+            return value.decode() if isinstance(value, bytes) else value
 
         stats = []
-        for day in range(campaign.start_date, last_day + 1):
-            impressions_key = f"campaign:{campaign_id}:daily:impressions:{day}"
-            clicks_key = f"campaign:{campaign_id}:daily:clicks:{day}"
-            spent_imp_key = f"campaign:{campaign_id}:daily:spent_impressions:{day}"
-            spent_clicks_key = f"campaign:{campaign_id}:daily:spent_clicks:{day}"
-
-            imp = await redis_client_instance.scard(impressions_key)
-            clicks = await redis_client_instance.scard(clicks_key)
-            spent_imp_raw = await redis_client_instance.get(spent_imp_key)
-            spent_clicks_raw = await redis_client_instance.get(spent_clicks_key)
-
-            spent_imp = (Decimal(spent_imp_raw.decode() if isinstance(spent_imp_raw, bytes) else spent_imp_raw)
-                         if spent_imp_raw else Decimal("0.00"))
-            spent_clicks = (Decimal(spent_clicks_raw.decode() if isinstance(spent_clicks_raw, bytes) else spent_clicks_raw)
-                            if spent_clicks_raw else Decimal("0.00"))
+        for day in days:
+            imp = int(rollup_value(day, "impressions") or 0)
+            clicks = int(rollup_value(day, "clicks") or 0)
+            spent_imp_raw = rollup_value(day, "spent_impressions")
+            spent_clicks_raw = rollup_value(day, "spent_clicks")
+            spent_imp = Decimal(spent_imp_raw) if spent_imp_raw else Decimal("0.00")
+            spent_clicks = Decimal(spent_clicks_raw) if spent_clicks_raw else Decimal("0.00")
 
             if imp == 0 and clicks > 0:
                 imp = 0
@@ -320,89 +474,143 @@ class CampaignRepository:
                 "spent_clicks": float(spent_clicks),
                 "spent_total": float(spent_total)
             })
-        stats.sort(key=lambda x: x["date"])
         return stats
 
-    async def get_advertiser_stats(self, advertiser_id: UUID, redis_client_instance) -> dict:
-        campaigns = await self.list_all_campaigns(advertiser_id, page=1, size=1000)
-        if not campaigns:
-            adv_repo = AdvertiserRepository(self.session)
-            advertiser = await adv_repo.get_by_id(advertiser_id)
+    async def _advertiser_first_day(self, advertiser_id: UUID) -> int | None:
+        """
+        Возвращает минимальный start_date кампаний рекламодателя одним агрегатным запросом.
+        Бросает LookupError, если рекламодателя нет; None - если у него нет кампаний.
+        """
+        result = await self.session.execute(
+            select(func.min(Campaign.start_date)).where(Campaign.advertiser_id == advertiser_id)
+        )
+        first_day = result.scalar()
+        if first_day is None:
+            advertiser = await AdvertiserRepository(self.session).get_by_id(advertiser_id)
             if not advertiser:
-                return None
-            return {
-                "impressions_count": 0,
-                "clicks_count": 0,
-                "spent_impressions": 0.0,
-                "spent_clicks": 0.0,
-                "spent_total": 0.0,
-                "conversion": 0.0
-            }
-        aggregated = {
-            "impressions_count": 0,
-            "clicks_count": 0,
-            "spent_impressions": Decimal("0.00"),
-            "spent_clicks": Decimal("0.00"),
-            "spent_total": Decimal("0.00")
-        }
-        for campaign in campaigns:
-            stats = await self.get_campaign_stats(campaign.campaign_id, redis_client_instance)
-            if stats is None:
-                continue
-            aggregated["impressions_count"] += stats.get("impressions_count", 0)
-            aggregated["clicks_count"] += stats.get("clicks_count", 0)
-            aggregated["spent_impressions"] += Decimal(str(stats.get("spent_impressions", 0.0)))
-            aggregated["spent_clicks"] += Decimal(str(stats.get("spent_clicks", 0.0)))
-            aggregated["spent_total"] += Decimal(str(stats.get("spent_total", 0.0)))
-        if aggregated["impressions_count"] > 0:
-            conversion = (Decimal(aggregated["clicks_count"]) / Decimal(aggregated["impressions_count"]) * Decimal("100"))
-        else:
-            conversion = Decimal("0.0")
+                raise LookupError(advertiser_id)
+        return first_day
+
+    async def get_advertiser_stats(self, advertiser_id: UUID, redis_client_instance) -> dict:
+        """
+        Возвращает итоги рекламодателя по всем кампаниям из хеша advertiser:{id}:stats,
+        который скрипты учёта событий обновляют вместе со счётчиками кампаний.
+        """
+        try:
+            await self._advertiser_first_day(advertiser_id)
+        except LookupError:
+            return None
+        totals = await redis_client_instance.hgetall(advertiser_key(advertiser_id, "stats"))
+
+        def total(field: str, default: str) -> Decimal:
+            value = totals.get(field)
+            return Decimal(value.decode() if isinstance(value, bytes) else value) if value else Decimal(default)
+
+        impressions = int(total("impressions", "0"))
+        clicks = int(total("clicks", "0"))
+        spent_imp = total("spent_impressions", "0.00")
+        spent_clicks = total("spent_clicks", "0.00")
+        conversion = (Decimal(clicks) / Decimal(impressions) * Decimal("100")) if impressions > 0 else Decimal("0.0")
         return {
-            "impressions_count": aggregated["impressions_count"],
-            "clicks_count": aggregated["clicks_count"],
-            "spent_impressions": float(aggregated["spent_impressions"]),
-            "spent_clicks": float(aggregated["spent_clicks"]),
-            "spent_total": float(aggregated["spent_total"]),
+            "impressions_count": impressions,
+            "clicks_count": clicks,
+            "spent_impressions": float(spent_imp),
+            "spent_clicks": float(spent_clicks),
+            "spent_total": float(spent_imp + spent_clicks),
             "conversion": float(conversion)
         }
 
     async def get_advertiser_daily_stats(self, advertiser_id: UUID, redis_client_instance) -> list[dict]:
-        campaigns = await self.list_all_campaigns(advertiser_id, page=1, size=1000)
-        if not campaigns:
-            adv_repo = AdvertiserRepository(self.session)
-            advertiser = await adv_repo.get_by_id(advertiser_id)
-            if not advertiser:
-                return None
+        """
+        Возвращает статистику рекламодателя по дням от самого раннего start_date его кампаний
+        до текущего дня. Дни читаются одним HGETALL дневного агрегата рекламодателя, который
+        уже учитывает границы кампаний и обнуление дней с кликами без показов.
+        """
+        try:
+            min_day = await self._advertiser_first_day(advertiser_id)
+        except LookupError:
+            return None
+        if min_day is None:
             return []
 
-        min_day = min(campaign.start_date for campaign in campaigns)
-        current_day_raw = await redis_client_instance.get("current_day")
+        async with redis_client_instance.pipeline(transaction=False) as pipe:
+            pipe.get("current_day")
+            pipe.hgetall(advertiser_key(advertiser_id, "daily_stats"))
+            current_day_raw, rollup = await pipe.execute()
         current_day = (int(current_day_raw.decode() if isinstance(current_day_raw, bytes) else current_day_raw)
                        if current_day_raw else 0)
-        daily_agg = {day: {"impressions_count": 0, "clicks_count": 0,
-                           "spent_impressions": Decimal("0.00"), "spent_clicks": Decimal("0.00"),
-                           "spent_total": Decimal("0.00")}
-                     for day in range(min_day, current_day + 1)}
-        for campaign in campaigns:
-            daily_stats = await self.get_campaign_daily_stats(campaign.campaign_id, redis_client_instance)
-            for stat in daily_stats:
-                day = stat["date"]
-                daily_agg[day]["impressions_count"] += stat.get("impressions_count", 0)
-                daily_agg[day]["clicks_count"] += stat.get("clicks_count", 0)
-                daily_agg[day]["spent_impressions"] += Decimal(str(stat.get("spent_impressions", 0.0)))
-                daily_agg[day]["spent_clicks"] += Decimal(str(stat.get("spent_clicks", 0.0)))
-                daily_agg[day]["spent_total"] += Decimal(str(stat.get("spent_total", 0.0)))
+
+        def rollup_value(day: int, field: str, default: str) -> Decimal:
+            value = rollup.get(f"{day}:{field}")
+            return Decimal(value.decode() if isinstance(value, bytes) else value) if value else Decimal(default)
+
         result = []
         for day in range(min_day, current_day + 1):
-            data = daily_agg[day]
-            conversion = (Decimal(data["clicks_count"]) / Decimal(data["impressions_count"]) * Decimal("100")
-                          if data["impressions_count"] > 0 else Decimal("0.0"))
-            data["conversion"] = float(conversion)
-            data["date"] = day
-            data["spent_impressions"] = float(data["spent_impressions"])
-            data["spent_clicks"] = float(data["spent_clicks"])
-            data["spent_total"] = float(data["spent_total"])
-            result.append(data)
-        result.sort(key=lambda x: x["date"])
+            imp = int(rollup_value(day, "impressions", "0"))
+            clicks = int(rollup_value(day, "clicks", "0"))
+            spent_imp = rollup_value(day, "spent_impressions", "0.00")
+            spent_clicks = rollup_value(day, "spent_clicks", "0.00")
+            conversion = (Decimal(clicks) / Decimal(imp) * Decimal("100")) if imp > 0 else Decimal("0.0")
+            result.append({
+                "impressions_count": imp,
+                "clicks_count": clicks,
+                "spent_impressions": float(spent_imp),
+                "spent_clicks": float(spent_clicks),
+                "spent_total": float(spent_imp + spent_clicks),
+                "conversion": float(conversion),
+                "date": day
+            })
         return result
+
+    async def rebuild_advertiser_stats(self, advertiser_id: UUID, redis_client_instance) -> None:
+        """
+        Пересчитывает агрегаты рекламодателя advertiser:{id}:stats и :daily_stats из счётчиков его
+        кампаний по тем же правилам, что и скрипты учёта: итоги - уникальные показы и клики и
+        суммы списаний, дни - только в пределах [start_date, end_date] и только с показами.
+        Перед пересчётом в дневные сводки кампаний переносятся старые дневные ключи.
+        """
+        result = await self.session.execute(
+            select(Campaign.campaign_id, Campaign.start_date, Campaign.end_date)
+            .where(Campaign.advertiser_id == advertiser_id)
+        )
+        campaigns = result.all()
+        current_day = int(await redis_client_instance.get("current_day") or 0)
+        for campaign_id, start_date, end_date in campaigns:
+            await self._merge_legacy_daily_rollup(
+                campaign_id, range(start_date, min(current_day, end_date) + 1), redis_client_instance
+            )
+
+        async with redis_client_instance.pipeline(transaction=False) as pipe:
+            for campaign_id, _, _ in campaigns:
+                self.counters.count(pipe, self.counters.impressions_keys(campaign_id)[1])
+                self.counters.count(pipe, self.counters.clicks_keys(campaign_id)[1])
+                pipe.get(campaign_key(campaign_id, "spent_impressions"))
+                pipe.get(campaign_key(campaign_id, "spent_clicks"))
+                pipe.hgetall(campaign_key(campaign_id, "daily_stats"))
+            results = await pipe.execute()
+
+        totals = {"impressions": 0, "clicks": 0, "spent_impressions": Decimal("0"), "spent_clicks": Decimal("0")}
+        daily = {}
+        for (_, start_date, end_date), offset in zip(campaigns, range(0, len(results), 5)):
+            impressions, clicks, spent_imp, spent_clicks, rollup = results[offset:offset + 5]
+            totals["impressions"] += int(impressions or 0)
+            totals["clicks"] += int(clicks or 0)
+            totals["spent_impressions"] += Decimal(spent_imp or "0")
+            totals["spent_clicks"] += Decimal(spent_clicks or "0")
+            for day in range(start_date, end_date + 1):
+                if int(rollup.get(f"{day}:impressions") or 0) == 0:
+                    continue
+                for field, parse in (("impressions", int), ("clicks", int),
+                                     ("spent_impressions", Decimal), ("spent_clicks", Decimal)):
+                    value = rollup.get(f"{day}:{field}")
+                    if value:
+                        daily[f"{day}:{field}"] = daily.get(f"{day}:{field}", 0) + parse(value)
+
+        stats_key, daily_key = advertiser_key(advertiser_id, "stats"), advertiser_key(advertiser_id, "daily_stats")
+        async with redis_client_instance.pipeline(transaction=False) as pipe:
+            pipe.delete(stats_key)
+            pipe.delete(daily_key)
+            pipe.hset(stats_key, mapping={field: str(value) for field, value in totals.items()})
+            if daily:
+                pipe.hset(daily_key, mapping={field: str(value) for field, value in daily.items()})
+            await pipe.execute()
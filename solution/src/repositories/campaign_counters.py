@@ -0,0 +1,207 @@
+"""
+Счётчики уникальных показов и кликов кампании в трёх режимах (переменная COUNTER_MODE).
+
+Ключи кампании строятся через src/repositories/redis_keys.py (campaign:{<id>}:<имя>);
+ниже они для краткости записаны как campaign:{id}:<имя>.
+
+"exact" (по умолчанию) - множества client_id campaign:{id}:impressions и :clicks.
+Счётчики точные, но память растёт линейно с охватом: порядка 60-90 байт на клиента,
+то есть гигабайты для кампаний с десятками миллионов клиентов.
+
+"bitmap" - битовые карты campaign:{id}:impressions_bitmap и :clicks_bitmap, бит с номером
+клиента из реестра client_ordinals (src/repositories/client_ordinal.py). Счётчики точные,
+число уникальных клиентов - BITCOUNT за O(размер карты). Карта занимает (максимальный номер
+среди клиентов кампании) / 8 байт: 1.25 МБ на 10 млн клиентов против сотен мегабайт
+у множества, но и кампания с парой клиентов с большими номерами платит столько же.
+
+"approximate" - для каждого события два компактных ключа:
+  * campaign:{id}:impressions_bloom / :clicks_bloom - фильтр Блума в битовой строке Redis,
+    по нему решается, новый ли клиент (списание бюджета, дневная сводка, агрегаты
+    рекламодателя, условие "клик только после показа");
+  * campaign:{id}:impressions_hll / :clicks_hll - HyperLogLog (PFADD/PFCOUNT), из него
+    читаются счётчики для ранжирования и статистики.
+
+Границы ошибки приближённого режима:
+  * HyperLogLog в Redis имеет стандартную ошибку 0.81% (1.04 / sqrt(16384)) и занимает
+    не более 12 КБ на ключ; PFCOUNT может как завысить, так и занизить число клиентов.
+  * Фильтр Блума не даёт ложноотрицательных ответов, поэтому повторный показ или клик
+    никогда не списывается дважды. Ложноположительный ответ с вероятностью не выше
+    COUNTER_BLOOM_ERROR_RATE (пока число клиентов кампании не превышает
+    COUNTER_BLOOM_CAPACITY) приводит к тому, что показ или клик нового клиента
+    не списывается, либо клик засчитывается клиенту без показа. Суммы списаний и
+    дневная сводка поэтому могут быть занижены не более чем на эту долю.
+  * При превышении ёмкости вероятность ошибки растёт: (1 - e^(-k*n/m))^k.
+Размер фильтра m = -n * ln(p) / ln(2)^2 бит, число хешей k = m / n * ln(2); при значениях
+по умолчанию (1 000 000 клиентов, 0.1%) это около 1.7 МБ и 10 хешей на ключ, причём
+Redis выделяет строку целиком уже после первых событий. Для небольших кампаний точный
+режим экономнее, выигрыш начинается примерно с 30 000 клиентов на кампанию.
+
+Замер памяти всех режимов: python -m tests.benchmarks.counter_memory.
+
+С cluster=True (по умолчанию - REDIS_CLUSTER=1) скрипт учёта получает только ключи слота
+кампании: день события читается приложением заранее и передаётся в аргументах, а изменения
+агрегатов рекламодателя скрипт возвращает, и они применяются отдельным пайплайном
+(см. src/repositories/campaign_scripts.py).
+"""
+import hashlib
+import math
+import os
+from uuid import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.backend.cache import redis_client, REDIS_CLUSTER
+from src.repositories import campaign_scripts
+from src.repositories.redis_keys import campaign_key, advertiser_key
+from src.repositories.client_ordinal import ClientOrdinalRepository
+from src.services.event_buffer import PendingEvent
+from src.backend.metrics import ad_clicks_total, ad_impressions_total, ad_impression_revenue, ad_click_revenue
+
+COUNTER_MODE = os.getenv("COUNTER_MODE", "exact")
+COUNTER_BLOOM_CAPACITY = int(os.getenv("COUNTER_BLOOM_CAPACITY", "1000000"))
+COUNTER_BLOOM_ERROR_RATE = float(os.getenv("COUNTER_BLOOM_ERROR_RATE", "0.001"))
+
+IMPRESSION = "impression"
+CLICK = "click"
+
+
+class ExactCounters:
+    mode = "exact"
+    membership = campaign_scripts.EXACT_MEMBERSHIP
+
+    def __init__(self, cluster: bool = REDIS_CLUSTER):
+        self.cluster = cluster
+        self.log_impression_script = redis_client.register_script(self.membership + campaign_scripts.LOG_IMPRESSION)
+        self.log_click_script = redis_client.register_script(self.membership + campaign_scripts.LOG_CLICK)
+
+    def impressions_keys(self, campaign_id: UUID) -> tuple[str, str]:
+        """
+        Возвращает ключи (дедупликация, счётчик) показов кампании.
+        """
+        key = campaign_key(campaign_id, "impressions")
+        return key, key
+
+    def clicks_keys(self, campaign_id: UUID) -> tuple[str, str]:
+        key = campaign_key(campaign_id, "clicks")
+        return key, key
+
+    async def membership_args(self, client_id: UUID, session: AsyncSession, redis_client_instance) -> list[str]:
+        """
+        Дополнительные аргументы скриптов учёта событий, идентифицирующие клиента в структуре дедупликации.
+        """
+        return []
+
+    def count(self, redis_client_instance, key: str):
+        """
+        Читает счётчик уникальных клиентов; работает и с клиентом Redis, и с пайплайном.
+        """
+        return redis_client_instance.scard(key)
+
+    def build_event(self, kind: str, campaign_id, client_id, advertiser_id, cost: str, start_date, end_date,
+                    membership_args: list[str], day="") -> PendingEvent:
+        """
+        Собирает вызов скрипта учёта показа или клика. advertiser_id равен None для неизвестной
+        кампании - тогда агрегаты рекламодателя не обновляются; пустой day означает текущий день.
+        В кластерном режиме day обязателен, а ключи рекламодателя и current_day не передаются.
+        """
+        if self.cluster:
+            if day in ("", None):
+                raise ValueError("В режиме Redis Cluster день события передаётся явно")
+            # Не читается скриптом, занимает место current_day в слоте кампании.
+            day_key = campaign_key(campaign_id, "current_day")
+            advertiser_keys = []
+        else:
+            day_key = "current_day"
+            advertiser_keys = ([advertiser_key(advertiser_id, "stats"), advertiser_key(advertiser_id, "daily_stats")]
+                               if advertiser_id else [])
+        args = [str(client_id), cost, str(start_date), str(end_date), str(day), *membership_args]
+        if kind == IMPRESSION:
+            return PendingEvent(
+                self.log_impression_script,
+                keys=[*self.impressions_keys(campaign_id), day_key,
+                      campaign_key(campaign_id, "spent_impressions"), campaign_key(campaign_id, "daily_stats"),
+                      *advertiser_keys],
+                args=args,
+                campaign_id=campaign_id,
+                advertiser_id=advertiser_id,
+                cost=cost,
+                counter=ad_impressions_total,
+                revenue=ad_impression_revenue
+            )
+        impressions_members, _ = self.impressions_keys(campaign_id)
+        return PendingEvent(
+            self.log_click_script,
+            keys=[impressions_members, *self.clicks_keys(campaign_id), day_key,
+                  campaign_key(campaign_id, "spent_clicks"), campaign_key(campaign_id, "daily_stats"),
+                  *advertiser_keys],
+            args=args,
+            campaign_id=campaign_id,
+            advertiser_id=advertiser_id,
+            cost=cost,
+            counter=ad_clicks_total,
+            revenue=ad_click_revenue
+        )
+
+
+class ApproximateCounters(ExactCounters):
+    mode = "approximate"
+    membership = campaign_scripts.APPROXIMATE_MEMBERSHIP
+
+    def __init__(self, capacity: int = COUNTER_BLOOM_CAPACITY, error_rate: float = COUNTER_BLOOM_ERROR_RATE,
+                 cluster: bool = REDIS_CLUSTER):
+        super().__init__(cluster)
+        self.bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+
+    def impressions_keys(self, campaign_id: UUID) -> tuple[str, str]:
+        return campaign_key(campaign_id, "impressions_bloom"), campaign_key(campaign_id, "impressions_hll")
+
+    def clicks_keys(self, campaign_id: UUID) -> tuple[str, str]:
+        return campaign_key(campaign_id, "clicks_bloom"), campaign_key(campaign_id, "clicks_hll")
+
+    async def membership_args(self, client_id: UUID, session: AsyncSession, redis_client_instance) -> list[str]:
+        """
+        Номера битов клиента в фильтре Блума (двойное хеширование blake2b).
+        Считаются на стороне приложения: в Lua Redis нет стабильной хеш-функции.
+        """
+        digest = hashlib.blake2b(str(client_id).encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [str((first + i * second) % self.bits) for i in range(self.hashes)]
+
+    def count(self, redis_client_instance, key: str):
+        return redis_client_instance.pfcount(key)
+
+
+class BitmapCounters(ExactCounters):
+    mode = "bitmap"
+    membership = campaign_scripts.BITMAP_MEMBERSHIP
+
+    def impressions_keys(self, campaign_id: UUID) -> tuple[str, str]:
+        key = campaign_key(campaign_id, "impressions_bitmap")
+        return key, key
+
+    def clicks_keys(self, campaign_id: UUID) -> tuple[str, str]:
+        key = campaign_key(campaign_id, "clicks_bitmap")
+        return key, key
+
+    async def membership_args(self, client_id: UUID, session: AsyncSession, redis_client_instance) -> list[str]:
+        ordinal = await ClientOrdinalRepository(session).get_or_assign(client_id, redis_client_instance)
+        return [str(ordinal)]
+
+    def count(self, redis_client_instance, key: str):
+        return redis_client_instance.bitcount(key)
+
+
+COUNTER_BACKENDS = {"exact": ExactCounters, "approximate": ApproximateCounters, "bitmap": BitmapCounters}
+_backends = {}
+
+
+def get_counter_backend(mode: str = None) -> ExactCounters:
+    """
+    Возвращает общий на процесс экземпляр счётчиков для режима (по умолчанию COUNTER_MODE).
+    """
+    mode = mode or COUNTER_MODE
+    if mode not in COUNTER_BACKENDS:
+        raise ValueError(f"Неизвестный режим счётчиков: {mode}")
+    if mode not in _backends:
+        _backends[mode] = COUNTER_BACKENDS[mode]()
+    return _backends[mode]
@@ -0,0 +1,269 @@
+"""
+Lua-скрипты учёта событий кампании. Каждый скрипт выполняется в Redis атомарно,
+поэтому дедупликация клиента, обновление дневной сводки и списание бюджета
+происходят за один сетевой вызов и не гоняются между конкурентными запросами.
+
+Дневная сводка кампании - хеш с полями '<день>:impressions', '<день>:clicks',
+'<день>:spent_impressions' и '<день>:spent_clicks'. Клиент учитывается один раз
+за всю кампанию, поэтому счётчик дня равен числу клиентов, впервые увидевших
+(кликнувших) рекламу в этот день.
+
+Параллельно ведутся агрегаты рекламодателя: хеш итогов (impressions, clicks,
+spent_impressions, spent_clicks) и дневной хеш в том же формате, что и у кампании.
+Дневной агрегат повторяет правила дневной статистики кампании: учитываются только
+дни в пределах [start_date, end_date], а день кампании с кликами, но без показов,
+не виден, пока в этот день не случится показ.
+
+Учёт уникальных клиентов вынесен в примитивы add_member/is_member/record/count,
+которые подставляются перед телом скрипта в зависимости от режима счётчиков
+(см. src/repositories/campaign_counters.py): EXACT_MEMBERSHIP работает с множествами,
+APPROXIMATE_MEMBERSHIP - с фильтром Блума и HyperLogLog, BITMAP_MEMBERSHIP - с битовыми
+картами по номерам клиентов.
+
+Удалённая кампания помечается полем 'deleted' в своей дневной сводке (FORGET_CAMPAIGN):
+события, пришедшие после этого от воркеров со старым снимком, скрипты учёта пропускают,
+и вычтенный из агрегатов рекламодателя вклад кампании не возвращается.
+
+В Redis Cluster ключи рекламодателя и current_day лежат в других слотах, чем ключи кампании,
+и не могут участвовать в одном скрипте. Поэтому ключи рекламодателя необязательны: если они
+не переданы, скрипт не меняет агрегаты сам, а возвращает их изменения списком
+{цель ('stats' или 'daily'), команда, поле, значение}, который вызывающий применяет отдельно
+(см. apply_advertiser_updates в src/services/event_buffer.py). День события в этом режиме
+передаётся в ARGV, а на месте current_day передаётся ключ из слота кампании, который не читается.
+"""
+
+# Изменение агрегата рекламодателя: сразу, если его ключ передан, иначе - в список отложенных.
+# Числа (только целые приращения) форматируются через %d, чтобы -0 не превратился в '-0'.
+ADVERTISER_CALL = """
+local deferred = {}
+local function advertiser_call(key, target, command, field, value)
+    if type(value) == 'number' then
+        value = string.format('%d', value)
+    end
+    if key then
+        redis.call(command, key, field, value)
+    else
+        table.insert(deferred, {target, command, field, value})
+    end
+end
+"""
+
+# Точный режим: множество клиентов служит и для дедупликации, и для подсчёта.
+EXACT_MEMBERSHIP = """
+local function add_member(key) return redis.call('SADD', key, ARGV[1]) end
+local function is_member(key) return redis.call('SISMEMBER', key, ARGV[1]) == 1 end
+local function record(key) end
+local function count(key) return redis.call('SCARD', key) end
+"""
+
+# Приближённый режим: дедупликация по фильтру Блума (номера битов клиента передаются
+# в ARGV начиная с шестого), подсчёт - по HyperLogLog.
+APPROXIMATE_MEMBERSHIP = """
+local function add_member(key)
+    local added = 0
+    for i = 6, #ARGV do
+        if redis.call('SETBIT', key, ARGV[i], 1) == 0 then
+            added = 1
+        end
+    end
+    return added
+end
+local function is_member(key)
+    for i = 6, #ARGV do
+        if redis.call('GETBIT', key, ARGV[i]) == 0 then
+            return false
+        end
+    end
+    return true
+end
+local function record(key) redis.call('PFADD', key, ARGV[1]) end
+local function count(key) return redis.call('PFCOUNT', key) end
+"""
+
+# Битовые карты: бит с номером клиента (ARGV[6]) служит и для дедупликации, и для подсчёта.
+BITMAP_MEMBERSHIP = """
+local function add_member(key) return 1 - redis.call('SETBIT', key, ARGV[6], 1) end
+local function is_member(key) return redis.call('GETBIT', key, ARGV[6]) == 1 end
+local function record(key) end
+local function count(key) return redis.call('BITCOUNT', key) end
+"""
+
+# KEYS: дедупликация показов, счётчик показов, current_day, сумма списаний за показы,
+#       дневная сводка кампании, [итоги рекламодателя, дневной агрегат рекламодателя]
+# ARGV: client_id, стоимость показа, start_date, end_date, день события (пусто - текущий день),
+#       [номера битов клиента или его номер]
+# Если кампания не найдена, передаются только первые пять ключей и пустая стоимость.
+# Возвращает {1, если показ новый, иначе 0; число уникальных показов; отложенные изменения агрегатов}
+LOG_IMPRESSION = ADVERTISER_CALL + """
+if redis.call('HEXISTS', KEYS[5], 'deleted') == 1 then
+    return {0, count(KEYS[2]), deferred}
+end
+local added = add_member(KEYS[1])
+record(KEYS[2])
+if added == 1 then
+    local day = ARGV[5]
+    if day == '' then
+        day = redis.call('GET', KEYS[3]) or '0'
+    end
+    local day_impressions = redis.call('HINCRBY', KEYS[5], day .. ':impressions', 1)
+    if ARGV[2] ~= '' then
+        redis.call('INCRBYFLOAT', KEYS[4], ARGV[2])
+        redis.call('HINCRBYFLOAT', KEYS[5], day .. ':spent_impressions', ARGV[2])
+        advertiser_call(KEYS[6], 'stats', 'HINCRBY', 'impressions', 1)
+        advertiser_call(KEYS[6], 'stats', 'HINCRBYFLOAT', 'spent_impressions', ARGV[2])
+        local d = tonumber(day)
+        if d >= tonumber(ARGV[3]) and d <= tonumber(ARGV[4]) then
+            advertiser_call(KEYS[7], 'daily', 'HINCRBY', day .. ':impressions', 1)
+            advertiser_call(KEYS[7], 'daily', 'HINCRBYFLOAT', day .. ':spent_impressions', ARGV[2])
+            if day_impressions == 1 then
+                local pending_clicks = redis.call('HGET', KEYS[5], day .. ':clicks')
+                if pending_clicks then
+                    advertiser_call(KEYS[7], 'daily', 'HINCRBY', day .. ':clicks', pending_clicks)
+                    local pending_spent = redis.call('HGET', KEYS[5], day .. ':spent_clicks')
+                    if pending_spent then
+                        advertiser_call(KEYS[7], 'daily', 'HINCRBYFLOAT', day .. ':spent_clicks', pending_spent)
+                    end
+                end
+            end
+        end
+    end
+end
+return {added, count(KEYS[2]), deferred}
+"""
+
+# KEYS: дедупликация показов, дедупликация кликов, счётчик кликов, current_day,
+#       сумма списаний за клики, дневная сводка кампании,
+#       [итоги рекламодателя, дневной агрегат рекламодателя]
+# ARGV: client_id, стоимость клика, start_date, end_date, день события (пусто - текущий день),
+#       [номера битов клиента или его номер]
+# Клик засчитывается, только если клиенту уже был показ.
+# Возвращает {1, если клик новый, 0 - повторный, -1 - показа ещё не было;
+#             число уникальных кликов; отложенные изменения агрегатов}
+LOG_CLICK = ADVERTISER_CALL + """
+if redis.call('HEXISTS', KEYS[6], 'deleted') == 1 then
+    return {0, count(KEYS[3]), deferred}
+end
+if not is_member(KEYS[1]) then
+    return {-1, count(KEYS[3]), deferred}
+end
+local added = add_member(KEYS[2])
+record(KEYS[3])
+if added == 1 then
+    local day = ARGV[5]
+    if day == '' then
+        day = redis.call('GET', KEYS[4]) or '0'
+    end
+    redis.call('HINCRBY', KEYS[6], day .. ':clicks', 1)
+    if ARGV[2] ~= '' then
+        redis.call('INCRBYFLOAT', KEYS[5], ARGV[2])
+        redis.call('HINCRBYFLOAT', KEYS[6], day .. ':spent_clicks', ARGV[2])
+        advertiser_call(KEYS[7], 'stats', 'HINCRBY', 'clicks', 1)
+        advertiser_call(KEYS[7], 'stats', 'HINCRBYFLOAT', 'spent_clicks', ARGV[2])
+        local d = tonumber(day)
+        local day_impressions = tonumber(redis.call('HGET', KEYS[6], day .. ':impressions') or '0')
+        if d >= tonumber(ARGV[3]) and d <= tonumber(ARGV[4]) and day_impressions > 0 then
+            advertiser_call(KEYS[8], 'daily', 'HINCRBY', day .. ':clicks', 1)
+            advertiser_call(KEYS[8], 'daily', 'HINCRBYFLOAT', day .. ':spent_clicks', ARGV[2])
+        end
+    end
+end
+return {added, count(KEYS[3]), deferred}
+"""
+
+# KEYS: сумма списаний за показы, сумма списаний за клики, дневная сводка кампании,
+#       [итоги рекламодателя, дневной агрегат рекламодателя]
+# ARGV: start_date, end_date
+# Возвращает отложенные изменения агрегатов, если ключи рекламодателя не переданы.
+# Вызывается после удаления кампании из БД: помечает дневную сводку полем 'deleted'
+# (повторный вызов ничего не вычитает) и вычитает вклад кампании из агрегатов рекламодателя. Число событий берётся
+# из дневной сводки, а не из счётчиков уникальных клиентов, поэтому вычитается ровно
+# то, что было прибавлено, в любом режиме счётчиков.
+FORGET_CAMPAIGN = ADVERTISER_CALL + """
+if redis.call('HSETNX', KEYS[3], 'deleted', '1') == 0 then
+    return deferred
+end
+local spent_impressions = redis.call('GET', KEYS[1])
+if spent_impressions then
+    advertiser_call(KEYS[4], 'stats', 'HINCRBYFLOAT', 'spent_impressions', '-' .. spent_impressions)
+end
+local spent_clicks = redis.call('GET', KEYS[2])
+if spent_clicks then
+    advertiser_call(KEYS[4], 'stats', 'HINCRBYFLOAT', 'spent_clicks', '-' .. spent_clicks)
+end
+local daily = redis.call('HGETALL', KEYS[3])
+local days = {}
+for i = 1, #daily, 2 do
+    local day, field = string.match(daily[i], '^(%d+):(.+)$')
+    if day then
+        days[day] = days[day] or {}
+        days[day][field] = daily[i + 1]
+    end
+end
+for day, fields in pairs(days) do
+    local impressions = tonumber(fields['impressions'] or '0')
+    local clicks = tonumber(fields['clicks'] or '0')
+    advertiser_call(KEYS[4], 'stats', 'HINCRBY', 'impressions', -impressions)
+    advertiser_call(KEYS[4], 'stats', 'HINCRBY', 'clicks', -clicks)
+    local d = tonumber(day)
+    if d >= tonumber(ARGV[1]) and d <= tonumber(ARGV[2]) and impressions > 0 then
+        advertiser_call(KEYS[5], 'daily', 'HINCRBY', day .. ':impressions', -impressions)
+        advertiser_call(KEYS[5], 'daily', 'HINCRBY', day .. ':clicks', -clicks)
+        if fields['spent_impressions'] then
+            advertiser_call(KEYS[5], 'daily', 'HINCRBYFLOAT', day .. ':spent_impressions', '-' .. fields['spent_impressions'])
+        end
+        if fields['spent_clicks'] then
+            advertiser_call(KEYS[5], 'daily', 'HINCRBYFLOAT', day .. ':spent_clicks', '-' .. fields['spent_clicks'])
+        end
+    end
+end
+return deferred
+"""
+
+# KEYS: признак переноса, дневная сводка кампании, затем для каждого дня из ARGV четыре старых ключа:
+#       daily:impressions:<день>, daily:clicks:<день>, daily:spent_impressions:<день>, daily:spent_clicks:<день>
+# ARGV: дни
+# Однократно прибавляет к дневной сводке счётчики из ключей, которые писались до её появления.
+# Прибавление, а не замена: в день перехода часть событий уже попала в сводку.
+# Признак переноса защищает от повторного сложения при конкурентных чтениях; старые ключи не удаляются.
+# Возвращает 1, если перенос выполнен этим вызовом, иначе 0.
+MERGE_LEGACY_DAILY = """
+if redis.call('SET', KEYS[1], '1', 'NX') == false then
+    return 0
+end
+for i = 1, #ARGV do
+    local day = ARGV[i]
+    local base = 2 + (i - 1) * 4
+    local impressions = redis.call('SCARD', KEYS[base + 1])
+    if impressions > 0 then
+        redis.call('HINCRBY', KEYS[2], day .. ':impressions', impressions)
+    end
+    local clicks = redis.call('SCARD', KEYS[base + 2])
+    if clicks > 0 then
+        redis.call('HINCRBY', KEYS[2], day .. ':clicks', clicks)
+    end
+    local spent_impressions = redis.call('GET', KEYS[base + 3])
+    if spent_impressions then
+        redis.call('HINCRBYFLOAT', KEYS[2], day .. ':spent_impressions', spent_impressions)
+    end
+    local spent_clicks = redis.call('GET', KEYS[base + 4])
+    if spent_clicks then
+        redis.call('HINCRBYFLOAT', KEYS[2], day .. ':spent_clicks', spent_clicks)
+    end
+end
+return 1
+"""
+
+# KEYS: поток событий, current_day
+# ARGV: приблизительная максимальная длина потока, тип события ('impression' или 'click'),
+#       campaign_id, advertiser_id (пусто, если кампания не найдена), client_id, стоимость,
+#       start_date, end_date, аргументы дедупликации через пробел, [день события]
+# Дописывает компактное событие в поток, фиксируя день, в который оно произошло.
+APPEND_EVENT = """
+local day = ARGV[10]
+if not day or day == '' then
+    day = redis.call('GET', KEYS[2]) or '0'
+end
+return redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*',
+    't', ARGV[2], 'k', ARGV[3], 'a', ARGV[4], 'u', ARGV[5], 'c', ARGV[6],
+    's', ARGV[7], 'e', ARGV[8], 'd', day, 'm', ARGV[9])
+"""
@@ -0,0 +1,59 @@
+from uuid import UUID
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models.client_ordinal import ClientOrdinal
+from src.repositories.bulk import UPSERT_CHUNK_SIZE, dialect_insert, chunked
+
+CLIENT_ORDINALS_KEY = "client_ordinals"
+
+
+class ClientOrdinalRepository:
+    """
+    Реестр плотных целочисленных номеров клиентов: номер хранится в Postgres
+    (таблица client_ordinals) и кешируется в хеше Redis client_ordinals.
+    Номер выдаётся один раз и не меняется, поэтому кеш не нужно инвалидировать.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def _select_ordinal(self, client_id: UUID) -> int | None:
+        result = await self.session.execute(select(ClientOrdinal.ordinal).where(ClientOrdinal.client_id == client_id))
+        return result.scalar()
+
+    async def get_or_assign(self, client_id: UUID, redis_client_instance) -> int:
+        """
+        Возвращает номер клиента, при первом обращении выдавая новый.
+        Гонка двух воркеров разрешается уникальным индексом: проигравший читает номер победителя.
+        """
+        cached = await redis_client_instance.hget(CLIENT_ORDINALS_KEY, str(client_id))
+        if cached is not None:
+            return int(cached)
+        ordinal = await self._select_ordinal(client_id)
+        if ordinal is None:
+            stmt = dialect_insert(self.session, ClientOrdinal).values(client_id=client_id)
+            await self.session.execute(stmt.on_conflict_do_nothing(index_elements=[ClientOrdinal.client_id]))
+            await self.session.commit()
+            ordinal = await self._select_ordinal(client_id)
+        await redis_client_instance.hset(CLIENT_ORDINALS_KEY, str(client_id), ordinal)
+        return ordinal
+
+    async def assign_many(self, client_ids: list[UUID], redis_client_instance, chunk_size: int = UPSERT_CHUNK_SIZE) -> dict:
+        """
+        Выдаёт номера пачке клиентов (по INSERT ... ON CONFLICT DO NOTHING и одному SELECT на пачку)
+        и заполняет кеш Redis. Возвращает словарь client_id -> номер.
+        """
+        ordinals = {}
+        for chunk in chunked(list(dict.fromkeys(client_ids)), chunk_size):
+            stmt = dialect_insert(self.session, ClientOrdinal).values([{"client_id": client_id} for client_id in chunk])
+            await self.session.execute(stmt.on_conflict_do_nothing(index_elements=[ClientOrdinal.client_id]))
+            result = await self.session.execute(
+                select(ClientOrdinal.client_id, ClientOrdinal.ordinal).where(ClientOrdinal.client_id.in_(chunk))
+            )
+            ordinals.update(result.all())
+        await self.session.commit()
+        if ordinals:
+            await redis_client_instance.hset(
+                CLIENT_ORDINALS_KEY, mapping={str(client_id): ordinal for client_id, ordinal in ordinals.items()}
+            )
+        return ordinals
@@ -1,7 +1,11 @@
-from sqlalchemy import select
+from sqlalchemy import select, any_, bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 from src.models.ml_score import MLScore
+from src.models.user import User
+from src.models.advertiser import Advertiser
+from src.repositories.bulk import dialect_insert
 from src.schemas.ml_score import MLScore as MLScoreSchema
 
 class MLScoreRepository:
@@ -16,6 +20,27 @@ class MLScoreRepository:
         result = await self.session.execute(stmt)
         return result.scalars().first()
 
+    async def get_scores_for_client(self, client_id: UUID, advertiser_ids) -> dict[UUID, int]:
+        """
+        Возвращает ML-скоры клиента для набора рекламодателей одним запросом.
+        На Postgres список передаётся одним массивом (advertiser_id = ANY(:ids)),
+        чтобы форма запроса не зависела от числа рекламодателей; на остальных диалектах - через IN.
+        """
+        advertiser_ids = list(set(advertiser_ids))
+        if not advertiser_ids:
+            return {}
+        if self.session.bind.dialect.name == "postgresql":
+            ids_param = bindparam("advertiser_ids", advertiser_ids, type_=ARRAY(PG_UUID(as_uuid=True)))
+            advertiser_filter = MLScore.advertiser_id == any_(ids_param)
+        else:
+            advertiser_filter = MLScore.advertiser_id.in_(advertiser_ids)
+        stmt = select(MLScore.advertiser_id, MLScore.score).where(
+            MLScore.client_id == client_id,
+            advertiser_filter
+        )
+        result = await self.session.execute(stmt)
+        return {advertiser_id: score for advertiser_id, score in result.all()}
+
     async def upsert(self, ml_data: MLScoreSchema) -> MLScore:
         existing = await self.get_by_ids(ml_data.client_id, ml_data.advertiser_id)
         if existing:
@@ -27,3 +52,54 @@ class MLScoreRepository:
         await self.session.commit()
         await self.session.refresh(existing)
         return existing
+
+    async def existing_references(self, client_ids, advertiser_ids) -> tuple[set[UUID], set[UUID]]:
+        """
+        Возвращает существующие client_id и advertiser_id из переданных наборов двумя запросами.
+        """
+        client_ids, advertiser_ids = list(set(client_ids)), list(set(advertiser_ids))
+        existing_clients, existing_advertisers = set(), set()
+        if client_ids:
+            result = await self.session.execute(select(User.client_id).where(User.client_id.in_(client_ids)))
+            existing_clients = set(result.scalars().all())
+        if advertiser_ids:
+            result = await self.session.execute(
+                select(Advertiser.advertiser_id).where(Advertiser.advertiser_id.in_(advertiser_ids))
+            )
+            existing_advertisers = set(result.scalars().all())
+        return existing_clients, existing_advertisers
+
+    async def load_scores(self, rows: list[dict]) -> None:
+        """
+        Загружает пачку проверенных скоров без коммита; пары (client_id, advertiser_id) в пачке уникальны.
+        На Postgres строки копируются COPY во временную staging-таблицу и переносятся одним
+        INSERT ... SELECT ... ON CONFLICT, на остальных диалектах - многострочным INSERT ... ON CONFLICT.
+        """
+        if not rows:
+            return
+        if self.session.bind.dialect.name == "postgresql":
+            # DDL идёт через сессию, чтобы транзакция уже была открыта до COPY через драйвер.
+            await self.session.execute(text(
+                "CREATE TEMP TABLE IF NOT EXISTS ml_scores_staging "
+                "(client_id uuid, advertiser_id uuid, score integer) ON COMMIT DROP"
+            ))
+            connection = await self.session.connection()
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                "ml_scores_staging",
+                records=[(row["client_id"], row["advertiser_id"], row["score"]) for row in rows],
+                columns=["client_id", "advertiser_id", "score"]
+            )
+            await self.session.execute(text(
+                "INSERT INTO ml_scores (client_id, advertiser_id, score) "
+                "SELECT client_id, advertiser_id, score FROM ml_scores_staging "
+                "ON CONFLICT (client_id, advertiser_id) DO UPDATE SET score = EXCLUDED.score"
+            ))
+            await self.session.execute(text("TRUNCATE ml_scores_staging"))
+            return
+        stmt = dialect_insert(self.session, MLScore).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MLScore.client_id, MLScore.advertiser_id],
+            set_={"score": stmt.excluded.score}
+        )
+        await self.session.execute(stmt)
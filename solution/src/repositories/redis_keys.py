@@ -0,0 +1,19 @@
+"""
+Раскладка ключей Redis кампаний и рекламодателей.
+
+Идентификатор записывается в хеш-теге: campaign:{<id>}:<имя>, advertiser:{<id>}:<имя>.
+Redis Cluster вычисляет слот только по части в фигурных скобках, поэтому все ключи одной
+кампании (счётчики, списания, дневная сводка, оценки ML) лежат в одном слоте и доступны
+многоключевым Lua-скриптам учёта событий, а разные кампании распределяются по узлам.
+Глобальные ключи (current_day, campaigns_version, client_ordinals) хеш-тегов не имеют.
+
+Ключи старого вида campaign:<id>:<имя> переименовывает python -m src.services.redis_key_migration.
+"""
+
+
+def campaign_key(campaign_id, name: str) -> str:
+    return f"campaign:{{{campaign_id}}}:{name}"
+
+
+def advertiser_key(advertiser_id, name: str) -> str:
+    return f"advertiser:{{{advertiser_id}}}:{name}"
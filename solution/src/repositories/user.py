@@ -3,16 +3,40 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 from src.models.user import User
 from src.schemas.client import ClientUpsert
+from src.repositories.bulk import UPSERT_CHUNK_SIZE, dialect_insert, chunked, dedupe_last_wins
+from src.services.client_profile_cache import ClientProfile, ClientProfileCache, client_profile_cache
 
 class UserRepository:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, profiles: ClientProfileCache = None):
         self.session = session
+        self.profiles = profiles if profiles is not None else client_profile_cache
 
     async def get_by_id(self, client_id: UUID) -> User:
         stmt = select(User).where(User.client_id == client_id)
         result = await self.session.execute(stmt)
         return result.scalars().first()
 
+    async def get_profile(self, client_id: UUID) -> ClientProfile | None:
+        """
+        Возвращает возраст, пол и локацию клиента из кеша профилей,
+        при промахе читая из БД только эти столбцы и заполняя кеш.
+        """
+        profile = await self.profiles.get(client_id)
+        if profile is not None:
+            return profile
+        result = await self.session.execute(
+            select(User.client_id, User.age, User.gender, User.location).where(User.client_id == client_id)
+        )
+        row = result.first()
+        if row is None:
+            return None
+        return await self.profiles.fill(ClientProfile(*row))
+
+    async def _write_profiles(self, users: list[User]) -> None:
+        await self.profiles.put_many(
+            [ClientProfile(user.client_id, user.age, user.gender, user.location) for user in users]
+        )
+
     async def upsert(self, client_data: ClientUpsert) -> User:
         user = await self.get_by_id(client_data.client_id)
         if user:
@@ -25,11 +49,32 @@ class UserRepository:
             self.session.add(user)
         await self.session.commit()
         await self.session.refresh(user)
+        await self._write_profiles([user])
         return user
 
-    async def upsert_many(self, clients: list[ClientUpsert]) -> list[User]:
-        results = []
-        for client in clients:
-            updated = await self.upsert(client)
-            results.append(updated)
-        return results
+    async def upsert_many(self, clients: list[ClientUpsert], chunk_size: int = UPSERT_CHUNK_SIZE) -> list[User]:
+        """
+        Массовый upsert клиентов: по одному INSERT ... ON CONFLICT (client_id) DO UPDATE ... RETURNING
+        на каждую пачку из chunk_size строк, все пачки в одной транзакции.
+        При повторе client_id в запросе побеждает последняя запись; ответ сохраняет порядок запроса.
+        """
+        if not clients:
+            return []
+        rows = dedupe_last_wins([client.model_dump(by_alias=True) for client in clients], "client_id")
+        upserted = {}
+        for chunk in chunked(rows, chunk_size):
+            stmt = dialect_insert(self.session, User).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[User.client_id],
+                set_={
+                    "login": stmt.excluded.login,
+                    "age": stmt.excluded.age,
+                    "location": stmt.excluded.location,
+                    "gender": stmt.excluded.gender,
+                }
+            ).returning(User).execution_options(populate_existing=True)
+            result = await self.session.execute(stmt)
+            upserted.update((user.client_id, user) for user in result.scalars().all())
+        await self.session.commit()
+        await self._write_profiles(list(upserted.values()))
+        return [upserted[client.client_id] for client in clients]
@@ -1,17 +1,18 @@
 import asyncio
 from uuid import UUID
-from decimal import Decimal
 from fastapi import APIRouter, HTTPException, Depends, Query, status, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.responses import StreamingResponse
-from src.backend.database import get_session
+from src.backend.database import get_session, get_read_session
 from minio.error import S3Error
 from src.repositories.campaign import CampaignRepository
 from src.repositories.user import UserRepository
 from src.repositories.ml_score import MLScoreRepository
 from src.backend.cache import redis_client
 from src.schemas.ads import Ad, ClickRequest
-from src.services.ad_matching import campaign_matches_client
+from src.services.active_campaigns import (get_candidate_campaigns, get_campaign_content, bump_campaigns_version,
+                                          TARGETING_SQL_PREFILTER)
+from src.services.ranking import rank_campaigns
 from src.services.image_service import save_image_file, delete_image_file, extract_object_info, get_minio_client
 from src.backend.metrics import api_errors_total
 
@@ -21,89 +22,59 @@ router = APIRouter(prefix="/ads", tags=["Ads"])
 @router.get("", response_model=Ad)
 async def get_ad(
     client_id: UUID = Query(...),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_session),
+    read_session: AsyncSession = Depends(get_read_session)
 ):
-    current_day_str = await redis_client.get("current_day")
-    current_day = int(current_day_str) if current_day_str is not None else 0
-
-    user_repo = UserRepository(session)
-    client = await user_repo.get_by_id(client_id)
+    # Профиль клиента и оценки ML читаются из реплики; соединение с основной БД берётся
+    # лишь при обращении - при построении снимка кампаний и учёте показа в режиме bitmap.
+    user_repo = UserRepository(read_session)
+    client = await user_repo.get_profile(client_id)
     if not client:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Клиент не найден")
 
-    campaign_repo = CampaignRepository(session)
-    active_campaigns = await campaign_repo.list_active_campaigns(current_day)
-    if not active_campaigns:
+    # Снимок активных кампаний живёт в воркере до смены версии, поэтому строится по основной БД:
+    # отстающая реплика закрепила бы под новой версией устаревший набор. Строится он редко, а запрос
+    # на каждый показ в режиме TARGETING_SQL_PREFILTER ничего не кеширует и читает реплику.
+    campaign_repo = (CampaignRepository(read_session, use_cache=False) if TARGETING_SQL_PREFILTER
+                     else CampaignRepository(session))
+    candidate_campaigns = await get_candidate_campaigns(campaign_repo, redis_client, client)
+    if candidate_campaigns is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Не найдено активных кампаний")
-
-    candidate_campaigns = [camp for camp in active_campaigns if campaign_matches_client(camp.targeting, client)]
     if not candidate_campaigns:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Не найдено подходящих под параметры кампаний"
         )
 
-    ml_repo = MLScoreRepository(session)
-
-    campaign_metrics = []
-    incomes = []
-    ctrs = []
-
-    for campaign in candidate_campaigns:
-        ml_task = ml_repo.get_by_ids(client_id, campaign.advertiser_id)
-        imp_task = campaign_repo.get_impressions_count(campaign.campaign_id, redis_client)
-        click_task = campaign_repo.get_clicks_count(campaign.campaign_id, redis_client)
-        ml_result, imp_count, click_count = await asyncio.gather(
-            ml_task, imp_task, click_task, return_exceptions=True
-        )
-
-        ml_value = ml_result.score if (ml_result and not isinstance(ml_result, Exception)) else 0
-        ctr = (click_count / imp_count) if imp_count > 0 else 0
-
-        new_income = Decimal(str(ml_value)) * Decimal(str(campaign.cost_per_click)) + Decimal(str(campaign.cost_per_impression))
-        incomes.append(new_income)
-        ctr_decimal = Decimal(str(ctr))
-        ctrs.append(ctr_decimal)
-
-        campaign_metrics.append({
-            "campaign": campaign,
-            "ml_value": ml_value,
-            "ctr": ctr,
-            "new_income": new_income,
-            "impressions_limit": campaign.impressions_limit,
-            "impressions_count": imp_count
-        })
-
-    max_income = max(incomes) if incomes else Decimal("1")
-    max_ctr = max(ctrs) if ctrs else Decimal("1")
-
-    best_campaign = None
-    best_score = -float("inf")
-
-    for metrics in campaign_metrics:
-        if (metrics["impressions_count"] + 1) >= (metrics["impressions_limit"] * 1.05):
-            continue
-
-        normalized_income = metrics["new_income"] / max_income if max_income > 0 else metrics["new_income"]
-        normalized_ctr = Decimal(str(metrics["ctr"])) / max_ctr if max_ctr > 0 else Decimal(str(metrics["ctr"]))
-        candidate_score = Decimal("0.8") * normalized_income + Decimal("0.2") * normalized_ctr
-        candidate_score = float(candidate_score)
-
-        if candidate_score > best_score:
-            best_score = candidate_score
-            best_campaign = metrics["campaign"]
+    ml_repo = MLScoreRepository(read_session)
+    ml_scores, counters = await asyncio.gather(
+        ml_repo.get_scores_for_client(client_id, (campaign.advertiser_id for campaign in candidate_campaigns)),
+        campaign_repo.get_counters_bulk((campaign.campaign_id for campaign in candidate_campaigns), redis_client)
+    )
 
-    if not best_campaign:
+    best_index = rank_campaigns(
+        [ml_scores.get(campaign.advertiser_id, 0) for campaign in candidate_campaigns],
+        [campaign.cost_per_click for campaign in candidate_campaigns],
+        [campaign.cost_per_impression for campaign in candidate_campaigns],
+        [imp_count for imp_count, _ in counters],
+        [click_count for _, click_count in counters],
+        [campaign.impressions_limit for campaign in candidate_campaigns]
+    )
+    if best_index is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Кампания не выбрана")
+    best_campaign = candidate_campaigns[best_index]
+    content = await get_campaign_content(campaign_repo, best_campaign.campaign_id)
+    if content is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Кампания не выбрана")
 
-    await campaign_repo.log_impression(best_campaign.campaign_id, client_id, redis_client)
+    await CampaignRepository(session).log_impression(best_campaign.campaign_id, client_id, redis_client, best_campaign)
 
     return Ad(
         ad_id=best_campaign.campaign_id,
-        ad_title=best_campaign.ad_title,
-        ad_text=best_campaign.ad_text,
+        ad_title=content.ad_title,
+        ad_text=content.ad_text,
         advertiser_id=best_campaign.advertiser_id,
-        image_url=getattr(best_campaign, "image_url", None)
+        image_url=content.image_url
     )
 
 
@@ -129,6 +100,7 @@ async def upload_ad_image(ad_id: UUID, file: UploadFile = File(...), session: As
     campaign.image_url = image_url
     await session.commit()
     await session.refresh(campaign)
+    await bump_campaigns_version(redis_client)
     return {"ad_id": ad_id, "image_url": image_url}
 
 
@@ -152,6 +124,7 @@ async def update_ad_image(ad_id: UUID, file: UploadFile = File(...), session: As
     campaign.image_url = new_image_url
     await session.commit()
     await session.refresh(campaign)
+    await bump_campaigns_version(redis_client)
     return {"ad_id": ad_id, "image_url": new_image_url}
 
 
@@ -172,17 +145,18 @@ async def delete_ad_image(ad_id: UUID, session: AsyncSession = Depends(get_sessi
     campaign.image_url = None
     await session.commit()
     await session.refresh(campaign)
+    await bump_campaigns_version(redis_client)
     return {"ad_id": ad_id, "message": "Изображение удалено"}
 
 
 @router.get("/{ad_id}/image", status_code=status.HTTP_200_OK)
-async def get_ad_image(ad_id: UUID, session: AsyncSession = Depends(get_session)):
+async def get_ad_image(ad_id: UUID, session: AsyncSession = Depends(get_read_session)):
     """
     Возвращает изображение для рекламного объявления по его идентификатору.
     Эндпоинт извлекает информацию о кампании из БД, получает из MinIO объект изображения
     и возвращает его в виде StreamingResponse.
     """
-    campaign_repo = CampaignRepository(session)
+    campaign_repo = CampaignRepository(session, use_cache=False)
     campaign = await campaign_repo.get_campaign_by_id_only(ad_id)
     if not campaign:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Рекламное объявление не найдено")
@@ -221,13 +195,12 @@ async def get_ad_image(ad_id: UUID, session: AsyncSession = Depends(get_session)
 @router.post("/{ad_id}/click", status_code=status.HTTP_204_NO_CONTENT)
 async def record_click(ad_id: UUID, click: ClickRequest, session: AsyncSession = Depends(get_session)):
     campaign_repo = CampaignRepository(session)
-    campaign = await campaign_repo.get_campaign_by_id_only(ad_id)
+    campaign = await campaign_repo.get_campaign_record(ad_id)
     if not campaign:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Рекламное объявление не найдено")
     user_repo = UserRepository(session)
-    user = await user_repo.get_by_id(click.client_id)
+    user = await user_repo.get_profile(click.client_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден")
-    campaign_repo = CampaignRepository(session)
-    await campaign_repo.log_click(ad_id, click.client_id, redis_client)
+    await campaign_repo.log_click(ad_id, click.client_id, redis_client, campaign)
     return None
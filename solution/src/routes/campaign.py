@@ -3,7 +3,7 @@ from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.schemas.campaign import CampaignCreate, CampaignOut, CampaignUpdate
 from src.repositories.campaign import CampaignRepository
-from src.backend.database import get_session
+from src.backend.database import get_session, get_read_session
 from src.services.moderation import moderate_text, should_moderate
 from src.repositories.advertiser import AdvertiserRepository
 
@@ -54,7 +54,7 @@ async def list_all_campaigns(
     advertiserId: UUID,
     page: int = Query(1, ge=1, description="Номер страницы (не меньше 1)"),
     size: int = Query(10, ge=0, description="Количество записей на странице от 0"),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     advertiser_repo = AdvertiserRepository(session)
     advertiser = await advertiser_repo.get_by_id(advertiserId)
@@ -63,7 +63,7 @@ async def list_all_campaigns(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Рекламодатель не найден"
         )
-    repo = CampaignRepository(session)
+    repo = CampaignRepository(session, use_cache=False)
     campaigns = await repo.list_all_campaigns(advertiserId, page, size)
     return campaigns
 
@@ -72,7 +72,7 @@ async def list_all_campaigns(
 async def get_campaign(
     advertiserId: UUID,
     campaignId: UUID,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     advertiser_repo = AdvertiserRepository(session)
     advertiser = await advertiser_repo.get_by_id(advertiserId)
@@ -81,7 +81,7 @@ async def get_campaign(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Рекламодатель не найден"
         )
-    repo = CampaignRepository(session)
+    repo = CampaignRepository(session, use_cache=False)
     campaign = await repo.get_campaign_by_id(advertiserId, campaignId)
     if not campaign:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Кампания не найдена")
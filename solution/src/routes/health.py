@@ -0,0 +1,37 @@
+import asyncio
+import os
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.backend.cache import redis_client
+from src.backend.database import get_session
+
+READINESS_TIMEOUT_S = float(os.getenv("READINESS_TIMEOUT_S", "1"))
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+
+async def _check(probe) -> str:
+    try:
+        await asyncio.wait_for(probe, timeout=READINESS_TIMEOUT_S)
+    except Exception as e:
+        return f"error: {type(e).__name__}"
+    return "ok"
+
+
+@router.get("/ready", include_in_schema=False)
+async def readiness(session: AsyncSession = Depends(get_session)):
+    """
+    Готовность воркера принимать трафик: Redis отвечает на PING, а БД - на SELECT 1
+    за READINESS_TIMEOUT_S секунд. При неготовности возвращается 503.
+    """
+    checks = {
+        "redis": await _check(redis_client.ping()),
+        "database": await _check(session.execute(text("SELECT 1"))),
+    }
+    ready = all(result == "ok" for result in checks.values())
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if ready else "not ready", "checks": checks}
+    )
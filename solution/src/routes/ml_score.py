@@ -1,10 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.schemas.ml_score import MLScore as MLScoreSchema
+from src.schemas.ml_score import MLScore as MLScoreSchema, MLScoreBulkResult
 from src.repositories.ml_score import MLScoreRepository
 from src.repositories.user import UserRepository
 from src.repositories.advertiser import AdvertiserRepository
 from src.backend.database import get_session
+from src.services.ml_score_ingest import (
+    NDJSON_CONTENT_TYPES,
+    CSV_CONTENT_TYPES,
+    iter_ndjson_records,
+    iter_csv_records,
+    iter_json_records,
+    ingest_ml_scores
+)
 
 router = APIRouter(prefix="/ml-scores", tags=["ML Scores"])
 
@@ -30,3 +39,28 @@ async def upsert_ml_score(ml_data: MLScoreSchema, session: AsyncSession = Depend
     ml_repo = MLScoreRepository(session)
     updated_ml = await ml_repo.upsert(ml_data)
     return updated_ml
+
+
+@router.post("/bulk", response_model=MLScoreBulkResult)
+async def upsert_ml_scores_bulk(request: Request, session: AsyncSession = Depends(get_session)):
+    """
+    Массовая загрузка ML-скоров. Тело - JSON-массив (application/json) либо поток
+    NDJSON (application/x-ndjson) или CSV с заголовком client_id,advertiser_id,score (text/csv).
+    Строки с ошибками формата или несуществующими клиентом/рекламодателем отклоняются и попадают в отчёт.
+    """
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    if content_type in NDJSON_CONTENT_TYPES:
+        records = iter_ndjson_records(request.stream())
+    elif content_type in CSV_CONTENT_TYPES:
+        records = iter_csv_records(request.stream())
+    else:
+        try:
+            payload = json.loads(await request.body())
+        except ValueError:
+            payload = None
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ошибка валидации")
+        records = iter_json_records(payload)
+
+    ml_repo = MLScoreRepository(session)
+    return await ingest_ml_scores(records, ml_repo)
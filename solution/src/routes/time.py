@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, status
 from src.backend.cache import redis_client
 from src.schemas.time import AdvanceTimeRequest, AdvanceTimeResponse
+from src.services.active_campaigns import bump_campaigns_version
 
 router = APIRouter(prefix="/time", tags=["Time"])
 
@@ -17,4 +18,5 @@ async def advance_time(request: AdvanceTimeRequest):
         )
 
     await redis_client.set("current_day", request.current_date)
+    await bump_campaigns_version(redis_client)
     return AdvanceTimeResponse(current_date=request.current_date)
@@ -4,13 +4,13 @@ from uuid import UUID
 from typing import List
 from src.schemas.client import ClientUpsert, ClientOut
 from src.repositories.user import UserRepository
-from src.backend.database import get_session
+from src.backend.database import get_session, get_read_session
 
 router = APIRouter(prefix="/clients", tags=["Clients"])
 
 
 @router.get("/{clientId}", response_model=ClientOut)
-async def read_client(clientId: UUID, session: AsyncSession = Depends(get_session)):
+async def read_client(clientId: UUID, session: AsyncSession = Depends(get_read_session)):
     repo = UserRepository(session)
     client = await repo.get_by_id(clientId)
     if not client:
@@ -6,4 +6,14 @@ class MLScore(BaseModel):
     advertiser_id: UUID
     score: int = Field(..., ge=0)
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class MLScoreRejectedRow(BaseModel):
+    row: int
+    reason: str
+
+
+class MLScoreBulkResult(BaseModel):
+    accepted: int = Field(..., ge=0)
+    rejected_count: int = Field(..., ge=0)
+    rejected: list[MLScoreRejectedRow]
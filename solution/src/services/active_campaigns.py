@@ -0,0 +1,159 @@
+import os
+import time
+import uuid
+from uuid import UUID
+from src.services.ad_matching import TargetingIndex
+from src.services.campaign_cache import campaign_cache
+
+CAMPAIGNS_VERSION_KEY = "campaigns_version"
+# Ограничение времени жизни снимка сверх смены дня и версии (0 - без ограничения).
+# GET /ads строит снимок по основной БД, так что отставание реплик его не затрагивает.
+ACTIVE_CAMPAIGNS_MAX_AGE_S = float(os.getenv("ACTIVE_CAMPAIGNS_MAX_AGE_S", "0"))
+# Подбирать кампании клиента запросом к БД с фильтром таргетинга в SQL на каждый показ
+# вместо снимка в памяти воркера - для наборов кампаний, которые не помещаются в память.
+TARGETING_SQL_PREFILTER = os.getenv("TARGETING_SQL_PREFILTER", "0") == "1"
+
+
+class ServingCampaign:
+    """
+    Поля кампании, нужные для подбора, ранжирования и учёта показа, без текстов объявления.
+    """
+    __slots__ = ("campaign_id", "advertiser_id", "cost_per_impression", "cost_per_click",
+                 "impressions_limit", "clicks_limit", "start_date", "end_date", "targeting")
+
+    def __init__(self, campaign_id: UUID, advertiser_id: UUID, cost_per_impression, cost_per_click,
+                 impressions_limit: int, clicks_limit: int, start_date: int, end_date: int, targeting: dict | None):
+        self.campaign_id = campaign_id
+        self.advertiser_id = advertiser_id
+        self.cost_per_impression = cost_per_impression
+        self.cost_per_click = cost_per_click
+        self.impressions_limit = impressions_limit
+        self.clicks_limit = clicks_limit
+        self.start_date = start_date
+        self.end_date = end_date
+        self.targeting = targeting
+
+
+class CampaignContent:
+    """
+    Тексты и изображение объявления, которые читаются только для выбранной кампании.
+    """
+    __slots__ = ("ad_title", "ad_text", "image_url")
+
+    def __init__(self, ad_title: str, ad_text: str, image_url: str | None):
+        self.ad_title = ad_title
+        self.ad_text = ad_text
+        self.image_url = image_url
+
+
+class ActiveCampaignsSnapshot:
+    """
+    Снимок активных кампаний одного воркера для конкретного дня и версии набора кампаний
+    вместе с построенным по ним индексом таргетинга. Тексты объявлений подгружаются
+    в contents по мере того, как кампании выигрывают показ.
+    """
+    __slots__ = ("current_day", "version", "campaigns", "targeting_index", "built_at", "contents")
+
+    def __init__(self, current_day: int, version: str, campaigns: tuple[ServingCampaign, ...]):
+        self.current_day = current_day
+        self.version = version
+        self.campaigns = campaigns
+        self.targeting_index = TargetingIndex(campaigns)
+        self.built_at = time.monotonic()
+        self.contents = {}
+
+    def expired(self) -> bool:
+        return ACTIVE_CAMPAIGNS_MAX_AGE_S > 0 and time.monotonic() - self.built_at >= ACTIVE_CAMPAIGNS_MAX_AGE_S
+
+
+_snapshot: ActiveCampaignsSnapshot | None = None
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+async def bump_campaigns_version(redis_client_instance) -> None:
+    """
+    Инвалидирует снимки активных кампаний во всех воркерах.
+    Версия - случайный токен, а не счётчик: после очистки или перезапуска Redis
+    новая версия не может совпасть со старой, закешированной в воркере.
+    """
+    await redis_client_instance.set(CAMPAIGNS_VERSION_KEY, uuid.uuid4().hex)
+
+
+async def read_campaigns_version(redis_client_instance) -> str | None:
+    """
+    Возвращает текущую версию набора кампаний без её создания (None - кампании ещё не менялись).
+    """
+    return _decode(await redis_client_instance.get(CAMPAIGNS_VERSION_KEY))
+
+
+async def _read_day_and_version(redis_client_instance) -> tuple[int, str]:
+    # Пайплайн вместо MGET: в Redis Cluster ключи лежат в разных слотах.
+    async with redis_client_instance.pipeline(transaction=False) as pipe:
+        pipe.get("current_day")
+        pipe.get(CAMPAIGNS_VERSION_KEY)
+        current_day_raw, version = await pipe.execute()
+    current_day = int(_decode(current_day_raw)) if current_day_raw is not None else 0
+    if version is None:
+        await redis_client_instance.set(CAMPAIGNS_VERSION_KEY, uuid.uuid4().hex, nx=True)
+        version = await redis_client_instance.get(CAMPAIGNS_VERSION_KEY)
+    return current_day, _decode(version)
+
+
+async def get_active_campaigns(campaign_repo, redis_client_instance) -> ActiveCampaignsSnapshot:
+    """
+    Возвращает снимок кампаний, активных в текущий день.
+    Пока день и версия набора кампаний в Redis не изменились, кампании берутся
+    из снимка в памяти воркера без обращения к Postgres.
+    """
+    global _snapshot
+    current_day, version = await _read_day_and_version(redis_client_instance)
+    snapshot = _snapshot
+    if (snapshot is not None and snapshot.current_day == current_day and snapshot.version == version
+            and not snapshot.expired()):
+        return snapshot
+
+    # Набор кампаний мог измениться в другом воркере: записи кеша кампаний могли устареть.
+    campaign_cache.sync_version(version)
+    campaigns = await campaign_repo.list_serving_campaigns(current_day)
+    _snapshot = ActiveCampaignsSnapshot(current_day, version, tuple(campaigns))
+    return _snapshot
+
+
+async def get_candidate_campaigns(campaign_repo, redis_client_instance, client) -> list | None:
+    """
+    Возвращает активные кампании, подходящие клиенту по таргетингу. None означает,
+    что активных кампаний нет совсем; с TARGETING_SQL_PREFILTER=1 это не различается
+    и возвращается пустой список.
+    """
+    if TARGETING_SQL_PREFILTER:
+        current_day, _ = await _read_day_and_version(redis_client_instance)
+        return await campaign_repo.list_serving_campaigns(current_day, client)
+    active_campaigns = await get_active_campaigns(campaign_repo, redis_client_instance)
+    if not active_campaigns.campaigns:
+        return None
+    return active_campaigns.targeting_index.match(client)
+
+
+async def get_campaign_content(campaign_repo, campaign_id: UUID) -> CampaignContent | None:
+    """
+    Возвращает тексты выбранной кампании. В режиме снимка они запоминаются в нём
+    и сбрасываются вместе со снимком при изменении кампаний (в том числе изображений).
+    """
+    snapshot = None if TARGETING_SQL_PREFILTER else _snapshot
+    if snapshot is not None and campaign_id in snapshot.contents:
+        return snapshot.contents[campaign_id]
+    content = await campaign_repo.get_campaign_content(campaign_id)
+    if snapshot is not None and content is not None:
+        snapshot.contents[campaign_id] = content
+    return content
+
+
+def reset_active_campaigns() -> None:
+    """
+    Сбрасывает снимок текущего воркера.
+    """
+    global _snapshot
+    _snapshot = None
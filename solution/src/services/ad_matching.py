@@ -1,3 +1,6 @@
+from bisect import bisect_left
+
+
 def campaign_matches_client(targeting: dict, client) -> bool:
     """
     Если таргетинг отсутствует (None), кампания подходит для всех.
@@ -23,3 +26,65 @@ def campaign_matches_client(targeting: dict, client) -> bool:
 
     return True
 
+
+class TargetingIndex:
+    """
+    Предвычисленный индекс таргетинга для набора кампаний.
+    Кампании раскладываются по корзинам (пол, локация), где None означает отсутствие ограничения
+    (для пола также 'ALL'). Внутри корзины возраст индексируется элементарными отрезками между
+    границами age_from/age_to, для каждого из которых заранее известен список подходящих кампаний.
+    match возвращает ровно те кампании, для которых campaign_matches_client вернул бы True,
+    в исходном порядке, а стоимость поиска пропорциональна числу совпадений.
+    """
+
+    def __init__(self, campaigns):
+        self.campaigns = tuple(campaigns)
+        grouped = {}
+        for position, campaign in enumerate(self.campaigns):
+            targeting = campaign.targeting
+            if targeting is None:
+                key, age_from, age_to = (None, None), None, None
+            else:
+                gender = targeting.get("gender")
+                if gender is not None:
+                    gender = gender.upper()
+                    if gender == "ALL":
+                        gender = None
+                key = (gender, targeting.get("location"))
+                age_from, age_to = targeting.get("age_from"), targeting.get("age_to")
+            grouped.setdefault(key, []).append((position, age_from, age_to))
+        self._buckets = {key: _AgeSlots(members) for key, members in grouped.items()}
+
+    def match(self, client) -> list:
+        gender = client.gender.upper()
+        keys = {(None, None), (None, client.location), (gender, None), (gender, client.location)}
+        positions = []
+        for key in keys:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                positions.extend(bucket.lookup(client.age))
+        positions.sort()
+        return [self.campaigns[position] for position in positions]
+
+
+class _AgeSlots:
+    """
+    Слоты чередуются: чётный 2*i - интервал строго перед i-й границей, нечётный 2*i+1 - сама граница.
+    """
+
+    def __init__(self, members):
+        self._bounds = sorted({bound for _, age_from, age_to in members
+                               for bound in (age_from, age_to) if bound is not None})
+        slots = [[] for _ in range(2 * len(self._bounds) + 1)]
+        for position, age_from, age_to in members:
+            first = 0 if age_from is None else 2 * bisect_left(self._bounds, age_from) + 1
+            last = len(slots) - 1 if age_to is None else 2 * bisect_left(self._bounds, age_to) + 1
+            for slot in range(first, last + 1):
+                slots[slot].append(position)
+        self._slots = [tuple(slot) for slot in slots]
+
+    def lookup(self, age) -> tuple:
+        i = bisect_left(self._bounds, age)
+        if i < len(self._bounds) and self._bounds[i] == age:
+            return self._slots[2 * i + 1]
+        return self._slots[2 * i]
@@ -0,0 +1,79 @@
+"""
+Однократное заполнение агрегатов рекламодателей advertiser:{id}:stats и :daily_stats
+из счётчиков их кампаний для данных Redis, накопленных до появления агрегатов.
+
+Запускается entry.sh перед стартом приложения после переименования ключей старого вида
+(src/services/redis_key_migration.py); пока такие ключи остаются, заполнение откладывается:
+
+    python -m src.services.advertiser_stats_backfill [--force]
+
+После заполнения ставится ключ ADVERTISER_STATS_BACKFILL_KEY, и повторные запуски ничего не делают;
+--force пересчитывает агрегаты заново. Пересчёт заменяет хеши целиком, поэтому события,
+учтённые во время работы, могут потеряться - запускайте его без трафика.
+
+Заполнение выполняется под блокировкой Redis ADVERTISER_STATS_BACKFILL_LOCK_KEY: при одновременном
+старте нескольких реплик одна пересчитывает агрегаты, а остальные ждут её (не обслуживая запросы)
+и после отметки о заполнении ничего не делают. Блокировка снимается сама через
+ADVERTISER_STATS_BACKFILL_LOCK_TIMEOUT_S секунд, если процесс упал, не освободив её.
+"""
+import argparse
+import asyncio
+import os
+from sqlalchemy import select
+from src.models.advertiser import Advertiser
+from src.repositories.campaign import CampaignRepository
+from src.services.redis_key_migration import has_untagged_keys
+
+ADVERTISER_STATS_BACKFILL_KEY = "advertiser_stats_backfilled"
+ADVERTISER_STATS_BACKFILL_LOCK_KEY = "advertiser_stats_backfill_lock"
+ADVERTISER_STATS_BACKFILL_LOCK_TIMEOUT_S = float(os.getenv("ADVERTISER_STATS_BACKFILL_LOCK_TIMEOUT_S", "600"))
+
+
+async def backfill_advertiser_stats(session, redis_client_instance, force: bool = False) -> int | None:
+    """
+    Пересчитывает агрегаты всех рекламодателей. Возвращает их число, 0 - если заполнение уже выполнено,
+    None - если остались ключи старого вида: агрегаты по ним получились бы нулевыми, а отметка
+    о заполнении не дала бы пересчитать их после переименования.
+    """
+    if not force and await redis_client_instance.exists(ADVERTISER_STATS_BACKFILL_KEY):
+        return 0
+    async with redis_client_instance.lock(ADVERTISER_STATS_BACKFILL_LOCK_KEY,
+                                          timeout=ADVERTISER_STATS_BACKFILL_LOCK_TIMEOUT_S):
+        # Пока ждали блокировку, заполнение могла выполнить другая реплика.
+        if not force and await redis_client_instance.exists(ADVERTISER_STATS_BACKFILL_KEY):
+            return 0
+        return await _rebuild(session, redis_client_instance)
+
+
+async def _rebuild(session, redis_client_instance) -> int | None:
+    if await has_untagged_keys(redis_client_instance):
+        return None
+    repo = CampaignRepository(session)
+    advertiser_ids = (await session.execute(select(Advertiser.advertiser_id))).scalars().all()
+    for advertiser_id in advertiser_ids:
+        await repo.rebuild_advertiser_stats(advertiser_id, redis_client_instance)
+    await redis_client_instance.set(ADVERTISER_STATS_BACKFILL_KEY, 1)
+    return len(advertiser_ids)
+
+
+async def _main(force: bool) -> int | None:
+    from src.backend.cache import redis_client
+    from src.backend.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        return await backfill_advertiser_stats(session, redis_client, force)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Заполнение агрегатов рекламодателей из счётчиков кампаний")
+    parser.add_argument("--force", action="store_true", help="Пересчитать, даже если заполнение уже выполнено")
+    args = parser.parse_args(argv)
+    count = asyncio.run(_main(args.force))
+    if count is None:
+        print("Заполнение отложено: остались ключи старого вида, запустите python -m src.services.redis_key_migration")
+    else:
+        print(f"Пересчитано рекламодателей: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Кеш записей кампаний по идентификатору в памяти воркера.
+
+Учёт показов и кликов и статистика кампании читают из Postgres только стоимость, даты и
+рекламодателя кампании; кеш хранит эти поля в компактной записи CampaignRecord и убирает
+запрос к БД на каждое событие.
+
+Записи живут не дольше CAMPAIGN_CACHE_TTL_S секунд, а кеш вмещает не более
+CAMPAIGN_CACHE_MAX_SIZE записей - при переполнении вытесняется давно не читавшаяся (LRU).
+update_campaign и delete_campaign сбрасывают запись в своём воркере и меняют версию набора
+кампаний в Redis; get_campaign_record сверяет её одним GET перед чтением кеша, поэтому остальные
+воркеры очищают кеш при первом же обращении после изменения, а не по истечении TTL.
+Отсутствующие кампании не кешируются.
+"""
+import os
+import time
+from uuid import UUID
+from src.services.ttl_cache import TTLCache
+
+CAMPAIGN_CACHE_TTL_S = float(os.getenv("CAMPAIGN_CACHE_TTL_S", "30"))
+CAMPAIGN_CACHE_MAX_SIZE = int(os.getenv("CAMPAIGN_CACHE_MAX_SIZE", "10000"))
+
+
+class CampaignRecord:
+    """
+    Поля кампании, нужные для учёта событий и статистики.
+    """
+    __slots__ = ("campaign_id", "advertiser_id", "cost_per_impression", "cost_per_click", "start_date", "end_date")
+
+    def __init__(self, campaign_id: UUID, advertiser_id: UUID, cost_per_impression, cost_per_click,
+                 start_date: int, end_date: int):
+        self.campaign_id = campaign_id
+        self.advertiser_id = advertiser_id
+        self.cost_per_impression = cost_per_impression
+        self.cost_per_click = cost_per_click
+        self.start_date = start_date
+        self.end_date = end_date
+
+
+class CampaignCache(TTLCache):
+    def __init__(self, ttl_s: float = CAMPAIGN_CACHE_TTL_S, max_size: int = CAMPAIGN_CACHE_MAX_SIZE, clock=time.monotonic):
+        super().__init__(ttl_s, max_size, clock)
+        self.version = None
+
+    def sync_version(self, version) -> None:
+        """
+        Очищает кеш, если версия набора кампаний изменилась с прошлой сверки.
+        """
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+
+campaign_cache = CampaignCache()
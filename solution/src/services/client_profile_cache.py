@@ -0,0 +1,110 @@
+"""
+Кеш профилей клиентов (возраст, пол, локация) для показа рекламы и проверки кликов.
+
+Два уровня:
+  * LRU в памяти воркера - не более CLIENT_PROFILE_CACHE_MAX_SIZE профилей, каждый живёт
+    CLIENT_PROFILE_LOCAL_TTL_S секунд;
+  * строка client:{id}:profile в Redis вида "возраст|пол|локация" со сроком жизни
+    CLIENT_PROFILE_REDIS_TTL_S секунд, общая для всех воркеров.
+Профили меняются только через UserRepository.upsert/upsert_many, которые после коммита
+записывают новые значения в оба уровня (write-through). Промах get_profile заполняет Redis
+через SET NX: прочитанный до upsert профиль не затирает записанный им новый. Другие воркеры могут видеть старый
+профиль из своей памяти не дольше CLIENT_PROFILE_LOCAL_TTL_S. Отсутствующие клиенты не кешируются.
+Попадания считаются в client_profile_cache_hits_total по уровням, промахи -
+в client_profile_cache_misses_total.
+"""
+import os
+from uuid import UUID
+from src.backend.cache import redis_client
+from src.backend.metrics import client_profile_cache_hits_total, client_profile_cache_misses_total
+from src.services.ttl_cache import TTLCache
+
+CLIENT_PROFILE_CACHE_MAX_SIZE = int(os.getenv("CLIENT_PROFILE_CACHE_MAX_SIZE", "100000"))
+CLIENT_PROFILE_LOCAL_TTL_S = float(os.getenv("CLIENT_PROFILE_LOCAL_TTL_S", "5"))
+CLIENT_PROFILE_REDIS_TTL_S = int(os.getenv("CLIENT_PROFILE_REDIS_TTL_S", "86400"))
+
+
+class ClientProfile:
+    """
+    Поля клиента, по которым подбирается реклама.
+    """
+    __slots__ = ("client_id", "age", "gender", "location")
+
+    def __init__(self, client_id: UUID, age: int, gender: str, location: str):
+        self.client_id = client_id
+        self.age = age
+        self.gender = gender
+        self.location = location
+
+    def dumps(self) -> str:
+        # Локация идёт последней: в ней может встретиться разделитель.
+        return f"{self.age}|{self.gender}|{self.location}"
+
+    @classmethod
+    def loads(cls, client_id: UUID, value) -> "ClientProfile":
+        value = value.decode() if isinstance(value, bytes) else value
+        age, gender, location = value.split("|", 2)
+        return cls(client_id, int(age), gender, location)
+
+
+def profile_key(client_id: UUID) -> str:
+    return f"client:{client_id}:profile"
+
+
+class ClientProfileCache:
+    def __init__(self, redis_client_instance, max_size: int = CLIENT_PROFILE_CACHE_MAX_SIZE,
+                 local_ttl_s: float = CLIENT_PROFILE_LOCAL_TTL_S, redis_ttl_s: int = CLIENT_PROFILE_REDIS_TTL_S):
+        self.redis = redis_client_instance
+        self.local = TTLCache(local_ttl_s, max_size)
+        self.redis_ttl_s = redis_ttl_s
+
+    async def get(self, client_id: UUID) -> ClientProfile | None:
+        """
+        Ищет профиль в памяти воркера, затем в Redis. None означает промах обоих уровней.
+        """
+        profile = self.local.get(client_id)
+        if profile is not None:
+            client_profile_cache_hits_total.labels(layer="local").inc()
+            return profile
+        value = await self.redis.get(profile_key(client_id))
+        if value is None:
+            client_profile_cache_misses_total.inc()
+            return None
+        client_profile_cache_hits_total.labels(layer="redis").inc()
+        profile = ClientProfile.loads(client_id, value)
+        self.local.put(client_id, profile)
+        return profile
+
+    async def put_many(self, profiles: list[ClientProfile]) -> None:
+        """
+        Записывает профили в оба уровня; в Redis - одним пайплайном.
+        """
+        if not profiles:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for profile in profiles:
+                pipe.set(profile_key(profile.client_id), profile.dumps(), ex=self.redis_ttl_s)
+            await pipe.execute()
+        for profile in profiles:
+            self.local.put(profile.client_id, profile)
+
+    async def fill(self, profile: ClientProfile) -> ClientProfile:
+        """
+        Заполняет кеш профилем, прочитанным из БД при промахе. В Redis профиль пишется только
+        при отсутствии ключа; если его успел записать upsert, возвращается и кешируется его значение.
+        """
+        key = profile_key(profile.client_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(key, profile.dumps(), ex=self.redis_ttl_s, nx=True)
+            pipe.get(key)
+            _, value = await pipe.execute()
+        if value is not None:
+            profile = ClientProfile.loads(profile.client_id, value)
+        self.local.put(profile.client_id, profile)
+        return profile
+
+    def clear_local(self) -> None:
+        self.local.clear()
+
+
+client_profile_cache = ClientProfileCache(redis_client)
@@ -0,0 +1,256 @@
+"""
+Отложенная запись показов и кликов (write-behind), включается переменной EVENT_WRITE_BEHIND=1.
+
+Запрос только кладёт подготовленный вызов Lua-скрипта учёта события в ограниченный буфер
+процесса; фоновая задача сбрасывает буфер пачками в один пайплайн Redis каждые
+EVENT_BUFFER_FLUSH_INTERVAL_MS миллисекунд или по накоплении EVENT_BUFFER_BATCH_SIZE событий.
+Метрики Prometheus обновляются по результатам пачки, по одному inc на кампанию.
+
+Гарантии (буфер свой у каждого воркера gunicorn, поэтому они действуют в пределах процесса):
+  * события процесса применяются в порядке поступления, поэтому клик не обгоняет показ,
+    прошедший через тот же воркер;
+  * показ и клик одного клиента могут попасть в разные воркеры, и клик может дойти до Redis
+    раньше показа из чужого буфера. Такой клик (скрипт вернул -1) не отбрасывается, а
+    повторяется в следующих сбросах в течение EVENT_BUFFER_CLICK_RETRY_S секунд - этого
+    достаточно, чтобы соседние воркеры сбросили свои буферы; клик, показа для которого
+    так и не появилось, отбрасывается, как и без буфера, и учитывается в метрике
+    event_dropped_early_clicks_total;
+  * доставка "хотя бы один раз" в пределах процесса: при ошибке Redis пачка возвращается
+    в начало буфера и повторяется. Повтор безопасен, так как скрипты дедуплицируют клиента
+    в пределах кампании и повторное событие ничего не списывает;
+  * при заполнении буфера (EVENT_BUFFER_CAPACITY) запросы ждут, пока фоновая задача
+    освободит место, - так нагрузка упирается в пропускную способность Redis, а не в память;
+  * при остановке приложения (lifespan) буфер сбрасывается до конца; если Redis недоступен
+    дольше EVENT_BUFFER_SHUTDOWN_TIMEOUT_S секунд, оставшиеся события теряются.
+Счётчики в Redis при этом отстают от запросов на время до одного интервала сброса.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from redis.exceptions import NoScriptError
+from src.backend.cache import redis_client
+from src.repositories.redis_keys import advertiser_key
+from src.backend.metrics import event_buffer_pending, event_buffer_flush_errors_total, event_dropped_early_clicks_total
+
+EVENT_WRITE_BEHIND = os.getenv("EVENT_WRITE_BEHIND", "0") == "1"
+EVENT_BUFFER_CAPACITY = int(os.getenv("EVENT_BUFFER_CAPACITY", "10000"))
+EVENT_BUFFER_BATCH_SIZE = int(os.getenv("EVENT_BUFFER_BATCH_SIZE", "500"))
+EVENT_BUFFER_FLUSH_INTERVAL_MS = int(os.getenv("EVENT_BUFFER_FLUSH_INTERVAL_MS", "5"))
+EVENT_BUFFER_SHUTDOWN_TIMEOUT_S = float(os.getenv("EVENT_BUFFER_SHUTDOWN_TIMEOUT_S", "10"))
+EVENT_BUFFER_CLICK_RETRY_S = float(os.getenv("EVENT_BUFFER_CLICK_RETRY_S", "1"))
+
+
+class PendingEvent:
+    """
+    Подготовленный вызов скрипта учёта события и метрики, которые нужно обновить,
+    если скрипт засчитает событие как новое.
+    """
+    __slots__ = ("script", "keys", "args", "campaign_id", "advertiser_id", "cost", "counter", "revenue",
+                 "retry_until")
+
+    def __init__(self, script, keys: list, args: list, campaign_id, cost: str, counter, revenue, advertiser_id=None):
+        self.retry_until = None
+        self.script = script
+        self.keys = keys
+        self.args = args
+        self.campaign_id = campaign_id
+        self.advertiser_id = advertiser_id
+        self.cost = cost
+        self.counter = counter
+        self.revenue = revenue
+
+
+def record_event_metrics(events, results) -> None:
+    """
+    Обновляет счётчики и доход кампаний по результатам скриптов: по одному inc на кампанию и метрику.
+    """
+    totals = {}
+    for event, result in zip(events, results):
+        if result[0] == 1 and event.cost:
+            key = (event.counter, event.revenue, str(event.campaign_id))
+            count, revenue = totals.get(key, (0, 0.0))
+            totals[key] = (count + 1, revenue + float(event.cost))
+    for (counter, revenue_metric, campaign_id), (count, revenue) in totals.items():
+        counter.labels(campaign_id=campaign_id).inc(count)
+        revenue_metric.labels(campaign_id=campaign_id).inc(revenue)
+
+
+def record_dropped_early_clicks(source: str, count: int) -> None:
+    """
+    Учитывает клики, отброшенные после окна повторов: показ для них так и не появился.
+    """
+    if count:
+        event_dropped_early_clicks_total.labels(source=source).inc(count)
+
+
+ADVERTISER_TARGETS = {"stats": "stats", "daily": "daily_stats"}
+FAILED_EVENT_RESULT = (0, 0, [])
+# Результат скрипта учёта клика, для которого ещё не было показа.
+CLICK_BEFORE_IMPRESSION = -1
+
+
+async def apply_advertiser_updates(redis_client_instance, updates_by_advertiser) -> None:
+    """
+    Применяет одним пайплайном отложенные скриптами изменения агрегатов рекламодателей
+    (режим Redis Cluster): пары (advertiser_id, список {цель, команда, поле, значение}).
+    В отличие от обновления кампании, эти изменения не атомарны со скриптом: если Redis
+    откажет между вызовами, повтор события их уже не применит.
+    """
+    updates_by_advertiser = [(advertiser_id, updates) for advertiser_id, updates in updates_by_advertiser
+                             if advertiser_id and updates]
+    if not updates_by_advertiser:
+        return
+    async with redis_client_instance.pipeline(transaction=False) as pipe:
+        for advertiser_id, updates in updates_by_advertiser:
+            for target, command, field, value in updates:
+                pipe.execute_command(command, advertiser_key(advertiser_id, ADVERTISER_TARGETS[target]), field, value)
+        await pipe.execute()
+
+
+async def _execute_pipeline(redis_client_instance, events) -> list:
+    async with redis_client_instance.pipeline(transaction=False) as pipe:
+        for event in events:
+            await event.script(keys=event.keys, args=event.args, client=pipe)
+        return await pipe.execute(raise_on_error=False)
+
+
+async def execute_events(redis_client_instance, events) -> list:
+    """
+    Выполняет вызовы скриптов одним пайплайном и применяет отложенные изменения агрегатов
+    рекламодателей. Ошибка соединения пробрасывается; ошибку отдельного скрипта повтор
+    не исправит, поэтому такое событие отбрасывается и учитывается в event_buffer_flush_errors_total.
+    Пайплайн Redis Cluster не загружает скрипты сам, поэтому при NOSCRIPT скрипты
+    загружаются на все узлы и не выполненные события повторяются один раз.
+    """
+    results = await _execute_pipeline(redis_client_instance, events)
+    missing = [i for i, result in enumerate(results) if isinstance(result, NoScriptError)]
+    if missing:
+        for script in {id(events[i].script): events[i].script for i in missing}.values():
+            script.sha = await redis_client_instance.script_load(script.script)
+        retried = await _execute_pipeline(redis_client_instance, [events[i] for i in missing])
+        for i, result in zip(missing, retried):
+            results[i] = result
+    failed = sum(isinstance(result, Exception) for result in results)
+    if failed:
+        event_buffer_flush_errors_total.inc(failed)
+    results = [FAILED_EVENT_RESULT if isinstance(result, Exception) else result for result in results]
+    await apply_advertiser_updates(redis_client_instance, [
+        (event.advertiser_id, result[2]) for event, result in zip(events, results)
+    ])
+    return results
+
+
+class EventBuffer:
+    def __init__(self, redis_client_instance, capacity: int = EVENT_BUFFER_CAPACITY,
+                 batch_size: int = EVENT_BUFFER_BATCH_SIZE, flush_interval_ms: int = EVENT_BUFFER_FLUSH_INTERVAL_MS,
+                 click_retry_s: float = EVENT_BUFFER_CLICK_RETRY_S, clock=time.monotonic):
+        self.redis = redis_client_instance
+        self.click_retry_s = click_retry_s
+        self.clock = clock
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._events = deque()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = EVENT_BUFFER_SHUTDOWN_TIMEOUT_S) -> None:
+        """
+        Останавливает фоновую задачу, предварительно сбросив все накопленные события.
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        self._ready.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        finally:
+            self._task = None
+
+    async def put(self, event: PendingEvent) -> None:
+        """
+        Кладёт событие в буфер; если буфер заполнен, ждёт, пока фоновая задача освободит место.
+        """
+        while len(self._events) >= self.capacity:
+            self._space.clear()
+            self._ready.set()
+            await self._space.wait()
+        self._events.append(event)
+        event_buffer_pending.set(len(self._events))
+        if len(self._events) >= self.batch_size:
+            self._ready.set()
+
+    async def _execute(self, batch: list) -> list:
+        return await execute_events(self.redis, batch)
+
+    async def flush(self) -> None:
+        """
+        Сбрасывает буфер пачками. При ошибке пачка возвращается в начало буфера
+        для повтора, а исключение пробрасывается вызывающему. Клики, опередившие свой показ,
+        возвращаются в конец буфера и повторяются следующим сбросом.
+        """
+        retries = []
+        try:
+            await self._flush_batches(retries)
+        finally:
+            self._events.extend(retries)
+            event_buffer_pending.set(len(self._events))
+
+    def _should_retry(self, event: PendingEvent, result) -> bool:
+        if result[0] != CLICK_BEFORE_IMPRESSION:
+            return False
+        now = self.clock()
+        if event.retry_until is None:
+            event.retry_until = now + self.click_retry_s
+        if now < event.retry_until:
+            return True
+        record_dropped_early_clicks("buffer", 1)
+        return False
+
+    async def _flush_batches(self, retries: list) -> None:
+        while self._events:
+            batch = [self._events.popleft() for _ in range(min(self.batch_size, len(self._events)))]
+            try:
+                results = await self._execute(batch)
+            except Exception:
+                self._events.extendleft(reversed(batch))
+                raise
+            finally:
+                event_buffer_pending.set(len(self._events))
+            self._space.set()
+            record_event_metrics(batch, results)
+            retries.extend(event for event, result in zip(batch, results) if self._should_retry(event, result))
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._ready.clear()
+            try:
+                await self.flush()
+            except Exception:
+                event_buffer_flush_errors_total.inc()
+                await asyncio.sleep(self.flush_interval)
+                continue
+            if self._stopping and not self._events:
+                return
+
+
+event_buffer = EventBuffer(redis_client)
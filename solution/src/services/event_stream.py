@@ -0,0 +1,184 @@
+"""
+Журнал показов и кликов в Redis Stream и агрегатор, который сводит его в счётчики.
+
+С EVENT_STREAM=1 log_impression/log_click не трогают счётчики, а дописывают в поток
+EVENT_STREAM_KEY компактную запись: тип события (t), кампания (k), рекламодатель (a), клиент (u),
+стоимость (c), даты кампании (s, e), день события (d) и аргументы дедупликации (m).
+День фиксируется в момент записи, поэтому отставание агрегатора не переносит события в другой день.
+
+Агрегатор - отдельный процесс (python -m src.services.event_stream), читающий поток в группе
+потребителей EVENT_STREAM_GROUP: пачка событий применяется теми же Lua-скриптами учёта одним
+пайплайном и подтверждается XACK. События упавшего потребителя, не подтверждённые дольше
+EVENT_STREAM_CLAIM_IDLE_MS, забираются через XAUTOCLAIM. Повторное применение события ничего
+не меняет (скрипты дедуплицируют клиента в пределах кампании), поэтому доставка
+"хотя бы один раз" не искажает счётчики. Клик, применённый раньше своего показа (показ
+в пачке другого потребителя), не подтверждается и подхватывается повторно через XAUTOCLAIM,
+пока запись моложе EVENT_STREAM_CLICK_RETRY_S; после этого он подтверждается и учитывается
+в метрике event_dropped_early_clicks_total. Подхваченные записи занимают не больше половины
+пачки, а XAUTOCLAIM продолжает обход с курсора прошлого вызова, поэтому зависшие клики
+не мешают читать новые записи, в том числе их показы. Агрегатор должен работать в том же
+COUNTER_MODE, что и приложение; метрики показов, кликов и дохода он отдаёт на EVENT_AGGREGATOR_METRICS_PORT
+(в docker-compose - сервис event_aggregator, профиль event-stream).
+
+Пока поток хранит всю историю (EVENT_STREAM_MAXLEN), счётчики можно пересобрать: удалить
+ключи кампаний и рекламодателей и вызвать EventStreamAggregator.replay().
+
+В Redis Cluster поток - один ключ и живёт на одном узле; счётчики, которые из него
+сводит агрегатор, распределяются по узлам по слотам кампаний.
+"""
+import asyncio
+import os
+import signal
+import socket
+from redis.exceptions import ConnectionError as RedisConnectionError, ResponseError, TimeoutError as RedisTimeoutError
+from src.backend.cache import redis_client
+from src.repositories import campaign_scripts
+from src.repositories.campaign_counters import ExactCounters, get_counter_backend
+from src.services.event_buffer import (
+    PendingEvent, execute_events, record_event_metrics, record_dropped_early_clicks, CLICK_BEFORE_IMPRESSION
+)
+
+EVENT_STREAM = os.getenv("EVENT_STREAM", "0") == "1"
+EVENT_STREAM_KEY = os.getenv("EVENT_STREAM_KEY", "events")
+EVENT_STREAM_GROUP = os.getenv("EVENT_STREAM_GROUP", "aggregators")
+EVENT_STREAM_MAXLEN = int(os.getenv("EVENT_STREAM_MAXLEN", "10000000"))
+EVENT_STREAM_BATCH_SIZE = int(os.getenv("EVENT_STREAM_BATCH_SIZE", "500"))
+EVENT_STREAM_BLOCK_MS = int(os.getenv("EVENT_STREAM_BLOCK_MS", "1000"))
+EVENT_STREAM_CLAIM_IDLE_MS = int(os.getenv("EVENT_STREAM_CLAIM_IDLE_MS", "60000"))
+EVENT_STREAM_CLICK_RETRY_S = float(os.getenv("EVENT_STREAM_CLICK_RETRY_S", "600"))
+
+_append_event_script = redis_client.register_script(campaign_scripts.APPEND_EVENT)
+
+
+async def append_event(redis_client_instance, kind: str, campaign_id, client_id, advertiser_id, cost: str,
+                       start_date, end_date, membership_args: list[str], stream: str = EVENT_STREAM_KEY,
+                       day="") -> str:
+    """
+    Дописывает событие в поток одним вызовом скрипта, который заодно читает текущий день.
+    Если день передан (режим Redis Cluster), вместо current_day передаётся ключ из слота потока,
+    который скрипт не читает. Возвращает идентификатор записи.
+    """
+    return await _append_event_script(
+        keys=[stream, f"{{{stream}}}:current_day" if day else "current_day"],
+        args=[EVENT_STREAM_MAXLEN, kind, str(campaign_id), str(advertiser_id or ""), str(client_id), cost,
+              str(start_date), str(end_date), " ".join(membership_args), str(day)],
+        client=redis_client_instance
+    )
+
+
+def event_from_fields(counters: ExactCounters, fields: dict) -> PendingEvent:
+    return counters.build_event(
+        fields["t"], fields["k"], fields["u"], fields["a"] or None, fields["c"], fields["s"], fields["e"],
+        fields["m"].split(), day=fields["d"]
+    )
+
+
+class EventStreamAggregator:
+    def __init__(self, redis_client_instance, counters: ExactCounters = None, stream: str = EVENT_STREAM_KEY,
+                 group: str = EVENT_STREAM_GROUP, consumer: str = None, batch_size: int = EVENT_STREAM_BATCH_SIZE,
+                 block_ms: int = EVENT_STREAM_BLOCK_MS, claim_idle_ms: int = EVENT_STREAM_CLAIM_IDLE_MS,
+                 click_retry_s: float = EVENT_STREAM_CLICK_RETRY_S):
+        self.redis = redis_client_instance
+        self.counters = counters or get_counter_backend()
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.click_retry_s = click_retry_s
+        self._claim_start = "0-0"
+
+    async def ensure_group(self) -> None:
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as error:
+            if "BUSYGROUP" not in str(error):
+                raise
+
+    async def _apply(self, entries: list) -> set:
+        """
+        Применяет записи. Возвращает идентификаторы кликов, опередивших свой показ,
+        которые ещё моложе click_retry_s и должны быть применены повторно.
+        """
+        entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+        if not entries:
+            return set()
+        events = [event_from_fields(self.counters, fields) for _, fields in entries]
+        results = await execute_events(self.redis, events)
+        record_event_metrics(events, results)
+        early = [entry_id for (entry_id, _), result in zip(entries, results) if result[0] == CLICK_BEFORE_IMPRESSION]
+        if not early:
+            return set()
+        seconds, microseconds = await self.redis.time()
+        now_ms = seconds * 1000 + microseconds // 1000
+        retry = {entry_id for entry_id in early if now_ms - int(entry_id.split("-")[0]) < self.click_retry_s * 1000}
+        record_dropped_early_clicks("stream", len(early) - len(retry))
+        return retry
+
+    async def process_batch(self) -> int:
+        """
+        Применяет одну пачку: сначала зависшие события других потребителей, затем новые.
+        Возвращает число обработанных записей.
+        """
+        # Половина пачки всегда остаётся новым записям: иначе клики, ждущие показа,
+        # заполнили бы пачку и не дали прочитать сам показ.
+        claimed = await self.redis.xautoclaim(self.stream, self.group, self.consumer,
+                                              min_idle_time=self.claim_idle_ms, start_id=self._claim_start,
+                                              count=max(1, self.batch_size // 2))
+        self._claim_start = claimed[0]
+        entries = claimed[1]
+        # Ждать новых записей имеет смысл, только если подхватывать нечего.
+        response = await self.redis.xreadgroup(self.group, self.consumer, {self.stream: ">"},
+                                               count=max(1, self.batch_size - len(entries)),
+                                               block=None if entries else self.block_ms)
+        entries = entries + (response[0][1] if response else [])
+        if not entries:
+            return 0
+        retry = await self._apply(entries)
+        acked = [entry_id for entry_id, _ in entries if entry_id not in retry]
+        if acked:
+            await self.redis.xack(self.stream, self.group, *acked)
+        return len(entries)
+
+    async def run(self, stop: asyncio.Event) -> None:
+        await self.ensure_group()
+        while not stop.is_set():
+            try:
+                await self.process_batch()
+            except (RedisConnectionError, RedisTimeoutError):
+                await asyncio.sleep(self.block_ms / 1000)
+
+    async def replay(self, start_id: str = "-", end_id: str = "+") -> int:
+        """
+        Заново применяет записи потока из диапазона, не затрагивая группу потребителей.
+        На существующие счётчики не влияет; после удаления ключей пересобирает их.
+        """
+        replayed = 0
+        while True:
+            entries = await self.redis.xrange(self.stream, min=start_id, max=end_id, count=self.batch_size)
+            if not entries:
+                return replayed
+            await self._apply(entries)
+            replayed += len(entries)
+            start_id = f"({entries[-1][0]}"
+
+
+async def _main() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await EventStreamAggregator(redis_client).run(stop)
+
+
+def main() -> None:
+    metrics_port = os.getenv("EVENT_AGGREGATOR_METRICS_PORT")
+    if metrics_port:
+        from prometheus_client import start_http_server
+        start_http_server(int(metrics_port))
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import csv
+import json
+from collections import deque
+from pydantic import ValidationError
+from src.repositories.bulk import UPSERT_CHUNK_SIZE, dedupe_last_wins
+from src.repositories.ml_score import MLScoreRepository
+from src.schemas.ml_score import MLScore as MLScoreSchema, MLScoreBulkResult, MLScoreRejectedRow
+
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/jsonl", "application/ndjson"}
+CSV_CONTENT_TYPES = {"text/csv", "application/csv"}
+MAX_REPORTED_REJECTIONS = 1000
+
+_INVALID = object()
+
+
+def _decode_line(line: bytes):
+    try:
+        return line.decode().strip()
+    except UnicodeDecodeError:
+        return _INVALID
+
+
+async def _iter_lines(stream):
+    """
+    Построчно декодирует поток байт; строка, не являющаяся UTF-8, отдаётся как невалидная запись.
+    Куски незавершённой строки копятся в списке и склеиваются один раз, когда строка завершится.
+    """
+    pending = []
+    async for chunk in stream:
+        *lines, tail = chunk.split(b"\n")
+        if lines:
+            pending.append(lines[0])
+            lines[0] = b"".join(pending)
+            pending = []
+            for line in lines:
+                yield _decode_line(line)
+        if tail:
+            pending.append(tail)
+    rest = b"".join(pending)
+    if rest.strip():
+        yield _decode_line(rest)
+
+
+async def iter_ndjson_records(stream):
+    """
+    Построчно разбирает поток NDJSON; нечитаемая строка отдаётся как невалидная запись.
+    """
+    async for line in _iter_lines(stream):
+        if line is _INVALID:
+            yield _INVALID
+            continue
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield _INVALID
+
+
+async def iter_csv_records(stream):
+    """
+    Разбирает поток CSV с заголовком client_id,advertiser_id,score одним csv.reader.
+    Строки копятся, пока в записи не закроются кавычки, поэтому поле в кавычках
+    с переводом строки остаётся в своей записи.
+    """
+    pending = deque()
+    reader = csv.reader(iter(pending.popleft, None))
+    header = None
+    record, quotes = [], 0
+    async for line in _iter_lines(stream):
+        if line is _INVALID:
+            record, quotes = [], 0
+            yield _INVALID
+            continue
+        if not line and not record:
+            continue
+        record.append(line)
+        quotes += line.count('"')
+        if quotes % 2:
+            continue
+        pending.append("\n".join(record))
+        record, quotes = [], 0
+        values = next(reader)
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        yield dict(zip(header, values)) if len(values) == len(header) else _INVALID
+    if record:
+        yield _INVALID
+
+
+async def iter_json_records(records: list):
+    for record in records:
+        yield record
+
+
+class _RejectionLog:
+    def __init__(self):
+        self.count = 0
+        self.rows = []
+
+    def add(self, row: int, reason: str) -> None:
+        self.count += 1
+        if len(self.rows) < MAX_REPORTED_REJECTIONS:
+            self.rows.append(MLScoreRejectedRow(row=row, reason=reason))
+
+
+async def ingest_ml_scores(records, ml_repo: MLScoreRepository, chunk_size: int = UPSERT_CHUNK_SIZE) -> MLScoreBulkResult:
+    """
+    Загружает поток записей пачками: формат проверяется построчно, существование клиентов
+    и рекламодателей - одним запросом на пачку. Все пачки применяются в одной транзакции;
+    отклонённые строки (номер от 0 в порядке поступления) возвращаются в отчёте,
+    детально - не более MAX_REPORTED_REJECTIONS. accepted - сумма записанных строк по пачкам:
+    повтор пары (client_id, advertiser_id) внутри пачки перезаписывает скор и не считается,
+    а повтор в разных пачках считается в каждой из них - пары всей загрузки в памяти не хранятся.
+    """
+    rejections = _RejectionLog()
+    accepted = 0
+    batch = []
+    row = 0
+
+    async def flush(batch) -> int:
+        existing_clients, existing_advertisers = await ml_repo.existing_references(
+            (score.client_id for _, score in batch), (score.advertiser_id for _, score in batch)
+        )
+        valid = []
+        for position, score in batch:
+            if score.client_id not in existing_clients:
+                rejections.add(position, "Клиент не найден")
+            elif score.advertiser_id not in existing_advertisers:
+                rejections.add(position, "Рекламодатель не найден")
+            else:
+                valid.append(score.model_dump())
+        rows = dedupe_last_wins(valid, "client_id", "advertiser_id")
+        await ml_repo.load_scores(rows)
+        return len(rows)
+
+    async for record in records:
+        try:
+            if record is _INVALID:
+                raise ValueError
+            score = MLScoreSchema.model_validate(record)
+        except (ValidationError, ValueError, TypeError):
+            rejections.add(row, "Ошибка валидации")
+        else:
+            batch.append((row, score))
+        row += 1
+        if len(batch) >= chunk_size:
+            accepted += await flush(batch)
+            batch = []
+    if batch:
+        accepted += await flush(batch)
+    await ml_repo.session.commit()
+    return MLScoreBulkResult(
+        accepted=accepted,
+        rejected_count=rejections.count,
+        rejected=sorted(rejections.rows, key=lambda rejected: rejected.row)
+    )
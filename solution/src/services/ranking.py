@@ -0,0 +1,101 @@
+from decimal import Decimal
+import numpy as np
+
+INCOME_WEIGHT = Decimal("0.8")
+CTR_WEIGHT = Decimal("0.2")
+IMPRESSIONS_LIMIT_OVERSHOOT = 1.05
+
+# Относительная погрешность, в пределах которой кандидаты считаются равными по float-скору
+# и сравниваются точно, как в эталонной реализации на Decimal.
+_TIE_TOLERANCE = 1e-9
+
+
+def _decimal_income(ml_score, cost_per_click, cost_per_impression) -> Decimal:
+    return Decimal(str(ml_score)) * Decimal(str(cost_per_click)) + Decimal(str(cost_per_impression))
+
+
+def _decimal_ctr(impressions, clicks) -> Decimal:
+    ctr = (clicks / impressions) if impressions > 0 else 0
+    return Decimal(str(ctr))
+
+
+def _decimal_score(income: Decimal, ctr: Decimal, max_income: Decimal, max_ctr: Decimal) -> float:
+    normalized_income = income / max_income if max_income > 0 else income
+    normalized_ctr = ctr / max_ctr if max_ctr > 0 else ctr
+    return float(INCOME_WEIGHT * normalized_income + CTR_WEIGHT * normalized_ctr)
+
+
+def rank_campaigns_reference(ml_scores, costs_per_click, costs_per_impression,
+                             impressions, clicks, impressions_limits) -> int | None:
+    """
+    Эталонная реализация выбора кампании на Decimal, используется для проверки rank_campaigns.
+    Возвращает индекс лучшей кампании или None, если все кампании исчерпали лимит показов.
+    """
+    incomes = [_decimal_income(*values) for values in zip(ml_scores, costs_per_click, costs_per_impression)]
+    ctrs = [_decimal_ctr(imp, click) for imp, click in zip(impressions, clicks)]
+    if not incomes:
+        return None
+    max_income = max(incomes)
+    max_ctr = max(ctrs)
+
+    best_index = None
+    best_score = -float("inf")
+    for i, (income, ctr) in enumerate(zip(incomes, ctrs)):
+        if (impressions[i] + 1) >= (impressions_limits[i] * IMPRESSIONS_LIMIT_OVERSHOOT):
+            continue
+        candidate_score = _decimal_score(income, ctr, max_income, max_ctr)
+        if candidate_score > best_score:
+            best_score = candidate_score
+            best_index = i
+    return best_index
+
+
+def _near_max(values: np.ndarray, maximum: float) -> np.ndarray:
+    return np.flatnonzero(values >= maximum - _TIE_TOLERANCE * max(1.0, abs(maximum)))
+
+
+def rank_campaigns(ml_scores, costs_per_click, costs_per_impression,
+                   impressions, clicks, impressions_limits) -> int | None:
+    """
+    Векторный выбор кампании: доход ml_score * cost_per_click + cost_per_impression и CTR
+    нормируются на максимум по всем кандидатам, скор равен 0.8 * доход + 0.2 * CTR,
+    кампании, у которых следующий показ превысит лимит более чем на 5%, пропускаются.
+    Кандидаты, чьи float-скоры почти совпадают с лучшим, досравниваются на Decimal,
+    поэтому результат совпадает с rank_campaigns_reference.
+    """
+    count = len(ml_scores)
+    if count == 0:
+        return None
+    imp = np.asarray(impressions, dtype=np.float64)
+    available = (imp + 1) < np.asarray(impressions_limits, dtype=np.float64) * IMPRESSIONS_LIMIT_OVERSHOOT
+    if not available.any():
+        return None
+
+    incomes = (np.asarray(ml_scores, dtype=np.float64) * np.asarray(costs_per_click, dtype=np.float64)
+               + np.asarray(costs_per_impression, dtype=np.float64))
+    ctrs = np.divide(np.asarray(clicks, dtype=np.float64), imp, out=np.zeros(count), where=imp > 0)
+    max_income = incomes.max()
+    max_ctr = ctrs.max()
+    normalized_incomes = incomes / max_income if max_income > 0 else incomes
+    normalized_ctrs = ctrs / max_ctr if max_ctr > 0 else ctrs
+    scores = np.where(available, 0.8 * normalized_incomes + 0.2 * normalized_ctrs, -np.inf)
+
+    contenders = _near_max(scores, scores.max())
+    if len(contenders) == 1:
+        return int(contenders[0])
+
+    exact_max_income = max(
+        _decimal_income(ml_scores[i], costs_per_click[i], costs_per_impression[i])
+        for i in _near_max(incomes, max_income)
+    )
+    exact_max_ctr = max(_decimal_ctr(impressions[i], clicks[i]) for i in _near_max(ctrs, max_ctr))
+    best_index = None
+    best_score = -float("inf")
+    for i in contenders:
+        income = _decimal_income(ml_scores[i], costs_per_click[i], costs_per_impression[i])
+        candidate_score = _decimal_score(income, _decimal_ctr(impressions[i], clicks[i]),
+                                         exact_max_income, exact_max_ctr)
+        if candidate_score > best_score:
+            best_score = candidate_score
+            best_index = int(i)
+    return best_index
@@ -0,0 +1,82 @@
+"""
+Переименование ключей кампаний и рекламодателей из вида campaign:<id>:<имя> в раскладку
+с хеш-тегами campaign:{<id>}:<имя> (src/repositories/redis_keys.py).
+
+Запускается entry.sh при каждом старте перед заполнением агрегатов рекламодателей
+(на уже переименованных данных ничего не делает); вручную - до переноса данных
+в Redis Cluster (RENAME между слотами кластера невозможен):
+
+    python -m src.services.redis_key_migration
+
+Сначала SCAN собирает список ключей старого вида (переименование во время обхода могло бы
+сбить курсор), затем они переименовываются RENAMENX пайплайнами по REDIS_KEY_MIGRATION_BATCH_SIZE,
+поэтому повторный запуск безопасен. Если ключ с новым именем уже существует
+(приложение успело записать его в новой раскладке), старый ключ не трогается и попадает
+в отчёт как конфликт - такие ключи нужно свести вручную.
+"""
+import asyncio
+import os
+from src.backend.cache import redis_client
+
+REDIS_KEY_MIGRATION_BATCH_SIZE = int(os.getenv("REDIS_KEY_MIGRATION_BATCH_SIZE", "1000"))
+KEY_PREFIXES = ("campaign", "advertiser")
+
+
+def tagged_key(key: str) -> str | None:
+    """
+    Возвращает имя ключа в раскладке с хеш-тегами либо None, если ключ уже в ней или не относится к кампаниям.
+    """
+    prefix, _, rest = key.partition(":")
+    if prefix not in KEY_PREFIXES or not rest or rest.startswith("{"):
+        return None
+    entity_id, separator, name = rest.partition(":")
+    if not separator:
+        return None
+    return f"{prefix}:{{{entity_id}}}:{name}"
+
+
+async def has_untagged_keys(redis_client_instance, batch_size: int = REDIS_KEY_MIGRATION_BATCH_SIZE) -> bool:
+    """
+    Проверяет, остались ли ключи кампаний и рекламодателей старого вида.
+    """
+    for prefix in KEY_PREFIXES:
+        async for key in redis_client_instance.scan_iter(match=f"{prefix}:*", count=batch_size):
+            if tagged_key(key):
+                return True
+    return False
+
+
+async def migrate_keys(redis_client_instance, batch_size: int = REDIS_KEY_MIGRATION_BATCH_SIZE) -> dict:
+    """
+    Переименовывает ключи старого вида. Возвращает {"renamed": число, "conflicts": [старые ключи]}.
+    """
+    renames = []
+    for prefix in KEY_PREFIXES:
+        async for key in redis_client_instance.scan_iter(match=f"{prefix}:*", count=batch_size):
+            new = tagged_key(key)
+            if new:
+                renames.append((key, new))
+    renamed, conflicts = 0, []
+    for start in range(0, len(renames), batch_size):
+        chunk = renames[start:start + batch_size]
+        async with redis_client_instance.pipeline(transaction=False) as pipe:
+            for old, new in chunk:
+                pipe.renamenx(old, new)
+            results = await pipe.execute()
+        for (old, _), done in zip(chunk, results):
+            if done:
+                renamed += 1
+            else:
+                conflicts.append(old)
+    return {"renamed": renamed, "conflicts": conflicts}
+
+
+def main() -> None:
+    report = asyncio.run(migrate_keys(redis_client))
+    print(f"Переименовано ключей: {report['renamed']}")
+    for key in report["conflicts"]:
+        print(f"Конфликт, ключ с новым именем уже существует: {key}")
+
+
+if __name__ == "__main__":
+    main()
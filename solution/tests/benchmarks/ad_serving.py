@@ -0,0 +1,333 @@
+"""
+Нагрузочный бенчмарк показа рекламы.
+
+Засевает N рекламодателей, M кампаний со смешанным таргетингом, K клиентов и ML-скоры,
+после чего с заданной конкурентностью гоняет GET /ads, POST /ads/{id}/click, /stats/* и
+POST /clients/bulk через ASGI-транспорт и сохраняет p50/p95/p99 и пропускную способность в JSON.
+Ошибкой (errors) считается любой ответ с кодом, отличным от ожидаемого для сценария:
+200 для показа и статистики, 204 для клика, 201 для загрузки клиентов.
+
+По умолчанию используются те же заменители, что и в тестах (SQLite + fakeredis):
+    python -m tests.benchmarks.ad_serving --output bench.json
+Против локальных Postgres и Redis:
+    python -m tests.benchmarks.ad_serving --database-url postgresql+asyncpg://... --redis-url redis://localhost:6379/15 --reset
+Флаг --reset удаляет таблицы и очищает базу Redis перед засевом, поэтому указывайте отдельные БД.
+Сравнение с предыдущим прогоном:
+    python -m tests.benchmarks.ad_serving --output new.json --compare old.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass, asdict
+from decimal import Decimal
+from uuid import uuid4
+
+LOCATIONS = ["Moscow", "Saint-Petersburg", "Kazan", "Novosibirsk", "Sochi"]
+GENDERS = ["MALE", "FEMALE"]
+
+
+@dataclass
+class BenchmarkConfig:
+    advertisers: int = 20
+    campaigns: int = 200
+    clients: int = 500
+    requests: int = 1000
+    concurrency: int = 16
+    bulk_size: int = 100
+    seed: int = 42
+
+
+def configure_redis(redis_url: str | None) -> None:
+    """
+    Подменяет redis.asyncio.from_url до импорта src, как это делает tests/conftest.py.
+    Без redis_url все клиенты работают с общим in-memory сервером fakeredis.
+    """
+    import redis.asyncio as redis_asyncio
+    if redis_url is None:
+        import fakeredis
+        import fakeredis.aioredis
+        server = fakeredis.FakeServer()
+        redis_asyncio.from_url = lambda *args, **kwargs: fakeredis.aioredis.FakeRedis(
+            server=server, decode_responses=True
+        )
+    else:
+        original_from_url = redis_asyncio.from_url
+        redis_asyncio.from_url = lambda *args, **kwargs: original_from_url(redis_url, **kwargs)
+
+
+def _random_targeting(rng: random.Random) -> dict:
+    targeting = {"gender": None, "age_from": None, "age_to": None, "location": None}
+    if rng.random() < 0.6:
+        targeting["gender"] = rng.choice(GENDERS + ["ALL"])
+    if rng.random() < 0.5:
+        age_from = rng.randint(14, 60)
+        targeting["age_from"] = age_from
+        targeting["age_to"] = rng.randint(age_from, 80)
+    if rng.random() < 0.4:
+        targeting["location"] = rng.choice(LOCATIONS)
+    return targeting
+
+
+def _client_payload(rng: random.Random, client_id) -> dict:
+    return {
+        "client_id": str(client_id),
+        "login": f"bench_{str(client_id)[:8]}",
+        "age": rng.randint(14, 80),
+        "location": rng.choice(LOCATIONS),
+        "gender": rng.choice(GENDERS),
+    }
+
+
+async def seed(session, redis_client_instance, config: BenchmarkConfig) -> dict:
+    """
+    Заполняет БД и Redis тестовыми данными напрямую через ORM и возвращает их идентификаторы.
+    """
+    from src.models.advertiser import Advertiser
+    from src.models.campaign import Campaign
+    from src.models.ml_score import MLScore
+    from src.models.user import User
+    from src.services.active_campaigns import bump_campaigns_version
+
+    rng = random.Random(config.seed)
+    advertiser_ids = [uuid4() for _ in range(config.advertisers)]
+    session.add_all(Advertiser(advertiser_id=adv_id, name=f"Advertiser {i}") for i, adv_id in enumerate(advertiser_ids))
+
+    client_ids = [uuid4() for _ in range(config.clients)]
+    session.add_all(
+        User(**{**_client_payload(rng, client_id), "client_id": client_id}) for client_id in client_ids
+    )
+
+    campaign_ids = []
+    for i in range(config.campaigns):
+        campaign_id = uuid4()
+        campaign_ids.append(campaign_id)
+        session.add(Campaign(
+            campaign_id=campaign_id,
+            advertiser_id=rng.choice(advertiser_ids),
+            impressions_limit=10 ** 6,
+            clicks_limit=10 ** 5,
+            cost_per_impression=Decimal(str(round(rng.uniform(0.01, 1.0), 2))),
+            cost_per_click=Decimal(str(round(rng.uniform(0.1, 5.0), 2))),
+            ad_title=f"Campaign {i}",
+            ad_text=f"Benchmark campaign {i}",
+            start_date=0,
+            end_date=rng.randint(1, 30),
+            targeting=_random_targeting(rng),
+        ))
+    await session.flush()
+
+    session.add_all(
+        MLScore(client_id=client_id, advertiser_id=adv_id, score=rng.randint(0, 1000))
+        for client_id in client_ids for adv_id in advertiser_ids if rng.random() < 0.3
+    )
+    await session.commit()
+
+    await redis_client_instance.set("current_day", 0)
+    await redis_client_instance.set("moderation_enabled", "0")
+    await bump_campaigns_version(redis_client_instance)
+    return {"advertiser_ids": advertiser_ids, "client_ids": client_ids, "campaign_ids": campaign_ids}
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(percent / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+async def _drive(make_request, total: int, concurrency: int, expected_status: int = 200) -> dict:
+    """
+    Ответ с кодом, отличным от expected_status, считается ошибкой, и его латентность
+    не входит в перцентили.
+    """
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            response = await make_request(i)
+            if response.status_code == expected_status:
+                latencies.append((time.perf_counter() - started) * 1000)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p95_ms": round(_percentile(latencies, 95), 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+        "throughput_rps": round(total / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+async def run(client, seeded: dict, config: BenchmarkConfig) -> dict:
+    """
+    Гоняет сценарии через httpx-клиент приложения и возвращает метрики по каждому из них.
+    """
+    rng = random.Random(config.seed + 1)
+    client_ids = seeded["client_ids"]
+    campaign_ids = seeded["campaign_ids"]
+    advertiser_ids = seeded["advertiser_ids"]
+    served = []
+
+    async def get_ad(i):
+        client_id = client_ids[i % len(client_ids)]
+        response = await client.get("/ads", params={"client_id": str(client_id)})
+        if response.status_code == 200:
+            served.append((response.json()["ad_id"], client_id))
+        return response
+
+    async def click(i):
+        ad_id, client_id = served[i % len(served)]
+        return await client.post(f"/ads/{ad_id}/click", json={"client_id": str(client_id)})
+
+    async def campaign_stats(i):
+        return await client.get(f"/stats/campaigns/{campaign_ids[i % len(campaign_ids)]}")
+
+    async def campaign_daily_stats(i):
+        return await client.get(f"/stats/campaigns/{campaign_ids[i % len(campaign_ids)]}/daily")
+
+    async def advertiser_stats(i):
+        return await client.get(f"/stats/advertisers/{advertiser_ids[i % len(advertiser_ids)]}/campaigns")
+
+    async def advertiser_daily_stats(i):
+        return await client.get(f"/stats/advertisers/{advertiser_ids[i % len(advertiser_ids)]}/campaigns/daily")
+
+    async def clients_bulk(i):
+        batch = [_client_payload(rng, rng.choice(client_ids) if rng.random() < 0.5 else uuid4())
+                 for _ in range(config.bulk_size)]
+        return await client.post("/clients/bulk", json=batch)
+
+    results = {"get_ad": await _drive(get_ad, config.requests, config.concurrency)}
+    if served:
+        results["click"] = await _drive(click, config.requests, config.concurrency, expected_status=204)
+    stats_requests = max(1, config.requests // 10)
+    results["stats_campaign"] = await _drive(campaign_stats, stats_requests, config.concurrency)
+    results["stats_campaign_daily"] = await _drive(campaign_daily_stats, stats_requests, config.concurrency)
+    results["stats_advertiser"] = await _drive(advertiser_stats, stats_requests, config.concurrency)
+    results["stats_advertiser_daily"] = await _drive(advertiser_daily_stats, stats_requests, config.concurrency)
+    bulk_requests = max(1, config.requests // 100)
+    results["clients_bulk"] = await _drive(clients_bulk, bulk_requests, min(config.concurrency, bulk_requests),
+                                           expected_status=201)
+    results["clients_bulk"]["rows_per_request"] = config.bulk_size
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, previous: dict) -> str:
+    """
+    Форматирует изменение латентности и пропускной способности относительно предыдущего прогона.
+    """
+    lines = [f"{'scenario':<24}{'metric':<16}{'before':>12}{'after':>12}{'change':>10}"]
+    for scenario, metrics in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(scenario)
+        if before is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            old, new = before.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            lines.append(f"{scenario:<24}{metric:<16}{old:>12}{new:>12}{change:>9.1f}%")
+    return "\n".join(lines)
+
+
+async def _main(args, config: BenchmarkConfig) -> dict:
+    from httpx import AsyncClient, ASGITransport
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+    from src.backend.cache import redis_client
+    from src.backend.database import Base, get_session, get_read_session
+    from src.main import app
+
+    engine = create_async_engine(args.database_url, echo=False)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+    async def override_get_session():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_read_session] = override_get_session
+    async with engine.begin() as conn:
+        if args.reset:
+            await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    if args.reset:
+        await redis_client.flushdb()
+    try:
+        async with session_factory() as session:
+            seeded = await seed(session, redis_client, config)
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+            scenarios = await run(client, seeded, config)
+    finally:
+        await engine.dispose()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "database": engine.dialect.name,
+            "redis": "fakeredis" if args.redis_url is None else "redis",
+            "config": asdict(config),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк показа рекламы и статистики")
+    defaults = BenchmarkConfig()
+    for field, value in asdict(defaults).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=int, default=value)
+    parser.add_argument("--database-url", default=None,
+                        help="URL БД; по умолчанию временный файл SQLite")
+    parser.add_argument("--redis-url", default=None, help="URL Redis; по умолчанию fakeredis")
+    parser.add_argument("--reset", action="store_true",
+                        help="Удалить таблицы и очистить Redis перед засевом")
+    parser.add_argument("--output", default=None, help="Файл для сохранения результатов в JSON")
+    parser.add_argument("--compare", default=None, help="JSON предыдущего прогона для сравнения")
+    args = parser.parse_args(argv)
+    config = BenchmarkConfig(**{field: getattr(args, field) for field in asdict(defaults)})
+
+    configure_redis(args.redis_url)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.database_url is None:
+            args.database_url = f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+        result = asyncio.run(_main(args, config))
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare(result, json.load(f)))
+
+
+if __name__ == "__main__":
+    main()
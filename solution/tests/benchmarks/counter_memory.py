@@ -0,0 +1,146 @@
+"""
+Бенчмарк памяти счётчиков уникальных показов и кликов в режимах "exact", "bitmap" и "approximate".
+
+Для каждого размера охвата логирует показы (и клики части клиентов) одной кампании через
+CampaignRepository и измеряет память ключей дедупликации и счётчиков командой MEMORY USAGE;
+fakeredis её не поддерживает, поэтому без --redis-url берётся длина DUMP - сериализованного
+представления, которое для множеств заметно компактнее реального.
+Заодно фиксируется относительная ошибка PFCOUNT и доля потерянных фильтром Блума событий.
+fakeredis копирует битовую строку на каждый SETBIT, поэтому охваты от 10 000 клиентов
+в приближённом режиме разумно мерить только на настоящем Redis.
+Для режима "bitmap" клиенты регистрируются во временной SQLite-базе, а размер общего
+для всех кампаний хеша client_ordinals выводится отдельно (registry_bytes).
+
+    python -m tests.benchmarks.counter_memory --reach 1000 10000 100000
+    python -m tests.benchmarks.counter_memory --redis-url redis://localhost:6379/15 --output memory.json
+Ключи бенчмарка удаляются после замера, остальные данные базы Redis не трогаются.
+"""
+import argparse
+import asyncio
+import json
+from types import SimpleNamespace
+from uuid import uuid4
+from tests.benchmarks.ad_serving import configure_redis
+
+CLICK_SHARE = 0.1
+BATCH_SIZE = 500
+
+
+async def _key_size(redis_client_instance, key: str) -> int:
+    try:
+        return await redis_client_instance.memory_usage(key) or 0
+    except Exception:
+        dumped = await redis_client_instance.dump(key)
+        return len(dumped) if dumped is not None else 0
+
+
+async def measure(redis_client_instance, mode: str, reach: int, counters=None, session=None) -> dict:
+    """
+    Логирует reach уникальных показов и reach * CLICK_SHARE кликов и возвращает память
+    ключей кампании, итоговые счётчики и число событий, которые скрипт счёл новыми.
+    Режиму "bitmap" нужна сессия БД для реестра номеров клиентов.
+    """
+    from src.repositories.campaign import CampaignRepository
+    from src.repositories.campaign_counters import get_counter_backend
+    from src.repositories.client_ordinal import CLIENT_ORDINALS_KEY, ClientOrdinalRepository
+    from src.repositories.redis_keys import campaign_key, advertiser_key
+
+    counters = counters or get_counter_backend(mode)
+    repo = CampaignRepository(session=session, counters=counters)
+    campaign = SimpleNamespace(campaign_id=uuid4(), advertiser_id=uuid4(), cost_per_impression=0.01,
+                               cost_per_click=0.1, start_date=0, end_date=0)
+    clients = [uuid4() for _ in range(reach)]
+    clickers = clients[:int(reach * CLICK_SHARE)]
+    campaign_id = campaign.campaign_id
+    if counters.mode == "bitmap":
+        # Номера выдаются заранее: конкурентные события не могут делить одну сессию БД.
+        await ClientOrdinalRepository(session).assign_many(clients, redis_client_instance)
+
+    for start in range(0, reach, BATCH_SIZE):
+        await asyncio.gather(*[
+            repo.log_impression(campaign_id, client_id, redis_client_instance, campaign)
+            for client_id in clients[start:start + BATCH_SIZE]
+        ])
+    for start in range(0, len(clickers), BATCH_SIZE):
+        await asyncio.gather(*[
+            repo.log_click(campaign_id, client_id, redis_client_instance, campaign)
+            for client_id in clickers[start:start + BATCH_SIZE]
+        ])
+
+    keys = sorted({*counters.impressions_keys(campaign_id), *counters.clicks_keys(campaign_id)})
+    sizes = {key.rsplit(":", 1)[1]: await _key_size(redis_client_instance, key) for key in keys}
+    impressions = await repo.get_impressions_count(campaign_id, redis_client_instance)
+    clicks = await repo.get_clicks_count(campaign_id, redis_client_instance)
+    daily = await redis_client_instance.hgetall(campaign_key(campaign_id, "daily_stats"))
+    accepted_impressions = sum(int(value) for field, value in daily.items() if field.endswith(":impressions"))
+    accepted_clicks = sum(int(value) for field, value in daily.items() if field.endswith(":clicks"))
+
+    # Ключи кампании и рекламодателя удаляются раздельно: в Redis Cluster они в разных слотах.
+    await redis_client_instance.delete(
+        *keys, *(campaign_key(campaign_id, suffix) for suffix in ("spent_impressions", "spent_clicks", "daily_stats"))
+    )
+    await redis_client_instance.delete(advertiser_key(campaign.advertiser_id, "stats"),
+                                       advertiser_key(campaign.advertiser_id, "daily_stats"))
+    total_bytes = sum(sizes.values())
+    registry_bytes = await _key_size(redis_client_instance, CLIENT_ORDINALS_KEY) if mode == "bitmap" else 0
+    return {
+        "mode": mode,
+        "reach": reach,
+        "bytes": sizes,
+        "total_bytes": total_bytes,
+        "registry_bytes": registry_bytes,
+        "bytes_per_client": round(total_bytes / reach, 2) if reach else 0.0,
+        "impressions_error": round((impressions - reach) / reach, 5) if reach else 0.0,
+        "clicks_error": round((clicks - len(clickers)) / len(clickers), 5) if clickers else 0.0,
+        "lost_impressions": reach - accepted_impressions,
+        "lost_clicks": len(clickers) - accepted_clicks,
+    }
+
+
+async def _main(args) -> list[dict]:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+    from src.backend.cache import redis_client
+    from src.backend.database import Base
+    from src.models import user, client_ordinal  # noqa: F401 - регистрация таблиц в Base.metadata
+
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", echo=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    results = []
+    try:
+        async with async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)() as session:
+            for reach in args.reach:
+                for mode in ("exact", "bitmap", "approximate"):
+                    results.append(await measure(redis_client, mode, reach, session=session))
+    finally:
+        await engine.dispose()
+    return results
+
+
+def format_table(results: list[dict]) -> str:
+    lines = [f"{'reach':>10}{'mode':>14}{'total_bytes':>14}{'bytes/client':>14}{'registry':>12}"
+             f"{'imp_error':>11}{'lost_imp':>10}"]
+    for row in results:
+        lines.append(f"{row['reach']:>10}{row['mode']:>14}{row['total_bytes']:>14}{row['bytes_per_client']:>14}"
+                     f"{row['registry_bytes']:>12}{row['impressions_error']:>11}{row['lost_impressions']:>10}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк памяти точных и приближённых счётчиков")
+    parser.add_argument("--reach", type=int, nargs="+", default=[1000, 10000],
+                        help="Число уникальных клиентов кампании для каждого замера")
+    parser.add_argument("--redis-url", default=None, help="URL Redis; по умолчанию fakeredis")
+    parser.add_argument("--output", default=None, help="Файл для сохранения результатов в JSON")
+    args = parser.parse_args(argv)
+
+    configure_redis(args.redis_url)
+    results = asyncio.run(_main(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(json.dumps(results, indent=2, ensure_ascii=False))
+    print(format_table(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Бенчмарк планов запросов к кампаниям до и после индексов миграции 7c2e5b9d41a3.
+
+Засевает рекламодателей и кампании, окна которых равномерно разбросаны по --days дням
+(к текущему дню большая часть кампаний уже закончилась), удаляет индексы кампаний,
+выводит планы запросов list_active_campaigns, list_all_campaigns, минимального дня
+рекламодателя и get_campaign_record, затем создаёт индексы и выводит планы повторно.
+На Postgres планы строятся EXPLAIN (ANALYZE, BUFFERS) и дополнительно показывается
+запрос по active_days (int4range + GiST); на SQLite - EXPLAIN QUERY PLAN.
+
+    python -m tests.benchmarks.query_plans
+    python -m tests.benchmarks.query_plans --database-url postgresql+asyncpg://... --campaigns 200000 --output plans.json
+Таблицы в указанной БД пересоздаются, поэтому указывайте отдельную базу.
+"""
+import argparse
+import asyncio
+import json
+import random
+from uuid import uuid4
+from sqlalchemy import select, func, text, insert
+from sqlalchemy.schema import CreateIndex, DropIndex
+
+SEED_CHUNK_SIZE = 5000
+
+
+def _queries(advertiser_id, campaign_id, current_day: int) -> dict:
+    from src.models.campaign import Campaign
+
+    return {
+        "list_active_campaigns": select(Campaign).where(
+            Campaign.start_date <= current_day, Campaign.end_date >= current_day
+        ),
+        "list_all_campaigns": select(Campaign).where(
+            Campaign.advertiser_id == advertiser_id
+        ).order_by(Campaign.start_date).offset(0).limit(10),
+        "advertiser_first_day": select(func.min(Campaign.start_date)).where(Campaign.advertiser_id == advertiser_id),
+        "get_campaign_record": select(
+            Campaign.campaign_id, Campaign.advertiser_id, Campaign.cost_per_impression,
+            Campaign.cost_per_click, Campaign.start_date, Campaign.end_date
+        ).where(Campaign.campaign_id == campaign_id),
+    }
+
+
+async def _seed(conn, advertisers: int, campaigns: int, days: int, seed: int) -> tuple:
+    from src.models.advertiser import Advertiser
+    from src.models.campaign import Campaign
+
+    rng = random.Random(seed)
+    advertiser_ids = [uuid4() for _ in range(advertisers)]
+    await conn.execute(insert(Advertiser), [{"advertiser_id": advertiser_id, "name": f"bench_{i}"}
+                                            for i, advertiser_id in enumerate(advertiser_ids)])
+    campaign_ids = []
+    for start in range(0, campaigns, SEED_CHUNK_SIZE):
+        rows = []
+        for _ in range(min(SEED_CHUNK_SIZE, campaigns - start)):
+            start_date = rng.randint(0, days)
+            campaign_id = uuid4()
+            campaign_ids.append(campaign_id)
+            rows.append({
+                "campaign_id": campaign_id, "advertiser_id": rng.choice(advertiser_ids),
+                "impressions_limit": 1000, "clicks_limit": 100, "cost_per_impression": 0.01, "cost_per_click": 0.1,
+                "ad_title": "bench", "ad_text": "bench", "start_date": start_date,
+                "end_date": start_date + rng.randint(0, 30), "targeting": {},
+            })
+        await conn.execute(insert(Campaign), rows)
+    return advertiser_ids, campaign_ids
+
+
+def _campaign_indexes(dialect: str) -> list:
+    """
+    Индексы кампаний, существующие в этой СУБД: индексы по столбцам только для Postgres - лишь в Postgres.
+    """
+    from src.models.campaign import Campaign
+
+    return [index for index in Campaign.__table__.indexes
+            if dialect == "postgresql" or not any(column.info.get("postgresql_only") for column in index.columns)]
+
+
+async def _explain(conn, dialect: str, stmt) -> list[str]:
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    prefix = "EXPLAIN (ANALYZE, BUFFERS)" if dialect == "postgresql" else "EXPLAIN QUERY PLAN"
+    result = await conn.execute(text(f"{prefix} {compiled}"))
+    return [str(row[-1]) for row in result.all()]
+
+
+async def _collect_plans(conn, dialect: str, queries: dict) -> dict:
+    return {name: await _explain(conn, dialect, stmt) for name, stmt in queries.items()}
+
+
+async def run(database_url: str, advertisers: int, campaigns: int, days: int, seed: int = 42) -> dict:
+    """
+    Возвращает {"before": {запрос: план}, "after": {запрос: план}}.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from src.backend.database import Base
+    from src.models import advertiser, campaign, user, ml_score, client_ordinal  # noqa: F401 - регистрация таблиц
+    from src.models.campaign import Campaign
+
+    engine = create_async_engine(database_url, echo=False)
+    try:
+        async with engine.begin() as conn:
+            dialect = conn.dialect.name
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+            advertiser_ids, campaign_ids = await _seed(conn, advertisers, campaigns, days, seed)
+            queries = _queries(advertiser_ids[0], campaign_ids[len(campaign_ids) // 2], days)
+
+            for index in _campaign_indexes(dialect):
+                await conn.execute(DropIndex(index))
+            await conn.execute(text("ANALYZE"))
+            before = await _collect_plans(conn, dialect, queries)
+
+            for index in _campaign_indexes(dialect):
+                await conn.execute(CreateIndex(index))
+            if dialect == "postgresql":
+                queries["list_active_campaigns_day_range"] = select(Campaign).where(Campaign.active_days.contains(days))
+            await conn.execute(text("ANALYZE"))
+            after = await _collect_plans(conn, dialect, queries)
+            await conn.run_sync(Base.metadata.drop_all)
+    finally:
+        await engine.dispose()
+    return {"before": before, "after": after}
+
+
+def format_plans(plans: dict) -> str:
+    lines = []
+    for name in plans["after"]:
+        for stage in ("before", "after"):
+            if name in plans[stage]:
+                lines.append(f"== {name} ({stage})")
+                lines.extend(f"   {line}" for line in plans[stage][name])
+    return "\n".join(lines)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Планы запросов к кампаниям до и после индексов")
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///:memory:",
+                        help="URL отдельной БД; по умолчанию SQLite в памяти")
+    parser.add_argument("--advertisers", type=int, default=100)
+    parser.add_argument("--campaigns", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=365, help="Число дней, по которым разбросаны кампании")
+    parser.add_argument("--output", default=None, help="Файл для сохранения планов в JSON")
+    args = parser.parse_args(argv)
+
+    plans = asyncio.run(run(args.database_url, args.advertisers, args.campaigns, args.days))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(json.dumps(plans, indent=2, ensure_ascii=False))
+    print(format_plans(plans))
+
+
+if __name__ == "__main__":
+    main()
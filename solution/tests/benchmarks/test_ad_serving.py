@@ -0,0 +1,16 @@
+import pytest
+from tests.benchmarks.ad_serving import BenchmarkConfig, seed, run, compare
+
+# Тест-дымовая проверка бенчмарка на минимальном объёме данных, чтобы он не ломался незаметно.
+@pytest.mark.asyncio
+async def test_benchmark_smoke(client, session, test_redis):
+    config = BenchmarkConfig(advertisers=2, campaigns=5, clients=5, requests=10, concurrency=2, bulk_size=3)
+    seeded = await seed(session, test_redis, config)
+    scenarios = await run(client, seeded, config)
+
+    assert scenarios["get_ad"]["requests"] == 10
+    for metrics in scenarios.values():
+        assert metrics["errors"] == 0
+        assert metrics["p50_ms"] <= metrics["p95_ms"] <= metrics["p99_ms"]
+    result = {"scenarios": scenarios}
+    assert "get_ad" in compare(result, result)
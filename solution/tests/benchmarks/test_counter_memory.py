@@ -0,0 +1,21 @@
+import pytest
+from src.repositories.campaign_counters import ApproximateCounters
+from tests.benchmarks.counter_memory import measure, format_table
+
+# Тест-дымовая проверка бенчмарка памяти счётчиков на небольшом охвате в обоих режимах.
+@pytest.mark.asyncio
+async def test_counter_memory_smoke(session, test_redis):
+    await test_redis.set("current_day", 0)
+    exact = await measure(test_redis, "exact", 50)
+    bitmap = await measure(test_redis, "bitmap", 50, session=session)
+    approximate = await measure(test_redis, "approximate", 50, ApproximateCounters(capacity=1000, error_rate=0.01))
+
+    assert exact["impressions_error"] == 0.0
+    assert exact["lost_impressions"] == exact["lost_clicks"] == 0
+    assert bitmap["impressions_error"] == bitmap["clicks_error"] == 0.0
+    assert bitmap["total_bytes"] < exact["total_bytes"]
+    assert bitmap["registry_bytes"] > 0
+    assert abs(approximate["impressions_error"]) < 0.05
+    assert approximate["total_bytes"] > 0
+    assert await test_redis.keys("campaign:*") == []
+    assert "bitmap" in format_table([exact, bitmap, approximate])
@@ -0,0 +1,12 @@
+import pytest
+from tests.benchmarks.query_plans import run, format_plans
+
+# Тест-дымовая проверка бенчмарка планов: после миграции запросы кампаний используют новые индексы.
+@pytest.mark.asyncio
+async def test_query_plans_smoke(tmp_path):
+    plans = await run(f"sqlite+aiosqlite:///{tmp_path / 'plans.db'}", advertisers=5, campaigns=500, days=100)
+
+    assert not any("ix_campaigns" in line for lines in plans["before"].values() for line in lines)
+    assert any("ix_campaigns_end_date_start_date" in line for line in plans["after"]["list_active_campaigns"])
+    assert any("ix_campaigns_advertiser_id_start_date" in line for line in plans["after"]["list_all_campaigns"])
+    assert "list_active_campaigns (after)" in format_plans(plans)
@@ -10,12 +10,15 @@ redis_asyncio.from_url = fake_from_url
 import pytest_asyncio
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from src.backend.database import Base, get_session
+from src.backend.database import Base, get_session, get_read_session
 from src.main import app as main_app
 from httpx import AsyncClient, ASGITransport
 
 DATABASE_TEST_URL = os.getenv("DATABASE_TEST_URL", "sqlite+aiosqlite:///:memory:")
 
+def pytest_configure(config):
+    config.addinivalue_line("markers", "postgres: тест выполняется только при DATABASE_TEST_URL на Postgres")
+
 test_engine = create_async_engine(DATABASE_TEST_URL, echo=False)
 TestSessionLocal = sessionmaker(test_engine, expire_on_commit=False, class_=AsyncSession)
 
@@ -24,6 +27,7 @@ async def override_get_session():
         yield session
 
 main_app.dependency_overrides[get_session] = override_get_session
+main_app.dependency_overrides[get_read_session] = override_get_session
 
 @pytest_asyncio.fixture(scope="session", autouse=True)
 async def async_engine():
@@ -69,6 +73,10 @@ async def client() -> AsyncClient:
 @pytest_asyncio.fixture(autouse=True)
 async def clear_db(session):
     yield
+    from src.services.campaign_cache import campaign_cache
+    campaign_cache.clear()
+    from src.services.client_profile_cache import client_profile_cache
+    client_profile_cache.clear_local()
     for table in reversed(Base.metadata.sorted_tables):
         await session.execute(table.delete())
     await session.commit()
\ No newline at end of file
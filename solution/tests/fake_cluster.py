@@ -0,0 +1,104 @@
+"""
+Заглушка Redis Cluster для тестов: несколько независимых серверов fakeredis, между которыми
+ключи распределяются по слотам так же, как в Redis Cluster (CRC16 с учётом хеш-тега).
+Команда, ключи которой попадают в разные слоты, завершается ошибкой CROSSSLOT; скрипт,
+обратившийся к необъявленному ключу, читает узел своего слота и не видит чужих данных.
+Пайплайн, как и ClusterPipeline, раскладывает команды по узлам и не загружает скрипты сам.
+"""
+from redis.crc import key_slot, REDIS_CLUSTER_HASH_SLOTS
+from redis.exceptions import ResponseError
+import fakeredis
+import fakeredis.aioredis
+
+# Команды без ключей, которые кластерный клиент рассылает на все узлы.
+BROADCAST_COMMANDS = {"script_load", "script_flush", "flushdb", "flushall", "ping"}
+# Команды, у которых ключами являются все позиционные аргументы.
+MULTI_KEY_COMMANDS = {"delete", "unlink", "exists", "touch", "mget"}
+
+
+def command_keys(name: str, args: tuple, kwargs: dict) -> list:
+    if name in ("evalsha", "eval"):
+        return list(args[2:2 + int(args[1])])
+    if name == "execute_command":
+        return list(args[1:2])
+    if name == "xreadgroup":
+        streams = args[2] if len(args) > 2 else kwargs["streams"]
+        return list(streams)
+    if name in MULTI_KEY_COMMANDS:
+        return list(args)
+    return list(args[:1])
+
+
+class FakeRedisCluster:
+    def __init__(self, nodes: int = 3):
+        self.nodes = [fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+                      for _ in range(nodes)]
+
+    def node_index(self, name: str, args: tuple, kwargs: dict) -> int:
+        keys = command_keys(name, args, kwargs)
+        if not keys:
+            return 0
+        slots = {key_slot(str(key).encode()) for key in keys}
+        if len(slots) > 1:
+            raise ResponseError("CROSSSLOT Keys in request don't hash to the same slot")
+        return slots.pop() * len(self.nodes) // REDIS_CLUSTER_HASH_SLOTS
+
+    def node_for(self, key: str):
+        return self.nodes[self.node_index("get", (key,), {})]
+
+    def __getattr__(self, name: str):
+        async def command(*args, **kwargs):
+            if name in BROADCAST_COMMANDS:
+                results = [await getattr(node, name)(*args, **kwargs) for node in self.nodes]
+                return results[0]
+            node = self.nodes[self.node_index(name, args, kwargs)]
+            return await getattr(node, name)(*args, **kwargs)
+        return command
+
+    def pipeline(self, transaction: bool = False) -> "FakeClusterPipeline":
+        return FakeClusterPipeline(self)
+
+    async def aclose(self) -> None:
+        for node in self.nodes:
+            await node.aclose()
+
+
+class FakeClusterPipeline:
+    def __init__(self, cluster: FakeRedisCluster):
+        self.cluster = cluster
+        self.commands = []
+
+    async def __aenter__(self) -> "FakeClusterPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.commands = []
+
+    def __await__(self):
+        yield from ()
+        return self
+
+    def __getattr__(self, name: str):
+        def command(*args, **kwargs):
+            self.commands.append((self.cluster.node_index(name, args, kwargs), name, args, kwargs))
+            return self
+        return command
+
+    async def execute(self, raise_on_error: bool = True) -> list:
+        results = [None] * len(self.commands)
+        by_node = {}
+        for position, (node_index, name, args, kwargs) in enumerate(self.commands):
+            by_node.setdefault(node_index, []).append((position, name, args, kwargs))
+        for node_index, commands in by_node.items():
+            async with self.cluster.nodes[node_index].pipeline(transaction=False) as pipe:
+                for _, name, args, kwargs in commands:
+                    getattr(pipe, name)(*args, **kwargs)
+                node_results = await pipe.execute(raise_on_error=False)
+            for (position, *_), result in zip(commands, node_results):
+                results[position] = result
+        self.commands = []
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
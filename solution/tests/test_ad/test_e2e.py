@@ -334,4 +334,101 @@ async def test_get_ad_among_different_advertisers(client: AsyncClient, session):
     ad = get_ad_response.json()
 
     # Ожидаем, что будет выбрана кампания с более высоким ML-скор (Campaign A2).
-    assert ad["ad_title"] == "Campaign A2"
\ No newline at end of file
+    assert ad["ad_title"] == "Campaign A2"
+
+# Тест: снимок активных кампаний строится по основной БД, даже если реплика ещё не получила кампанию.
+@pytest.mark.asyncio
+async def test_get_ad_with_lagging_replica(client: AsyncClient, tmp_path):
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+    from src.backend.database import Base, get_read_session
+    from src.main import app
+    from src.services.active_campaigns import reset_active_campaigns
+
+    await redis_client.set("current_day", 0)
+    advertiser_id = str(uuid4())
+    client_id = str(uuid4())
+    await client.post("/advertisers/bulk", json=[{"advertiser_id": advertiser_id, "name": "Replica Advertiser"}])
+    await client.post("/clients/bulk", json=[{"client_id": client_id, "login": "replica", "age": 30,
+                                              "location": "Replica", "gender": "FEMALE"}])
+    replica = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    async with replica.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def lagging_replica_session():
+        async with AsyncSession(replica, expire_on_commit=False) as replica_session:
+            yield replica_session
+
+    previous = app.dependency_overrides[get_read_session]
+    app.dependency_overrides[get_read_session] = lagging_replica_session
+    try:
+        reset_active_campaigns()
+        camp_response = await client.post(f"/advertisers/{advertiser_id}/campaigns", json={
+            "impressions_limit": 100, "clicks_limit": 10, "cost_per_impression": 0.1, "cost_per_click": 0.5,
+            "ad_title": "Primary Only Ad", "ad_text": "Text", "start_date": 0, "end_date": 10
+        })
+        assert camp_response.status_code == status.HTTP_201_CREATED
+
+        response = await client.get(f"/ads?client_id={client_id}")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["ad_title"] == "Primary Only Ad"
+    finally:
+        app.dependency_overrides[get_read_session] = previous
+        await replica.dispose()
+
+# Тест: статистика, прочитанная с отстающей реплики, не кладёт её запись кампании в кеш воркера,
+# и клик списывает стоимость из основной БД.
+@pytest.mark.asyncio
+async def test_click_cost_with_lagging_replica_stats(client: AsyncClient, tmp_path):
+    from uuid import UUID
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+    from src.backend.database import Base, get_read_session
+    from src.main import app
+    from src.models.campaign import Campaign
+    from src.models.user import User
+    from src.services.active_campaigns import reset_active_campaigns
+
+    await redis_client.set("current_day", 0)
+    advertiser_id = str(uuid4())
+    client_id = str(uuid4())
+    await client.post("/advertisers/bulk", json=[{"advertiser_id": advertiser_id, "name": "Replica Advertiser"}])
+    await client.post("/clients/bulk", json=[{"client_id": client_id, "login": "replica", "age": 30,
+                                              "location": "Replica", "gender": "FEMALE"}])
+    reset_active_campaigns()
+    camp_response = await client.post(f"/advertisers/{advertiser_id}/campaigns", json={
+        "impressions_limit": 100, "clicks_limit": 10, "cost_per_impression": 0.1, "cost_per_click": 0.5,
+        "ad_title": "Repriced Ad", "ad_text": "Text", "start_date": 0, "end_date": 10
+    })
+    campaign_id = camp_response.json()["campaign_id"]
+
+    # Реплика ещё хранит прежнюю стоимость клика.
+    replica = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    async with replica.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSession(replica) as replica_session:
+        replica_session.add(Campaign(campaign_id=UUID(campaign_id), advertiser_id=UUID(advertiser_id),
+                                     impressions_limit=100, clicks_limit=10, cost_per_impression=0.1,
+                                     cost_per_click=9.0, ad_title="Repriced Ad", ad_text="Text",
+                                     start_date=0, end_date=10, targeting={}))
+        replica_session.add(User(client_id=UUID(client_id), login="replica", age=30, location="Replica",
+                                 gender="FEMALE"))
+        await replica_session.commit()
+
+    async def lagging_replica_session():
+        async with AsyncSession(replica, expire_on_commit=False) as replica_session:
+            yield replica_session
+
+    previous = app.dependency_overrides[get_read_session]
+    app.dependency_overrides[get_read_session] = lagging_replica_session
+    try:
+        response = await client.get(f"/ads?client_id={client_id}")
+        assert response.json()["ad_id"] == campaign_id
+        response = await client.get(f"/stats/campaigns/{campaign_id}")
+        assert response.status_code == status.HTTP_200_OK
+
+        response = await client.post(f"/ads/{campaign_id}/click", json={"client_id": client_id})
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        response = await client.get(f"/stats/campaigns/{campaign_id}")
+        assert response.json()["spent_clicks"] == 0.5
+    finally:
+        app.dependency_overrides[get_read_session] = previous
+        await replica.dispose()
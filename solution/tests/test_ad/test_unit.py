@@ -109,4 +109,106 @@ async def test_get_ad_no_active_campaigns(client, session, test_redis):
     response = await client.get(f"/?client_id={test_client_id}")
     assert response.status_code == 404, response.text
     data = response.json()
-    assert data["detail"] == "Not Found"
\ No newline at end of file
+    assert data["detail"] == "Not Found"
+# --- Тест: снимок активных кампаний переиспользуется до смены версии ---
+@pytest.mark.asyncio
+async def test_active_campaigns_snapshot_invalidation(session, test_redis):
+    """
+    Пока версия набора кампаний не изменилась, снимок берётся из памяти воркера,
+    даже если таблица изменилась в обход репозитория. После bump_campaigns_version
+    снимок перечитывается из БД.
+    """
+    from src.repositories.campaign import CampaignRepository
+    from src.services.active_campaigns import get_active_campaigns, get_campaign_content, bump_campaigns_version
+
+    def make_campaign(title):
+        return Campaign(
+            campaign_id=uuid4(),
+            advertiser_id=uuid4(),
+            impressions_limit=100,
+            clicks_limit=50,
+            cost_per_impression=Decimal("0.1"),
+            cost_per_click=Decimal("1.0"),
+            ad_title=title,
+            ad_text="Snapshot Ad Text",
+            start_date=0,
+            end_date=10,
+            targeting={}
+        )
+
+    await test_redis.set("current_day", 1)
+    first = make_campaign("First")
+    session.add(first)
+    await session.commit()
+
+    campaign_repo = CampaignRepository(session)
+    snapshot = await get_active_campaigns(campaign_repo, test_redis)
+    assert snapshot.current_day == 1
+    assert len(snapshot.campaigns) == 1
+    assert (await get_campaign_content(campaign_repo, snapshot.campaigns[0].campaign_id)).ad_title == "First"
+
+    second = make_campaign("Second")
+    session.add(second)
+    await session.commit()
+    snapshot = await get_active_campaigns(campaign_repo, test_redis)
+    assert len(snapshot.campaigns) == 1
+
+    await bump_campaigns_version(test_redis)
+    snapshot = await get_active_campaigns(campaign_repo, test_redis)
+    assert {c.campaign_id for c in snapshot.campaigns} == {first.campaign_id, second.campaign_id}
+    assert snapshot.contents == {}
+
+    await test_redis.set("current_day", 11)
+    snapshot = await get_active_campaigns(campaign_repo, test_redis)
+    assert snapshot.current_day == 11
+    assert snapshot.campaigns == ()
+
+
+# --- Тест отбора кампаний по таргетингу в запросе ---
+@pytest.mark.asyncio
+async def test_list_active_campaigns_for_client(session, test_redis, monkeypatch):
+    """
+    list_active_campaigns с профилем клиента возвращает ровно кампании, для которых
+    campaign_matches_client истинно; условия для Postgres строятся по столбцам targeting_*.
+    """
+    from sqlalchemy.dialects import postgresql
+    from src.repositories.campaign import CampaignRepository, targeting_conditions
+    from src.services import active_campaigns
+    from src.services.ad_matching import campaign_matches_client
+    from src.services.client_profile_cache import ClientProfile
+
+    targetings = [
+        {}, None,
+        {"gender": "ALL", "age_from": None, "age_to": None, "location": None},
+        {"gender": "female", "age_from": 20, "age_to": 30, "location": "Moscow"},
+        {"gender": "MALE", "age_from": None, "age_to": 25, "location": None},
+        {"gender": None, "age_from": 26, "age_to": None, "location": "Kazan"},
+    ]
+    for i, targeting in enumerate(targetings):
+        session.add(Campaign(campaign_id=uuid4(), advertiser_id=uuid4(), impressions_limit=100, clicks_limit=50,
+                             cost_per_impression=Decimal("0.1"), cost_per_click=Decimal("1.0"), ad_title=f"T{i}",
+                             ad_text="Targeting", start_date=0, end_date=10, targeting=targeting))
+    await session.commit()
+    await test_redis.set("current_day", 1)
+
+    repo = CampaignRepository(session)
+    all_campaigns = await repo.list_active_campaigns(1)
+    for client_profile in (ClientProfile(uuid4(), 22, "FEMALE", "Moscow"), ClientProfile(uuid4(), 27, "MALE", "Kazan")):
+        matched = await repo.list_active_campaigns(1, client_profile)
+        expected = [c for c in all_campaigns if campaign_matches_client(c.targeting, client_profile)]
+        assert [c.ad_title for c in matched] == [c.ad_title for c in expected]
+
+    monkeypatch.setattr(active_campaigns, "TARGETING_SQL_PREFILTER", True)
+    client_profile = ClientProfile(uuid4(), 22, "FEMALE", "Moscow")
+    candidates = await active_campaigns.get_candidate_campaigns(repo, test_redis, client_profile)
+    assert {c.campaign_id for c in candidates} == {
+        c.campaign_id for c in all_campaigns if c.ad_title in {"T0", "T1", "T2", "T3"}
+    }
+
+    compiled = str(targeting_conditions(client_profile)[0].compile(dialect=postgresql.dialect()))
+    assert "campaigns.targeting_gender IS NULL" in compiled
+    # Вычисляемые столбцы объявлены в модели: схема из метаданных совпадает с миграцией 9d4f1e6a2b70.
+    from sqlalchemy.schema import CreateTable
+    ddl = str(CreateTable(Campaign.__table__).compile(dialect=postgresql.dialect()))
+    assert "targeting_gender TEXT GENERATED ALWAYS AS (upper(targeting ->> 'gender')) STORED" in ddl
+    assert "targeting_age_from INTEGER GENERATED ALWAYS AS ((targeting ->> 'age_from')::integer) STORED" in ddl
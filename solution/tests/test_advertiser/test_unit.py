@@ -32,4 +32,21 @@ async def test_advertiser_upsert_many(session):
     ]
     result = await repo.upsert_many(adv_data_list)
     assert len(result) == 2
-    assert {str(adv.advertiser_id) for adv in result} == {str(adv_ids[0]), str(adv_ids[1])}
\ No newline at end of file
+    assert {str(adv.advertiser_id) for adv in result} == {str(adv_ids[0]), str(adv_ids[1])}
+# Тест для проверки пакетного upsert рекламодателей с повторами advertiser_id: побеждает последняя запись.
+@pytest.mark.asyncio
+async def test_advertiser_upsert_many_last_wins(session):
+    repo = AdvertiserRepository(session)
+    existing_id, duplicated_id = uuid4(), uuid4()
+    await repo.upsert(AdvertiserUpsert(advertiser_id=existing_id, name="Old Name"))
+
+    result = await repo.upsert_many([
+        AdvertiserUpsert(advertiser_id=duplicated_id, name="First"),
+        AdvertiserUpsert(advertiser_id=existing_id, name="Renamed"),
+        AdvertiserUpsert(advertiser_id=duplicated_id, name="Last"),
+    ], chunk_size=1)
+
+    assert [adv.name for adv in result] == ["Last", "Renamed", "Last"]
+    session.expunge_all()
+    assert (await repo.get_by_id(existing_id)).name == "Renamed"
+    assert (await repo.get_by_id(duplicated_id)).name == "Last"
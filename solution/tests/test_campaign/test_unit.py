@@ -159,4 +159,66 @@ async def test_get_campaign_by_id_nonexistent(session):
     advertiser_id = uuid4()
     fake_campaign_id = uuid4()
     campaign = await camp_repo.get_campaign_by_id(advertiser_id, fake_campaign_id)
-    assert campaign is None
\ No newline at end of file
+    assert campaign is None
+# Тест кеша записей кампаний: повторное чтение без БД, сброс при обновлении и удалении, TTL и LRU.
+@pytest.mark.asyncio
+async def test_campaign_record_cache(session):
+    from src.services.campaign_cache import CampaignCache, CampaignRecord
+
+    await redis_client.set("current_day", 0)
+    await redis_client.set("moderation_enabled", "0")
+    adv_id = uuid4()
+    await AdvertiserRepository(session).upsert(AdvertiserUpsert(advertiser_id=adv_id, name="Cached Advertiser"))
+    cache = CampaignCache(ttl_s=60, max_size=10)
+    camp_repo = CampaignRepository(session, cache=cache)
+    camp_data = dict(impressions_limit=100, clicks_limit=10, cost_per_impression=0.05, cost_per_click=0.2,
+                     ad_title="Cached Ad", ad_text="Text", start_date=1, end_date=10)
+    campaign = await camp_repo.create_campaign(adv_id, CampaignCreate(**camp_data))
+    campaign_id = campaign.campaign_id
+
+    record = await camp_repo.get_campaign_record(campaign_id)
+    assert record.advertiser_id == adv_id
+    assert float(record.cost_per_click) == 0.2
+    assert await camp_repo.get_campaign_record(campaign_id) is record
+
+    await camp_repo.update_campaign(adv_id, campaign_id, CampaignUpdate(**{**camp_data, "cost_per_click": 0.4, "targeting": Targeting()}))
+    assert cache.get(campaign_id) is None
+    assert float((await camp_repo.get_campaign_record(campaign_id)).cost_per_click) == 0.4
+
+    assert await camp_repo.delete_campaign(adv_id, campaign_id)
+    assert await camp_repo.get_campaign_record(campaign_id) is None
+    assert len(cache) == 0
+
+    now = [0.0]
+    bounded = CampaignCache(ttl_s=5, max_size=2, clock=lambda: now[0])
+    records = [CampaignRecord(uuid4(), adv_id, 0.01, 0.1, 0, 1) for _ in range(3)]
+    bounded.put(records[0].campaign_id, records[0])
+    bounded.put(records[1].campaign_id, records[1])
+    assert bounded.get(records[0].campaign_id) is records[0]
+    bounded.put(records[2].campaign_id, records[2])
+    assert bounded.get(records[1].campaign_id) is None
+    assert bounded.get(records[0].campaign_id) is records[0]
+    now[0] = 5.0
+    assert bounded.get(records[2].campaign_id) is None
+
+
+# Тест сброса кеша записей кампаний другого воркера после изменения кампании
+@pytest.mark.asyncio
+async def test_campaign_record_cache_other_worker(session):
+    from src.services.campaign_cache import CampaignCache
+
+    await redis_client.set("current_day", 0)
+    await redis_client.set("moderation_enabled", "0")
+    adv_id = uuid4()
+    await AdvertiserRepository(session).upsert(AdvertiserUpsert(advertiser_id=adv_id, name="Other Worker Advertiser"))
+    writer = CampaignRepository(session, cache=CampaignCache(ttl_s=60, max_size=10))
+    reader = CampaignRepository(session, cache=CampaignCache(ttl_s=60, max_size=10))
+    camp_data = dict(impressions_limit=100, clicks_limit=10, cost_per_impression=0.05, cost_per_click=0.2,
+                     ad_title="Other Worker Ad", ad_text="Text", start_date=1, end_date=10)
+    campaign_id = (await writer.create_campaign(adv_id, CampaignCreate(**camp_data))).campaign_id
+
+    record = await reader.get_campaign_record(campaign_id)
+    assert await reader.get_campaign_record(campaign_id) is record
+
+    await writer.update_campaign(adv_id, campaign_id, CampaignUpdate(**{**camp_data, "cost_per_click": 0.4, "targeting": Targeting()}))
+    assert float((await reader.get_campaign_record(campaign_id)).cost_per_click) == 0.4
@@ -9,6 +9,7 @@ from src.schemas.campaign import CampaignCreate, CampaignUpdate, Targeting
 from src.schemas.client import ClientUpsert
 from src.schemas.ml_score import MLScore
 from src.backend.cache import redis_client
+from src.repositories.client_ordinal import ClientOrdinalRepository, CLIENT_ORDINALS_KEY
 
 
 # Тест для проверки создания/обновления клиента (пользователя) через репозиторий.
@@ -38,4 +39,87 @@ async def test_user_upsert_many(session):
     ]
     result = await repo.upsert_many(clients_data)
     assert len(result) == 2
-    assert {str(u.client_id) for u in result} == {str(client_ids[0]), str(client_ids[1])}
\ No newline at end of file
+    assert {str(u.client_id) for u in result} == {str(client_ids[0]), str(client_ids[1])}
+# Тест для проверки пакетного upsert клиентов: несколько пачек, обновление существующих и повтор client_id.
+@pytest.mark.asyncio
+async def test_user_upsert_many_chunked_with_duplicates(session):
+    repo = UserRepository(session)
+    existing_id, new_id, other_id = uuid4(), uuid4(), uuid4()
+    await repo.upsert(ClientUpsert(client_id=existing_id, login="old", age=20, location="Old", gender="MALE"))
+
+    result = await repo.upsert_many([
+        ClientUpsert(client_id=existing_id, login="updated", age=21, location="New", gender="FEMALE"),
+        ClientUpsert(client_id=new_id, login="first", age=30, location="City", gender="MALE"),
+        ClientUpsert(client_id=other_id, login="other", age=40, location="City", gender="FEMALE"),
+        ClientUpsert(client_id=new_id, login="last", age=31, location="City", gender="MALE"),
+    ], chunk_size=2)
+
+    assert [u.client_id for u in result] == [existing_id, new_id, other_id, new_id]
+    assert [u.login for u in result] == ["updated", "last", "other", "last"]
+    session.expunge_all()
+    stored = await repo.get_by_id(existing_id)
+    assert (stored.login, stored.age, stored.location, stored.gender) == ("updated", 21, "New", "FEMALE")
+
+# Тест для проверки реестра номеров клиентов: номера плотные, стабильные и кешируются в Redis.
+@pytest.mark.asyncio
+async def test_client_ordinal_registry(session, test_redis):
+    ordinal_repo = ClientOrdinalRepository(session)
+    first, second, third = uuid4(), uuid4(), uuid4()
+
+    first_ordinal = await ordinal_repo.get_or_assign(first, test_redis)
+    assert await ordinal_repo.get_or_assign(first, test_redis) == first_ordinal
+    assert int(await test_redis.hget(CLIENT_ORDINALS_KEY, str(first))) == first_ordinal
+
+    ordinals = await ordinal_repo.assign_many([second, first, third, second], test_redis)
+    assert ordinals[first] == first_ordinal
+    assert sorted(ordinals.values()) == [first_ordinal, first_ordinal + 1, first_ordinal + 2]
+    assert await ordinal_repo.get_or_assign(third, test_redis) == ordinals[third]
+
+# Тест кеша профилей клиентов: промах читает БД, повтор - из памяти или Redis, upsert пишет новые значения.
+@pytest.mark.asyncio
+async def test_client_profile_cache(session, test_redis):
+    from src.services.client_profile_cache import ClientProfileCache
+    from src.backend.metrics import client_profile_cache_hits_total, client_profile_cache_misses_total
+
+    cache = ClientProfileCache(test_redis, max_size=10)
+    repo = UserRepository(session, profiles=cache)
+    client_id = uuid4()
+    assert await repo.get_profile(client_id) is None
+
+    other_cache = ClientProfileCache(test_redis, max_size=10)
+    await UserRepository(session, profiles=other_cache).upsert_many(
+        [ClientUpsert(client_id=client_id, login="cached", age=25, location="City|North", gender="FEMALE")]
+    )
+    cache.clear_local()
+
+    misses = client_profile_cache_misses_total._value.get()
+    redis_hits = client_profile_cache_hits_total.labels(layer="redis")._value.get()
+    local_hits = client_profile_cache_hits_total.labels(layer="local")._value.get()
+    profile = await repo.get_profile(client_id)
+    assert (profile.age, profile.gender, profile.location) == (25, "FEMALE", "City|North")
+    assert await repo.get_profile(client_id) is profile
+    assert client_profile_cache_misses_total._value.get() == misses
+    assert client_profile_cache_hits_total.labels(layer="redis")._value.get() == redis_hits + 1
+    assert client_profile_cache_hits_total.labels(layer="local")._value.get() == local_hits + 1
+
+    await repo.upsert(ClientUpsert(client_id=client_id, login="cached", age=26, location="Moscow", gender="FEMALE"))
+    profile = await repo.get_profile(client_id)
+    assert (profile.age, profile.location) == (26, "Moscow")
+    assert await test_redis.get(f"client:{client_id}:profile") == "26|FEMALE|Moscow"
+
+
+# Тест заполнения кеша профилей при промахе: профиль, прочитанный до upsert, не затирает новый.
+@pytest.mark.asyncio
+async def test_client_profile_cache_fill_keeps_upserted(session, test_redis):
+    from src.services.client_profile_cache import ClientProfile, ClientProfileCache
+
+    client_id = uuid4()
+    stale = ClientProfile(client_id, 30, "MALE", "Kazan")
+    writer = UserRepository(session, profiles=ClientProfileCache(test_redis, max_size=10))
+    await writer.upsert(ClientUpsert(client_id=client_id, login="fresh", age=31, location="Moscow", gender="MALE"))
+
+    cache = ClientProfileCache(test_redis, max_size=10)
+    profile = await cache.fill(stale)
+    assert (profile.age, profile.location) == (31, "Moscow")
+    assert await test_redis.get(f"client:{client_id}:profile") == "31|MALE|Moscow"
+    assert (await cache.get(client_id)).age == 31
@@ -1,3 +1,4 @@
+import json
 import pytest
 from uuid import uuid4
 from httpx import AsyncClient
@@ -34,4 +35,64 @@ async def test_e2e_ml_score(client: AsyncClient):
     response = await client.post("/ml-scores/", json=ml_payload)
     assert response.status_code == 200
     ml_resp = response.json()
-    assert ml_resp["score"] == 90
\ No newline at end of file
+    assert ml_resp["score"] == 90
+# Тест для массовой загрузки ML-оценок в форматах JSON, NDJSON и CSV с отчётом об отклонённых строках.
+@pytest.mark.asyncio
+async def test_e2e_ml_scores_bulk(client: AsyncClient, session):
+    advertiser_id = uuid4()
+    response = await client.post("/advertisers/bulk", json=[{"advertiser_id": str(advertiser_id), "name": "Bulk ML"}])
+    assert response.status_code == 201
+    client_ids = [uuid4(), uuid4()]
+    response = await client.post("/clients/bulk", json=[
+        {"client_id": str(cid), "login": "ml_bulk", "age": 30, "location": "Test", "gender": "MALE"}
+        for cid in client_ids
+    ])
+    assert response.status_code == 201
+
+    unknown_client = uuid4()
+    response = await client.post("/ml-scores/bulk", json=[
+        {"client_id": str(client_ids[0]), "advertiser_id": str(advertiser_id), "score": 10},
+        {"client_id": str(unknown_client), "advertiser_id": str(advertiser_id), "score": 20},
+        {"client_id": str(client_ids[1]), "advertiser_id": str(advertiser_id), "score": -1},
+        {"client_id": str(client_ids[0]), "advertiser_id": str(advertiser_id), "score": 15},
+    ])
+    assert response.status_code == 200
+    report = response.json()
+    # Строки 0 и 3 - одна пара клиент/рекламодатель: записывается последняя, учитывается один раз.
+    assert report["accepted"] == 1
+    assert report["rejected_count"] == 2
+    assert report["rejected"] == [
+        {"row": 1, "reason": "Клиент не найден"},
+        {"row": 2, "reason": "Ошибка валидации"},
+    ]
+
+    ndjson = "\n".join([
+        json.dumps({"client_id": str(client_ids[1]), "advertiser_id": str(advertiser_id), "score": 30}),
+        "not json",
+        json.dumps({"client_id": str(client_ids[1]), "advertiser_id": str(uuid4()), "score": 40}),
+    ]).encode() + b"\n\xff\xfe{}"
+    response = await client.post("/ml-scores/bulk", content=ndjson,
+                                 headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    report = response.json()
+    assert report["accepted"] == 1
+    assert [r["reason"] for r in report["rejected"]] == [
+        "Ошибка валидации", "Рекламодатель не найден", "Ошибка валидации"
+    ]
+
+    # Поле в кавычках с переводом строки - одна запись, а не две.
+    csv_body = (f"client_id,advertiser_id,score\n{client_ids[0]},{advertiser_id},99\n".encode() + b"\xc3\x28,x,1\n"
+                + b'"multi\nline",x,1\n' + f'"{client_ids[1]}",{advertiser_id},31\n'.encode())
+    response = await client.post("/ml-scores/bulk", content=csv_body, headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    assert response.json() == {"accepted": 2, "rejected_count": 2, "rejected": [
+        {"row": 1, "reason": "Ошибка валидации"}, {"row": 2, "reason": "Ошибка валидации"}
+    ]}
+
+    from src.repositories.ml_score import MLScoreRepository
+    ml_repo = MLScoreRepository(session)
+    assert await ml_repo.get_scores_for_client(client_ids[0], [advertiser_id]) == {advertiser_id: 99}
+    assert await ml_repo.get_scores_for_client(client_ids[1], [advertiser_id]) == {advertiser_id: 31}
+
+    response = await client.post("/ml-scores/bulk", json={"not": "a list"})
+    assert response.status_code == 400
@@ -1,3 +1,4 @@
+import os
 import pytest
 from uuid import uuid4
 from src.repositories.advertiser import AdvertiserRepository
@@ -76,4 +77,52 @@ async def test_get_average_ml_score(session, test_redis):
     await session.commit()
 
     avg_score = await camp_repo.get_average_ml_score(campaign_id)
-    assert avg_score == 90.0
\ No newline at end of file
+    assert avg_score == 90.0
+# Тест для проверки пакетного получения ML‑оценок клиента одним запросом.
+@pytest.mark.asyncio
+async def test_get_scores_for_client(session):
+    user_repo = UserRepository(session)
+    ml_repo = MLScoreRepository(session)
+    client_id = uuid4()
+    advertiser_ids = [uuid4() for _ in range(3)]
+    await user_repo.upsert(
+        ClientUpsert(client_id=client_id, login="mlbulk", age=33, location="City", gender="MALE")
+    )
+    await ml_repo.upsert(MLScore(client_id=client_id, advertiser_id=advertiser_ids[0], score=10))
+    await ml_repo.upsert(MLScore(client_id=client_id, advertiser_id=advertiser_ids[1], score=20))
+    await ml_repo.upsert(MLScore(client_id=uuid4(), advertiser_id=advertiser_ids[2], score=30))
+
+    scores = await ml_repo.get_scores_for_client(client_id, advertiser_ids + [advertiser_ids[0]])
+    assert scores == {advertiser_ids[0]: 10, advertiser_ids[1]: 20}
+    assert await ml_repo.get_scores_for_client(client_id, []) == {}
+
+# Тест для проверки загрузки ML‑оценок на Postgres: COPY во временную staging-таблицу
+# и перенос INSERT ... ON CONFLICT, в том числе несколькими пачками в одной транзакции.
+@pytest.mark.postgres
+@pytest.mark.skipif(not os.getenv("DATABASE_TEST_URL", "").startswith("postgresql"), reason="COPY выполняется только на Postgres")
+@pytest.mark.asyncio
+async def test_load_scores_copy_postgres(session):
+    ml_repo = MLScoreRepository(session)
+    client_ids = [uuid4() for _ in range(2)]
+    advertiser_ids = [uuid4() for _ in range(2)]
+    await UserRepository(session).upsert_many([
+        ClientUpsert(client_id=cid, login="mlcopy", age=30, location="City", gender="MALE") for cid in client_ids
+    ])
+    await AdvertiserRepository(session).upsert_many([
+        AdvertiserUpsert(advertiser_id=aid, name="ML Copy") for aid in advertiser_ids
+    ])
+    await ml_repo.upsert(MLScore(client_id=client_ids[0], advertiser_id=advertiser_ids[0], score=1))
+
+    await ml_repo.load_scores([
+        {"client_id": client_ids[0], "advertiser_id": advertiser_ids[0], "score": 10},
+        {"client_id": client_ids[0], "advertiser_id": advertiser_ids[1], "score": 20},
+    ])
+    await ml_repo.load_scores([
+        {"client_id": client_ids[1], "advertiser_id": advertiser_ids[0], "score": 30},
+    ])
+    await session.commit()
+
+    assert await ml_repo.get_scores_for_client(client_ids[0], advertiser_ids) == {
+        advertiser_ids[0]: 10, advertiser_ids[1]: 20
+    }
+    assert await ml_repo.get_scores_for_client(client_ids[1], advertiser_ids) == {advertiser_ids[0]: 30}
@@ -2,6 +2,10 @@ import pytest
 from uuid import uuid4
 from src.repositories.advertiser import AdvertiserRepository
 from src.repositories.campaign import CampaignRepository
+from src.repositories.campaign_counters import ApproximateCounters, get_counter_backend
+from src.repositories.redis_keys import campaign_key
+from src.services.event_buffer import EventBuffer
+from src.services.event_stream import EventStreamAggregator
 from src.repositories.user import UserRepository
 from src.repositories.ml_score import MLScoreRepository
 from src.schemas.advertiser import AdvertiserUpsert
@@ -9,6 +13,25 @@ from src.schemas.campaign import CampaignCreate, CampaignUpdate, Targeting
 from src.schemas.client import ClientUpsert
 from src.schemas.ml_score import MLScore
 from src.backend.cache import redis_client
+from redis.exceptions import ResponseError
+from prometheus_client import REGISTRY
+
+def campaign_create(start_date=0, end_date=10, cost_per_impression=0.5, cost_per_click=2.0,
+                    impressions_limit=100, clicks_limit=10) -> CampaignCreate:
+    """
+    Кампания без таргетинга для тестов учёта событий.
+    """
+    return CampaignCreate(
+        impressions_limit=impressions_limit,
+        clicks_limit=clicks_limit,
+        cost_per_impression=cost_per_impression,
+        cost_per_click=cost_per_click,
+        ad_title="Counters Ad",
+        ad_text="Counters",
+        start_date=start_date,
+        end_date=end_date,
+        targeting=Targeting(gender="ALL")
+    )
 
 # Тест для проверки агрегирования статистики по кампании: подсчет импрессий, кликов и расходов.
 @pytest.mark.asyncio
@@ -69,9 +92,9 @@ async def test_campaign_daily_stats(session, test_redis):
     # Устанавливаем текущий день в Redis (в виде строки).
     await test_redis.set("current_day", "3")
     # Симулируем импрессии и клики в разные дни.
-    day1_key = f"campaign:{campaign_id}:daily:impressions:1"
+    day1_key = campaign_key(campaign_id, "daily:impressions:1")
     await test_redis.sadd(day1_key, str(uuid4()))
-    day2_key = f"campaign:{campaign_id}:daily:clicks:2"
+    day2_key = campaign_key(campaign_id, "daily:clicks:2")
     await test_redis.sadd(day2_key, str(uuid4()))
 
     daily_stats = await camp_repo.get_campaign_daily_stats(campaign_id, test_redis)
@@ -80,6 +103,28 @@ async def test_campaign_daily_stats(session, test_redis):
     non_zero = any(stat["impressions_count"] > 0 or stat["clicks_count"] > 0 for stat in daily_stats)
     assert non_zero
 
+# Тест для проверки переноса дневной статистики из старых ключей: после первого события
+# в новой сводке прошлые дни не обнуляются, а день перехода складывается из обоих источников.
+@pytest.mark.asyncio
+async def test_campaign_daily_stats_merges_legacy_days(session, test_redis):
+    await redis_client.set("current_day", 0)
+    camp_repo = CampaignRepository(session)
+    campaign = await camp_repo.create_campaign(uuid4(), campaign_create(end_date=5, impressions_limit=20, clicks_limit=5))
+    campaign_id = campaign.campaign_id
+    await test_redis.sadd(campaign_key(campaign_id, "daily:impressions:1"), "a", "b")
+    await test_redis.sadd(campaign_key(campaign_id, "daily:clicks:1"), "a")
+    await test_redis.set(campaign_key(campaign_id, "daily:spent_impressions:1"), "1.0")
+    await test_redis.set(campaign_key(campaign_id, "daily:spent_clicks:1"), "2.0")
+    await test_redis.sadd(campaign_key(campaign_id, "daily:impressions:2"), "c")
+    await test_redis.set(campaign_key(campaign_id, "daily:spent_impressions:2"), "0.5")
+    await test_redis.set("current_day", 2)
+    await camp_repo.log_impression(campaign_id, uuid4(), test_redis, campaign)
+
+    for _ in range(2):
+        daily_stats = await camp_repo.get_campaign_daily_stats(campaign_id, test_redis)
+        assert [(stat["impressions_count"], stat["clicks_count"]) for stat in daily_stats] == [(0, 0), (2, 1), (2, 0)]
+        assert [stat["spent_total"] for stat in daily_stats] == [0.0, 3.0, 1.0]
+
 # Тест для кампании, которая уже закончилась: ежедневная статистика должна возвращать данные только до end_date.
 @pytest.mark.asyncio
 async def test_campaign_daily_stats_with_finished_campaign(session, test_redis):
@@ -145,3 +190,503 @@ async def test_advertiser_stats_no_campaigns(session, test_redis):
 async def test_advertiser_daily_stats_no_campaigns(session, test_redis):
     daily_stats = await CampaignRepository(session).get_advertiser_daily_stats(uuid4(), test_redis)
     assert daily_stats is None
+
+# Тест для проверки пакетного чтения счётчиков показов и кликов одним пайплайном.
+@pytest.mark.asyncio
+async def test_get_counters_bulk(session, test_redis):
+    camp_repo = CampaignRepository(session)
+    first, second, empty = uuid4(), uuid4(), uuid4()
+    await test_redis.sadd(campaign_key(first, "impressions"), "a", "b", "c")
+    await test_redis.sadd(campaign_key(first, "clicks"), "a")
+    await test_redis.sadd(campaign_key(second, "impressions"), "a")
+
+    counters = await camp_repo.get_counters_bulk([first, second, empty], test_redis)
+    assert counters == [(3, 1), (1, 0), (0, 0)]
+    assert await camp_repo.get_counters_bulk([], test_redis) == []
+
+# Тест для проверки атомарной дедупликации показов и кликов при конкурентных запросах.
+@pytest.mark.asyncio
+async def test_concurrent_events_are_counted_once(session, test_redis):
+    import asyncio
+    await test_redis.set("current_day", 2)
+    camp_repo = CampaignRepository(session)
+    campaign = await camp_repo.create_campaign(uuid4(), campaign_create(start_date=2))
+    campaign_id, client_id = campaign.campaign_id, uuid4()
+
+    impressions = await asyncio.gather(*[
+        camp_repo.log_impression(campaign_id, client_id, test_redis, campaign) for _ in range(20)
+    ])
+    clicks = await asyncio.gather(*[
+        camp_repo.log_click(campaign_id, client_id, test_redis, campaign) for _ in range(20)
+    ])
+    assert set(impressions) == {1}
+    assert set(clicks) == {1}
+    assert float(await test_redis.get(campaign_key(campaign_id, "spent_impressions"))) == 0.5
+    assert float(await test_redis.get(campaign_key(campaign_id, "spent_clicks"))) == 2.0
+    daily_rollup = await test_redis.hgetall(campaign_key(campaign_id, "daily_stats"))
+    assert daily_rollup["2:impressions"] == "1"
+    assert daily_rollup["2:clicks"] == "1"
+    assert float(daily_rollup["2:spent_clicks"]) == 2.0
+
+    # Клик без предшествующего показа не засчитывается.
+    assert await camp_repo.log_click(campaign_id, uuid4(), test_redis, campaign) == 1
+
+# Тест для проверки дневной статистики, собранной из дневной сводки, которую ведут скрипты учёта событий.
+@pytest.mark.asyncio
+async def test_campaign_daily_stats_from_rollup(session, test_redis):
+    await test_redis.set("current_day", 0)
+    camp_repo = CampaignRepository(session)
+    campaign = await camp_repo.create_campaign(uuid4(), campaign_create())
+    first, second = uuid4(), uuid4()
+    await camp_repo.log_impression(campaign.campaign_id, first, test_redis)
+    await test_redis.set("current_day", 2)
+    await camp_repo.log_impression(campaign.campaign_id, second, test_redis)
+    await camp_repo.log_click(campaign.campaign_id, first, test_redis)
+
+    daily_stats = await camp_repo.get_campaign_daily_stats(campaign.campaign_id, test_redis)
+    assert [stat["date"] for stat in daily_stats] == [0, 1, 2]
+    assert (daily_stats[0]["impressions_count"], daily_stats[0]["spent_impressions"]) == (1, 0.5)
+    assert daily_stats[1]["spent_total"] == 0.0
+    assert daily_stats[2] == {
+        "date": 2,
+        "impressions_count": 1,
+        "clicks_count": 1,
+        "conversion": 100.0,
+        "spent_impressions": 0.5,
+        "spent_clicks": 2.0,
+        "spent_total": 2.5
+    }
+
+# Тест для проверки, что агрегаты рекламодателя совпадают с суммой статистики его кампаний,
+# включая клики после окончания кампании, дни с кликами без показов и удаление кампании.
+@pytest.mark.asyncio
+async def test_advertiser_aggregates_match_campaign_fan_out(session, test_redis):
+    await redis_client.set("current_day", 0)
+    adv_repo = AdvertiserRepository(session)
+    camp_repo = CampaignRepository(session)
+    advertiser_id = uuid4()
+    await adv_repo.upsert_many([AdvertiserUpsert(advertiser_id=advertiser_id, name="Aggregated")])
+
+    short = await camp_repo.create_campaign(advertiser_id, campaign_create(0, 1, 0.1, 1.5))
+    long = await camp_repo.create_campaign(advertiser_id, campaign_create(1, 5, 0.25, 3.0))
+    removed = await camp_repo.create_campaign(advertiser_id, campaign_create(0, 5, 0.7, 9.0))
+    clients = [uuid4() for _ in range(4)]
+
+    await camp_repo.log_impression(short.campaign_id, clients[0], redis_client)
+    await camp_repo.log_impression(removed.campaign_id, clients[0], redis_client)
+    await redis_client.set("current_day", 1)
+    await camp_repo.log_impression(short.campaign_id, clients[1], redis_client)
+    await camp_repo.log_impression(long.campaign_id, clients[0], redis_client)
+    await camp_repo.log_click(long.campaign_id, clients[0], redis_client)
+    await camp_repo.log_click(removed.campaign_id, clients[0], redis_client)
+    await redis_client.set("current_day", 2)
+    # Клики после окончания короткой кампании и в день без показов длинной.
+    await camp_repo.log_click(short.campaign_id, clients[0], redis_client)
+    await camp_repo.log_impression(long.campaign_id, clients[1], redis_client)
+    await redis_client.set("current_day", 3)
+    await camp_repo.log_click(long.campaign_id, clients[1], redis_client)
+    await camp_repo.log_impression(long.campaign_id, clients[2], redis_client)
+    await redis_client.set("current_day", 4)
+    await camp_repo.log_impression(long.campaign_id, clients[3], redis_client)
+    await camp_repo.delete_campaign(advertiser_id, removed.campaign_id)
+    # Показ удалённой кампании от воркера со старым снимком не возвращает её вклад в агрегаты.
+    await camp_repo.log_impression(removed.campaign_id, clients[1], redis_client, removed)
+
+    campaign_ids = [short.campaign_id, long.campaign_id]
+    campaign_stats = [await camp_repo.get_campaign_stats(cid, redis_client) for cid in campaign_ids]
+    advertiser_stats = await camp_repo.get_advertiser_stats(advertiser_id, redis_client)
+    for field in ("impressions_count", "clicks_count"):
+        assert advertiser_stats[field] == sum(stats[field] for stats in campaign_stats)
+    for field in ("spent_impressions", "spent_clicks", "spent_total"):
+        assert advertiser_stats[field] == pytest.approx(sum(stats[field] for stats in campaign_stats))
+
+    expected_daily = {day: {"impressions_count": 0, "clicks_count": 0, "spent_total": 0.0} for day in range(5)}
+    for cid in campaign_ids:
+        for stat in await camp_repo.get_campaign_daily_stats(cid, redis_client):
+            for field in expected_daily[stat["date"]]:
+                expected_daily[stat["date"]][field] += stat[field]
+    advertiser_daily = await camp_repo.get_advertiser_daily_stats(advertiser_id, redis_client)
+    assert [stat["date"] for stat in advertiser_daily] == list(range(5))
+    for stat in advertiser_daily:
+        expected = expected_daily[stat["date"]]
+        assert (stat["impressions_count"], stat["clicks_count"]) == (expected["impressions_count"], expected["clicks_count"])
+        assert stat["spent_total"] == pytest.approx(expected["spent_total"])
+    assert advertiser_daily[3]["clicks_count"] == 1
+
+    assert await camp_repo.get_advertiser_stats(uuid4(), redis_client) is None
+    assert await camp_repo.get_advertiser_daily_stats(uuid4(), redis_client) is None
+
+# Тест для проверки заполнения агрегатов рекламодателя из счётчиков кампаний: после удаления
+# хешей рекламодателя пересчёт восстанавливает ту же статистику, учитывая и старые дневные ключи.
+@pytest.mark.asyncio
+async def test_advertiser_stats_backfill(session, test_redis):
+    from src.repositories.redis_keys import advertiser_key
+    from src.services.advertiser_stats_backfill import backfill_advertiser_stats
+
+    await redis_client.set("current_day", 0)
+    await test_redis.set("current_day", 0)
+    advertiser_id = uuid4()
+    await AdvertiserRepository(session).upsert_many([AdvertiserUpsert(advertiser_id=advertiser_id, name="Backfill")])
+    camp_repo = CampaignRepository(session)
+
+    live = await camp_repo.create_campaign(advertiser_id, campaign_create(0, 1))
+    legacy = await camp_repo.create_campaign(advertiser_id, campaign_create(0, 5))
+    clients = [uuid4() for _ in range(3)]
+    await camp_repo.log_impression(live.campaign_id, clients[0], test_redis, live)
+    await test_redis.set("current_day", 1)
+    await camp_repo.log_impression(live.campaign_id, clients[1], test_redis, live)
+    await camp_repo.log_click(live.campaign_id, clients[1], test_redis, live)
+    await test_redis.set("current_day", 2)
+    await camp_repo.log_click(live.campaign_id, clients[0], test_redis, live)
+    expected_stats = await camp_repo.get_advertiser_stats(advertiser_id, test_redis)
+    expected_daily = await camp_repo.get_advertiser_daily_stats(advertiser_id, test_redis)
+
+    # Кампания, учтённая до появления агрегатов и дневной сводки: только старые ключи.
+    await test_redis.sadd(campaign_key(legacy.campaign_id, "impressions"), "a", "b")
+    await test_redis.sadd(campaign_key(legacy.campaign_id, "daily:impressions:1"), "a", "b")
+    await test_redis.set(campaign_key(legacy.campaign_id, "spent_impressions"), "1.0")
+    await test_redis.set(campaign_key(legacy.campaign_id, "daily:spent_impressions:1"), "1.0")
+    await test_redis.delete(advertiser_key(advertiser_id, "stats"), advertiser_key(advertiser_id, "daily_stats"))
+
+    # Пока не переименованы ключи старого вида, заполнение откладывается без отметки о выполнении.
+    await test_redis.set(f"campaign:{legacy.campaign_id}:clicks_total", 1)
+    assert await backfill_advertiser_stats(session, test_redis) is None
+    assert not await test_redis.exists("advertiser_stats_backfilled")
+    await test_redis.delete(f"campaign:{legacy.campaign_id}:clicks_total")
+
+    assert await backfill_advertiser_stats(session, test_redis) == 1
+    stats = await camp_repo.get_advertiser_stats(advertiser_id, test_redis)
+    assert stats["impressions_count"] == expected_stats["impressions_count"] + 2
+    assert stats["clicks_count"] == expected_stats["clicks_count"]
+    assert stats["spent_total"] == pytest.approx(expected_stats["spent_total"] + 1.0)
+    daily = await camp_repo.get_advertiser_daily_stats(advertiser_id, test_redis)
+    expected_daily[1]["impressions_count"] += 2
+    expected_daily[1]["spent_impressions"] += 1.0
+    expected_daily[1]["spent_total"] += 1.0
+    assert [(s["date"], s["impressions_count"], s["clicks_count"]) for s in daily] == \
+        [(s["date"], s["impressions_count"], s["clicks_count"]) for s in expected_daily]
+    assert [s["spent_total"] for s in daily] == pytest.approx([s["spent_total"] for s in expected_daily])
+    # Повторный запуск ничего не делает.
+    assert await backfill_advertiser_stats(session, test_redis) == 0
+    # Одновременные запуски (старт нескольких реплик) пересчитывают агрегаты один раз.
+    import asyncio
+    await test_redis.delete("advertiser_stats_backfilled")
+    assert sorted(await asyncio.gather(
+        backfill_advertiser_stats(session, test_redis), backfill_advertiser_stats(session, test_redis)
+    )) == [0, 1]
+
+# Тест для проверки приближённого режима счётчиков: HyperLogLog для подсчёта и фильтр Блума для дедупликации.
+@pytest.mark.asyncio
+async def test_approximate_counters(session, test_redis):
+    await redis_client.set("current_day", 0)
+    await test_redis.set("current_day", 0)
+    counters = ApproximateCounters(capacity=10000, error_rate=0.001)
+    camp_repo = CampaignRepository(session, counters=counters)
+    campaign = await camp_repo.create_campaign(uuid4(), campaign_create(impressions_limit=1000, clicks_limit=100))
+    campaign_id = campaign.campaign_id
+    clients = [uuid4() for _ in range(300)]
+    for client_id in clients + clients[:50]:
+        await camp_repo.log_impression(campaign_id, client_id, test_redis, campaign)
+    for client_id in clients[:30] + clients[:30]:
+        await camp_repo.log_click(campaign_id, client_id, test_redis, campaign)
+    # Клик без предшествующего показа не засчитывается.
+    await camp_repo.log_click(campaign_id, uuid4(), test_redis, campaign)
+
+    counters_bulk = await camp_repo.get_counters_bulk([campaign_id], test_redis)
+    impressions, clicks = counters_bulk[0]
+    assert impressions == pytest.approx(300, rel=0.02)
+    assert clicks == pytest.approx(30, rel=0.02)
+    assert float(await test_redis.get(campaign_key(campaign_id, "spent_impressions"))) == pytest.approx(150.0)
+    assert float(await test_redis.get(campaign_key(campaign_id, "spent_clicks"))) == pytest.approx(60.0)
+    assert await test_redis.exists(campaign_key(campaign_id, "impressions")) == 0
+    assert await test_redis.strlen(campaign_key(campaign_id, "impressions_bloom")) <= counters.bits // 8 + 1
+
+    with pytest.raises(ValueError):
+        get_counter_backend("unknown")
+
+# Тест для проверки режима битовых карт: дедупликация и подсчёт по номерам клиентов из реестра.
+@pytest.mark.asyncio
+async def test_bitmap_counters(session, test_redis):
+    await redis_client.set("current_day", 0)
+    await test_redis.set("current_day", 0)
+    camp_repo = CampaignRepository(session, counters=get_counter_backend("bitmap"))
+    campaign = await camp_repo.create_campaign(uuid4(), campaign_create())
+    campaign_id = campaign.campaign_id
+    clients = [uuid4() for _ in range(5)]
+    for client_id in clients + clients[:2]:
+        await camp_repo.log_impression(campaign_id, client_id, test_redis, campaign)
+    for client_id in clients[:2] + clients[:1]:
+        await camp_repo.log_click(campaign_id, client_id, test_redis, campaign)
+    assert await camp_repo.log_click(campaign_id, uuid4(), test_redis, campaign) == 2
+
+    assert await camp_repo.get_counters_bulk([campaign_id], test_redis) == [(5, 2)]
+    assert float(await test_redis.get(campaign_key(campaign_id, "spent_impressions"))) == 2.5
+    assert float(await test_redis.get(campaign_key(campaign_id, "spent_clicks"))) == 4.0
+    assert await test_redis.type(campaign_key(campaign_id, "impressions_bitmap")) == "string"
+    assert await test_redis.exists(campaign_key(campaign_id, "impressions")) == 0
+
+# Тест для проверки отложенной записи событий: порядок, ограничение буфера и сброс при остановке.
+@pytest.mark.asyncio
+async def test_write_behind_buffer(session, test_redis):
+    await redis_client.set("current_day", 0)
+    await test_redis.set("current_day", 0)
+    buffer = EventBuffer(test_redis, capacity=4, batch_size=3, flush_interval_ms=1)
+    camp_repo = CampaignRepository(session, events=buffer)
+    campaign = await camp_repo.create_campaign(uuid4(), campaign_create())
+    campaign_id = campaign.campaign_id
+    clients = [uuid4() for _ in range(10)]
+
+    buffer.start()
+    for client_id in clients + clients[:3]:
+        assert await camp_repo.log_impression(campaign_id, client_id, test_redis, campaign) is None
+        assert len(buffer) <= 4
+    # Клик сразу после показа в том же буфере засчитывается: порядок событий сохраняется.
+    for client_id in clients[:4]:
+        await camp_repo.log_click(campaign_id, client_id, test_redis, campaign)
+    await buffer.stop()
+
+    assert len(buffer) == 0
+    assert await camp_repo.get_counters_bulk([campaign_id], test_redis) == [(10, 4)]
+    assert float(await test_redis.get(campaign_key(campaign_id, "spent_impressions"))) == 5.0
+    assert float(await test_redis.get(campaign_key(campaign_id, "spent_clicks"))) == 8.0
+
+# Тест для проверки доставки "хотя бы один раз": повтор пачки после потерянного ответа не удваивает счётчики.
+@pytest.mark.asyncio
+async def test_write_behind_buffer_retries_batch(session, test_redis):
+    await redis_client.set("current_day", 0)
+    await test_redis.set("current_day", 0)
+    buffer = EventBuffer(test_redis, capacity=100, batch_size=100, flush_interval_ms=1)
+    camp_repo = CampaignRepository(session, events=buffer)
+    campaign = await camp_repo.create_campaign(uuid4(), campaign_create())
+    execute = buffer._execute
+    calls = []
+
+    async def execute_and_lose_reply(batch):
+        calls.append(len(batch))
+        results = await execute(batch)
+        if len(calls) == 1:
+            raise ConnectionError("reply lost")
+        return results
+
+    buffer._execute = execute_and_lose_reply
+    buffer.start()
+    for _ in range(2):
+        for client_id in [uuid4() for _ in range(3)]:
+            await camp_repo.log_impression(campaign.campaign_id, client_id, test_redis, campaign)
+    await buffer.stop()
+
+    assert len(calls) >= 2
+    assert await camp_repo.get_impressions_count(campaign.campaign_id, test_redis) == 6
+    assert float(await test_redis.get(campaign_key(campaign.campaign_id, "spent_impressions"))) == 3.0
+
+# Тест для проверки кликов, опередивших показ из буфера другого воркера: клик повторяется
+# следующими сбросами и засчитывается после показа, а без показа отбрасывается по истечении окна.
+@pytest.mark.asyncio
+async def test_write_behind_click_before_impression_from_other_worker(session, test_redis):
+    from src.repositories.campaign_counters import IMPRESSION, CLICK
+
+    await test_redis.set("current_day", 0)
+    now = [0.0]
+    clicks_worker = EventBuffer(test_redis, click_retry_s=1, clock=lambda: now[0])
+    impressions_worker = EventBuffer(test_redis)
+    counters = get_counter_backend()
+    campaign_id, advertiser_id = uuid4(), uuid4()
+    client_id, orphan_client_id = uuid4(), uuid4()
+
+    def event(kind, cid):
+        return counters.build_event(kind, campaign_id, cid, advertiser_id, "2.0" if kind == CLICK else "0.5", 0, 5, [])
+
+    await clicks_worker.put(event(CLICK, client_id))
+    await clicks_worker.put(event(CLICK, orphan_client_id))
+    await impressions_worker.put(event(IMPRESSION, client_id))
+
+    await clicks_worker.flush()
+    assert len(clicks_worker) == 2
+    await impressions_worker.flush()
+    now[0] = 0.5
+    await clicks_worker.flush()
+    assert len(clicks_worker) == 1
+    assert await test_redis.scard(campaign_key(campaign_id, "clicks")) == 1
+    assert float(await test_redis.get(campaign_key(campaign_id, "spent_clicks"))) == 2.0
+
+    now[0] = 1.5
+    await clicks_worker.flush()
+    assert len(clicks_worker) == 0
+    assert await test_redis.scard(campaign_key(campaign_id, "clicks")) == 1
+
+# Тест для проверки журнала событий в Redis Stream: агрегация пачками, день события,
+# подхват событий упавшего потребителя и пересборка счётчиков из журнала.
+@pytest.mark.asyncio
+async def test_event_stream_aggregation(session, test_redis, monkeypatch):
+    import src.repositories.campaign as campaign_module
+    monkeypatch.setattr(campaign_module, "EVENT_STREAM", True)
+    await redis_client.set("current_day", 2)
+    await test_redis.set("current_day", 2)
+    camp_repo = CampaignRepository(session)
+    campaign = await camp_repo.create_campaign(uuid4(), campaign_create(start_date=2))
+    campaign_id = campaign.campaign_id
+    clients = [uuid4() for _ in range(4)]
+    for client_id in clients + clients[:1]:
+        assert await camp_repo.log_impression(campaign_id, client_id, test_redis, campaign) is None
+    await camp_repo.log_click(campaign_id, clients[0], test_redis, campaign)
+    assert await test_redis.xlen("events") == 6
+    assert await camp_repo.get_counters_bulk([campaign_id], test_redis) == [(0, 0)]
+    # Агрегатор отстаёт: день сменился, но события учитываются в день их записи.
+    await test_redis.set("current_day", 3)
+
+    crashed = EventStreamAggregator(test_redis, consumer="crashed", batch_size=2)
+    await crashed.ensure_group()
+    await test_redis.xreadgroup("aggregators", "crashed", {"events": ">"}, count=2)
+    aggregator = EventStreamAggregator(test_redis, consumer="alive", batch_size=2, block_ms=1, claim_idle_ms=0)
+    while await aggregator.process_batch():
+        pass
+
+    assert (await test_redis.xpending("events", "aggregators"))["pending"] == 0
+    expected_daily = {"2:impressions": "4", "2:clicks": "1", "2:spent_impressions": "2", "2:spent_clicks": "2"}
+    assert await camp_repo.get_counters_bulk([campaign_id], test_redis) == [(4, 1)]
+    assert await test_redis.hgetall(campaign_key(campaign_id, "daily_stats")) == expected_daily
+
+    # Пересборка: после удаления счётчиков повтор журнала восстанавливает их.
+    await test_redis.delete(*[key async for key in test_redis.scan_iter(campaign_key(campaign_id, "*"))])
+    assert await aggregator.replay() == 6
+    assert await camp_repo.get_counters_bulk([campaign_id], test_redis) == [(4, 1)]
+    assert await test_redis.hgetall(campaign_key(campaign_id, "daily_stats")) == expected_daily
+
+# Тест для проверки журнала событий: клик, применённый раньше своего показа, остаётся
+# неподтверждённым и учитывается повторно, а по истечении окна повторов подтверждается.
+@pytest.mark.asyncio
+async def test_event_stream_click_before_impression(session, test_redis, monkeypatch):
+    import src.repositories.campaign as campaign_module
+    monkeypatch.setattr(campaign_module, "EVENT_STREAM", True)
+    await redis_client.set("current_day", 0)
+    camp_repo = CampaignRepository(session)
+    campaign = await camp_repo.create_campaign(uuid4(), campaign_create())
+    campaign_id = campaign.campaign_id
+    client_id, lost_client_id = uuid4(), uuid4()
+    # Показ попал в журнал позже клика: например, его записал другой воркер.
+    await camp_repo.log_click(campaign_id, client_id, test_redis, campaign)
+    await camp_repo.log_impression(campaign_id, client_id, test_redis, campaign)
+
+    aggregator = EventStreamAggregator(test_redis, consumer="reordered", batch_size=1, block_ms=1, claim_idle_ms=0)
+    await aggregator.ensure_group()
+    # Клик ждёт в подхваченной половине пачки, а показ читается как новая запись.
+    for _ in range(4):
+        await aggregator.process_batch()
+    assert (await test_redis.xpending("events", "aggregators"))["pending"] == 0
+    assert await camp_repo.get_counters_bulk([campaign_id], test_redis) == [(1, 1)]
+
+    dropped = REGISTRY.get_sample_value("event_dropped_early_clicks_total", {"source": "stream"}) or 0
+    await camp_repo.log_click(campaign_id, lost_client_id, test_redis, campaign)
+    aggregator.click_retry_s = 0
+    assert await aggregator.process_batch() == 1
+    assert (await test_redis.xpending("events", "aggregators"))["pending"] == 0
+    assert await camp_repo.get_counters_bulk([campaign_id], test_redis) == [(1, 1)]
+    assert REGISTRY.get_sample_value("event_dropped_early_clicks_total", {"source": "stream"}) == dropped + 1
+
+async def _fan_out_stats(session, redis_instance, counters) -> dict:
+    camp_repo = CampaignRepository(session, counters=counters)
+    advertiser_id = uuid4()
+    await AdvertiserRepository(session).upsert_many([AdvertiserUpsert(advertiser_id=advertiser_id, name="Sharded")])
+    await redis_instance.set("current_day", 0)
+
+    short = await camp_repo.create_campaign(advertiser_id, campaign_create(0, 1, 0.1, 1.5))
+    long = await camp_repo.create_campaign(advertiser_id, campaign_create(1, 5, 0.25, 3.0))
+    removed = await camp_repo.create_campaign(advertiser_id, campaign_create(0, 5, 0.7, 9.0))
+    clients = [uuid4() for _ in range(4)]
+
+    await camp_repo.log_impression(short.campaign_id, clients[0], redis_instance)
+    await camp_repo.log_impression(removed.campaign_id, clients[0], redis_instance)
+    await redis_instance.set("current_day", 1)
+    await camp_repo.log_impression(short.campaign_id, clients[1], redis_instance)
+    await camp_repo.log_click(long.campaign_id, clients[0], redis_instance)
+    await camp_repo.log_impression(long.campaign_id, clients[0], redis_instance)
+    await camp_repo.log_click(long.campaign_id, clients[0], redis_instance)
+    await camp_repo.log_click(removed.campaign_id, clients[0], redis_instance)
+    await redis_instance.set("current_day", 2)
+    await camp_repo.log_click(short.campaign_id, clients[0], redis_instance)
+    await camp_repo.log_impression(long.campaign_id, clients[1], redis_instance)
+    await redis_instance.set("current_day", 3)
+    await camp_repo.log_click(long.campaign_id, clients[1], redis_instance)
+    await camp_repo.log_impression(long.campaign_id, clients[2], redis_instance)
+    await camp_repo.delete_campaign(advertiser_id, removed.campaign_id)
+
+    campaign_ids = [short.campaign_id, long.campaign_id]
+    return {
+        "counters": await camp_repo.get_counters_bulk(campaign_ids, redis_instance),
+        "campaigns": [await camp_repo.get_campaign_stats(cid, redis_instance) for cid in campaign_ids],
+        "daily": [await camp_repo.get_campaign_daily_stats(cid, redis_instance) for cid in campaign_ids],
+        "advertiser": await camp_repo.get_advertiser_stats(advertiser_id, redis_instance),
+        "advertiser_daily": await camp_repo.get_advertiser_daily_stats(advertiser_id, redis_instance),
+    }
+
+# Тест для проверки учёта в Redis Cluster: ключи кампании с хеш-тегом выполняются скриптами
+# на одном узле, а статистика кампаний и агрегаты рекламодателя совпадают с одиночным Redis.
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["exact", "bitmap"])
+async def test_cluster_counters_match_single_node(session, test_redis, monkeypatch, mode):
+    import src.repositories.campaign as campaign_module
+    from src.repositories.campaign_counters import COUNTER_BACKENDS
+    from tests.fake_cluster import FakeRedisCluster
+
+    cluster = FakeRedisCluster(nodes=3)
+    try:
+        monkeypatch.setattr(campaign_module, "redis_client", test_redis)
+        single = await _fan_out_stats(session, test_redis, COUNTER_BACKENDS[mode](cluster=False))
+        monkeypatch.setattr(campaign_module, "redis_client", cluster)
+        sharded = await _fan_out_stats(session, cluster, COUNTER_BACKENDS[mode](cluster=True))
+
+        assert sharded == single
+        assert single["counters"] == [(2, 1), (3, 2)]
+        assert [stat["clicks_count"] for stat in single["advertiser_daily"]] == [0, 1, 0, 1]
+        # Без кластерного режима скрипт получает ключи разных слотов.
+        with pytest.raises(ResponseError, match="CROSSSLOT"):
+            await CampaignRepository(session, counters=COUNTER_BACKENDS[mode](cluster=False)).log_impression(
+                uuid4(), uuid4(), cluster
+            )
+    finally:
+        await cluster.aclose()
+
+# Тест для проверки отложенной записи и журнала событий в Redis Cluster: скрипты загружаются
+# на узлы при первом NOSCRIPT, а агрегаты рекламодателя применяются после пачки.
+@pytest.mark.asyncio
+async def test_cluster_event_paths(session, monkeypatch):
+    import src.repositories.campaign as campaign_module
+    from src.repositories.campaign_counters import ExactCounters
+    from tests.fake_cluster import FakeRedisCluster
+
+    cluster = FakeRedisCluster(nodes=3)
+    try:
+        monkeypatch.setattr(campaign_module, "redis_client", cluster)
+        await cluster.set("current_day", 1)
+        counters = ExactCounters(cluster=True)
+        advertiser_id = uuid4()
+        await AdvertiserRepository(session).upsert_many([AdvertiserUpsert(advertiser_id=advertiser_id, name="Paths")])
+        buffer = EventBuffer(cluster, capacity=100, batch_size=100, flush_interval_ms=1)
+        camp_repo = CampaignRepository(session, counters=counters, events=buffer)
+        campaign = await camp_repo.create_campaign(advertiser_id, campaign_create(start_date=1))
+        buffered, streamed = [uuid4() for _ in range(3)], [uuid4() for _ in range(2)]
+
+        buffer.start()
+        for client_id in buffered:
+            await camp_repo.log_impression(campaign.campaign_id, client_id, cluster, campaign)
+        await camp_repo.log_click(campaign.campaign_id, buffered[0], cluster, campaign)
+        await buffer.stop()
+
+        monkeypatch.setattr(campaign_module, "EVENT_STREAM", True)
+        for client_id in streamed:
+            await camp_repo.log_impression(campaign.campaign_id, client_id, cluster, campaign)
+        await cluster.set("current_day", 2)
+        aggregator = EventStreamAggregator(cluster, counters=counters, consumer="cluster", block_ms=1)
+        await aggregator.ensure_group()
+        while await aggregator.process_batch():
+            pass
+
+        assert await camp_repo.get_counters_bulk([campaign.campaign_id], cluster) == [(5, 1)]
+        advertiser_stats = await camp_repo.get_advertiser_stats(advertiser_id, cluster)
+        assert (advertiser_stats["impressions_count"], advertiser_stats["clicks_count"]) == (5, 1)
+        assert advertiser_stats["spent_total"] == pytest.approx(4.5)
+        assert await cluster.hgetall(campaign_key(campaign.campaign_id, "daily_stats")) == {
+            "1:impressions": "5", "1:clicks": "1", "1:spent_impressions": "2.5", "1:spent_clicks": "2"
+        }
+    finally:
+        await cluster.aclose()